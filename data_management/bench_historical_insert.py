@@ -0,0 +1,87 @@
+import argparse
+import contextlib
+import glob
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from data_management import initialize_db, insert_unique_data
+from historical_insert import (convert_date_format, insert_historical_data,
+                               insert_historical_data_bulk, load_supplier_map)
+
+
+def load_backups(folder_path, limit):
+    """Read the backup CSVs up front so only the insert path is timed."""
+    frames = []
+    for file_path in sorted(glob.glob(os.path.join(folder_path, '*.csv')))[:limit]:
+        date_str = os.path.basename(file_path).split('.')[0]
+        try:
+            date = datetime.strptime(
+                convert_date_format(date_str), "%Y-%m-%d").date()
+            frames.append((date, pd.read_csv(file_path)))
+        except ValueError:
+            print(f"Skipping unreadable file: {file_path}")
+    return frames
+
+
+def fresh_db(path, frames):
+    conn = sqlite3.connect(path)
+    initialize_db(conn)
+    suppliers = pd.concat([df['Supplier'] for _, df in frames]).dropna().unique()
+    insert_unique_data(conn, 'suppliers', suppliers)
+    return conn
+
+
+def run(mode, frames, db_path):
+    conn = fresh_db(db_path, frames)
+    supplier_map = load_supplier_map(conn)
+    start = time.perf_counter()
+    for date, df in frames:
+        if mode == 'bulk':
+            insert_historical_data_bulk(conn, df.copy(), date, supplier_map)
+        else:
+            insert_historical_data(conn, df.copy(), date)
+    elapsed = time.perf_counter() - start
+    rows = conn.execute("SELECT COUNT(*) FROM historical_inventory").fetchone()[0]
+    checksum = conn.execute(
+        "SELECT SUM(total_available), SUM(COALESCE(supplier_id, 0)) FROM historical_inventory").fetchone()
+    conn.close()
+    return rows, elapsed, checksum
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare row-by-row and bulk historical_inventory loads.')
+    parser.add_argument('--backup-dir', default=os.getenv('BACKUP_DIR', 'csv_bkups'))
+    parser.add_argument('--limit', type=int, default=30,
+                        help='Number of backup files to load (default 30)')
+    args = parser.parse_args()
+
+    frames = load_backups(args.backup_dir, args.limit)
+    print(f"Loaded {len(frames)} files, {sum(len(df) for _, df in frames)} CSV rows")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for mode in ('row', 'bulk'):
+            # insert_historical_data prints every row it inserts; keep the
+            # terminal quiet by only printing the summary.
+            with open(os.devnull, 'w') as devnull:
+                with contextlib.redirect_stdout(devnull):
+                    results[mode] = run(
+                        mode, frames, os.path.join(tmp, f'{mode}.db'))
+            rows, elapsed, _ = results[mode]
+            print(f"{mode:>4}: {rows} rows in {elapsed:.2f}s "
+                  f"({rows / elapsed:,.0f} rows/sec)")
+
+    if results['row'][0] != results['bulk'][0] or results['row'][2] != results['bulk'][2]:
+        print("WARNING: row and bulk loads produced different tables")
+    else:
+        print(f"Speedup: {results['row'][1] / results['bulk'][1]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
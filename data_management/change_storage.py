@@ -0,0 +1,311 @@
+import argparse
+import os
+import sqlite3
+import time
+from dotenv import load_dotenv
+from compact_storage import storage_layout
+from day_numbers import DATE_FROM_DAY, DAY_FROM_DATE
+from migrations import migrate
+from storage_layouts import uses_change_storage
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Where product_id's value at `day` lives: its last run starting on or before it
+AS_OF_RUN = '''r.product_id = {product}
+               AND r.start_day = (SELECT MAX(start_day) FROM historical_inventory_runs
+                                  WHERE product_id = {product} AND start_day <= {day})'''
+
+
+def create_change_schema(conn):
+    """Create the run tables plus the historical_inventory view and triggers over them."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS product_keys (
+                        product_id INTEGER PRIMARY KEY,
+                        nc_code TEXT UNIQUE NOT NULL)''')
+    conn.execute('''CREATE TABLE snapshot_days (
+                        day INTEGER PRIMARY KEY,
+                        date TEXT UNIQUE NOT NULL)''')
+
+    # One row per stretch of snapshot days over which a product's quantity
+    # and supplier stayed the same. end_day is the last snapshot day of the
+    # stretch; NULL while it is still the current value, so a day on which
+    # nothing moved writes nothing at all.
+    conn.execute('''CREATE TABLE historical_inventory_runs (
+                        product_id INTEGER NOT NULL,
+                        start_day INTEGER NOT NULL,
+                        end_day INTEGER,
+                        total_available INTEGER,
+                        supplier_id INTEGER,
+                        PRIMARY KEY (product_id, start_day)) WITHOUT ROWID''')
+
+    # Rows written through the view wait here until apply_staged_changes()
+    # folds them into runs; it needs the whole day to see what disappeared.
+    conn.execute('''CREATE TABLE historical_inventory_staged (
+                        day INTEGER NOT NULL,
+                        product_id INTEGER NOT NULL,
+                        total_available INTEGER,
+                        supplier_id INTEGER,
+                        deleted INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (day, product_id)) WITHOUT ROWID''')
+
+    # CROSS JOIN pins the join order: one seek per product per day, rather
+    # than scanning every run that started before the day.
+    conn.execute(f'''CREATE VIEW historical_inventory AS
+                     SELECT k.nc_code AS nc_code,
+                            s.date AS date,
+                            r.total_available AS total_available,
+                            r.supplier_id AS supplier_id
+                     FROM snapshot_days s
+                     CROSS JOIN product_keys k
+                     CROSS JOIN historical_inventory_runs r
+                         ON {AS_OF_RUN.format(product='k.product_id', day='s.day')}
+                     WHERE r.end_day IS NULL OR r.end_day >= s.day''')
+
+    # An insert is staged unless the product already has a row that day
+    # (INSERT OR IGNORE semantics), or it replaces one deleted earlier in
+    # the same load.
+    day = DAY_FROM_DATE.format('NEW.date')
+    conn.execute(f'''CREATE TRIGGER historical_inventory_insert
+                     INSTEAD OF INSERT ON historical_inventory
+                     BEGIN
+                         INSERT INTO product_keys (nc_code)
+                         SELECT NEW.nc_code
+                         WHERE NOT EXISTS (SELECT 1 FROM product_keys WHERE nc_code = NEW.nc_code);
+                         INSERT INTO historical_inventory_staged (day, product_id, total_available, supplier_id)
+                         SELECT {day}, k.product_id, NEW.total_available, NEW.supplier_id
+                         FROM product_keys k
+                         WHERE k.nc_code = NEW.nc_code
+                           AND (EXISTS (SELECT 1 FROM historical_inventory_staged
+                                        WHERE day = {day} AND product_id = k.product_id AND deleted)
+                                OR NOT EXISTS (SELECT 1 FROM snapshot_days d
+                                               JOIN historical_inventory_runs r
+                                                   ON {AS_OF_RUN.format(product='k.product_id', day='d.day')}
+                                               WHERE d.day = {day}
+                                                 AND (r.end_day IS NULL OR r.end_day >= d.day)))
+                         ON CONFLICT (day, product_id) DO UPDATE
+                             SET total_available = excluded.total_available,
+                                 supplier_id = excluded.supplier_id,
+                                 deleted = 0
+                             WHERE deleted;
+                     END''')
+    conn.execute(f'''CREATE TRIGGER historical_inventory_delete
+                     INSTEAD OF DELETE ON historical_inventory
+                     BEGIN
+                         INSERT INTO historical_inventory_staged (day, product_id, deleted)
+                         SELECT {DAY_FROM_DATE.format('OLD.date')}, product_id, 1
+                         FROM product_keys WHERE nc_code = OLD.nc_code
+                         ON CONFLICT (day, product_id) DO UPDATE
+                             SET total_available = NULL, supplier_id = NULL, deleted = 1;
+                     END''')
+
+
+def _runs_at(conn, day, product_ids=None):
+    """{product_id: (start_day, end_day, total_available, supplier_id)} for runs covering day."""
+    sql = f'''SELECT k.product_id, r.start_day, r.end_day, r.total_available, r.supplier_id
+              FROM product_keys k
+              CROSS JOIN historical_inventory_runs r ON {AS_OF_RUN.format(product='k.product_id', day='?')}
+              WHERE r.end_day IS NULL OR r.end_day >= ?'''
+    params = [day, day]
+    if product_ids is not None:
+        sql += f" AND k.product_id IN ({', '.join('?' * len(product_ids))})"
+        params += product_ids
+    return {row[0]: row[1:] for row in conn.execute(sql, params)}
+
+
+def _set_value(conn, product_id, day, run, value, prev_day, next_day):
+    """Make product_id's value on day `value` (None: absent), run being what covers day now."""
+    if run is not None:
+        start_day, end_day, total, supplier = run
+        # The part of the run after day, if the product is still there next snapshot
+        keeps_going = next_day is not None and (end_day is None or end_day >= next_day)
+        if start_day == day:
+            if keeps_going:
+                conn.execute('''UPDATE historical_inventory_runs SET start_day = ?
+                                WHERE product_id = ? AND start_day = ?''', (next_day, product_id, day))
+            else:
+                conn.execute("DELETE FROM historical_inventory_runs WHERE product_id = ? AND start_day = ?",
+                             (product_id, day))
+        else:
+            conn.execute("UPDATE historical_inventory_runs SET end_day = ? WHERE product_id = ? AND start_day = ?",
+                         (prev_day, product_id, start_day))
+            if keeps_going:
+                conn.execute('''INSERT INTO historical_inventory_runs
+                                VALUES (?, ?, ?, ?, ?)''', (product_id, next_day, end_day, total, supplier))
+    if value is None:
+        return
+    # Join up with a neighbouring run holding the same value, so deleting
+    # and reloading a day leaves the runs as they were
+    start_day, end_day = day, day if next_day is not None else None
+    before = conn.execute('''SELECT start_day, end_day, total_available, supplier_id
+                             FROM historical_inventory_runs WHERE product_id = ? AND start_day < ?
+                             ORDER BY start_day DESC LIMIT 1''', (product_id, day)).fetchone()
+    if before and prev_day is not None and before[1] == prev_day and before[2:] == value:
+        start_day = before[0]
+        conn.execute("DELETE FROM historical_inventory_runs WHERE product_id = ? AND start_day = ?",
+                     (product_id, start_day))
+    if next_day is not None:
+        after = conn.execute('''SELECT end_day, total_available, supplier_id FROM historical_inventory_runs
+                                WHERE product_id = ? AND start_day = ?''', (product_id, next_day)).fetchone()
+        if after and after[1:] == value:
+            end_day = after[0]
+            conn.execute("DELETE FROM historical_inventory_runs WHERE product_id = ? AND start_day = ?",
+                         (product_id, next_day))
+    conn.execute("INSERT INTO historical_inventory_runs VALUES (?, ?, ?, ?, ?)",
+                 (product_id, start_day, end_day) + value)
+
+
+def apply_staged_changes(conn):
+    """Fold rows written through the historical_inventory view into runs.
+
+    Days are applied oldest first. A day that wasn't loaded before becomes
+    exactly its staged rows: products with an open run that aren't in it
+    are closed. A day that was already loaded only changes where rows were
+    added or deleted. Runs only change for products whose value moved:
+    an out-of-order day splits the runs it lands in, and runs left next to
+    one with the same value are joined back up. Runs inside the
+    caller's transaction; returns the number of days applied. A no-op in
+    the other layouts.
+    """
+    if not uses_change_storage(conn):
+        return 0
+    days = [row[0] for row in conn.execute(
+        "SELECT DISTINCT day FROM historical_inventory_staged ORDER BY day")]
+    for day in days:
+        staged = {row[0]: (None if row[3] else (row[1], row[2])) for row in conn.execute(
+            '''SELECT product_id, total_available, supplier_id, deleted
+               FROM historical_inventory_staged WHERE day = ?''', (day,))}
+        prev_day = conn.execute("SELECT MAX(day) FROM snapshot_days WHERE day < ?", (day,)).fetchone()[0]
+        next_day = conn.execute("SELECT MIN(day) FROM snapshot_days WHERE day > ?", (day,)).fetchone()[0]
+        loaded = conn.execute("SELECT 1 FROM snapshot_days WHERE day = ?", (day,)).fetchone() is not None
+
+        if loaded:
+            runs = _runs_at(conn, day, list(staged))
+            products = staged
+        else:
+            # Every run spanning the new day would otherwise show up on it
+            runs = _runs_at(conn, day)
+            products = set(runs) | set(staged)
+            conn.execute(f"INSERT INTO snapshot_days (day, date) VALUES (?, {DATE_FROM_DAY.format('?')})",
+                         (day, day))
+        for product_id in products:
+            run = runs.get(product_id)
+            current = run[2:] if run else None
+            value = staged.get(product_id)
+            if value != current:
+                _set_value(conn, product_id, day, run, value, prev_day, next_day)
+
+        if None in staged.values() and not _runs_at(conn, day):
+            # Deletes left nothing on the day, so like the row table it has no date
+            conn.execute("DELETE FROM snapshot_days WHERE day = ?", (day,))
+        conn.execute("DELETE FROM historical_inventory_staged WHERE day = ?", (day,))
+    return len(days)
+
+
+def convert_to_changes(conn):
+    """Rewrite a row-table historical_inventory as runs of unchanged values."""
+    if storage_layout(conn) != 'table':
+        return False
+
+    migrate(conn)
+    try:
+        conn.execute('BEGIN')
+        conn.execute('ALTER TABLE historical_inventory RENAME TO historical_inventory_rows')
+        create_change_schema(conn)
+        conn.execute('''INSERT INTO product_keys (nc_code)
+                        SELECT DISTINCT nc_code FROM historical_inventory_rows ORDER BY nc_code''')
+        conn.execute(f'''INSERT INTO snapshot_days (day, date)
+                         SELECT DISTINCT {DAY_FROM_DATE.format('date')}, date FROM historical_inventory_rows''')
+        # A run breaks where the value changes or the product skipped a
+        # snapshot; n numbers the snapshot days so skips are easy to see.
+        conn.execute('''INSERT INTO historical_inventory_runs
+                        SELECT product_id, MIN(day), MAX(day), total_available, supplier_id
+                        FROM (SELECT *, SUM(new_run) OVER (PARTITION BY product_id ORDER BY day) AS run
+                              FROM (SELECT k.product_id, d.day, h.total_available, h.supplier_id,
+                                           NOT (LAG(d.n) OVER w IS d.n - 1
+                                                AND LAG(h.total_available) OVER w IS h.total_available
+                                                AND LAG(h.supplier_id) OVER w IS h.supplier_id) AS new_run
+                                    FROM historical_inventory_rows h
+                                    JOIN product_keys k ON k.nc_code = h.nc_code
+                                    JOIN (SELECT day, date, ROW_NUMBER() OVER (ORDER BY day) AS n
+                                          FROM snapshot_days) d ON d.date = h.date
+                                    WINDOW w AS (PARTITION BY k.product_id ORDER BY d.day)))
+                        GROUP BY product_id, run''')
+        conn.execute('''UPDATE historical_inventory_runs SET end_day = NULL
+                        WHERE end_day = (SELECT MAX(day) FROM snapshot_days)''')
+        conn.execute('DROP TABLE historical_inventory_rows')
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return True
+
+
+def convert_to_rows(conn):
+    """Expand the runs back into the original row table."""
+    if not uses_change_storage(conn):
+        return False
+
+    try:
+        conn.execute('BEGIN')
+        apply_staged_changes(conn)
+        conn.execute('''CREATE TABLE historical_inventory_rows (
+                            nc_code TEXT,
+                            date TEXT,
+                            total_available INTEGER,
+                            supplier_id INTEGER,
+                            PRIMARY KEY (nc_code, date),
+                            FOREIGN KEY (nc_code) REFERENCES inventory (nc_code),
+                            FOREIGN KEY (supplier_id) REFERENCES suppliers (id))''')
+        # Walks each run's days off the snapshot_days key instead of going
+        # through the view's per-day lookups
+        conn.execute('''INSERT INTO historical_inventory_rows
+                        SELECT k.nc_code, s.date, r.total_available, r.supplier_id
+                        FROM historical_inventory_runs r
+                        JOIN product_keys k ON k.product_id = r.product_id
+                        JOIN snapshot_days s ON s.day BETWEEN r.start_day
+                                                          AND COALESCE(r.end_day, (SELECT MAX(day) FROM snapshot_days))''')
+        conn.execute('DROP VIEW historical_inventory')
+        conn.execute('DROP TABLE historical_inventory_runs')
+        conn.execute('DROP TABLE historical_inventory_staged')
+        conn.execute('DROP TABLE snapshot_days')
+        conn.execute('DROP TABLE product_keys')
+        conn.execute('ALTER TABLE historical_inventory_rows RENAME TO historical_inventory')
+        conn.execute('''CREATE INDEX idx_historical_inventory_date
+                        ON historical_inventory (date, nc_code, total_available, supplier_id)''')
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Store historical_inventory as runs of unchanged values, or expand it back.')
+    parser.add_argument('--revert', action='store_true',
+                        help='Convert back to one row per product per day')
+    args = parser.parse_args()
+
+    db_file = os.getenv("DB_FILE_PATH")
+    before = os.path.getsize(db_file)
+    start = time.perf_counter()
+
+    conn = sqlite3.connect(db_file)
+    changed = convert_to_rows(conn) if args.revert else convert_to_changes(conn)
+    if not changed:
+        print(f"{db_file} uses the {storage_layout(conn)} layout; only row <-> changes is converted here")
+        conn.close()
+        return
+
+    # Reclaim the pages the old layout used, then refresh planner statistics.
+    conn.execute('VACUUM')
+    conn.execute('ANALYZE')
+    conn.close()
+
+    after = os.path.getsize(db_file)
+    print(f"Converted {db_file} to the {'row' if args.revert else 'changes'} layout "
+          f"in {time.perf_counter() - start:.1f}s: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import argparse
+import os
+import sqlite3
+import time
+from dotenv import load_dotenv
+from day_numbers import DATE_FROM_DAY, DAY_FROM_DATE
+from migrations import migrate
+
+# Load environment variables from .env file
+load_dotenv()
+
+
+def storage_layout(conn):
+    """Return 'compact' or 'changes' when historical_inventory is a view, else 'table'."""
+    row = conn.execute(
+        "SELECT type FROM sqlite_master WHERE name = 'historical_inventory'").fetchone()
+    if not row or row[0] != 'view':
+        return 'table'
+    # change_storage.py's view sits over runs rather than one row per day
+    runs = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'historical_inventory_runs'").fetchone()
+    return 'changes' if runs else 'compact'
+
+
+def create_compact_schema(conn):
+    """Create the integer-keyed tables plus the historical_inventory view over them."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS product_keys (
+                        product_id INTEGER PRIMARY KEY,
+                        nc_code TEXT UNIQUE NOT NULL)''')
+
+    # Clustered on (day, product_id): a date or date range is one contiguous
+    # run of pages, and no separate rowid b-tree is stored.
+    conn.execute('''CREATE TABLE IF NOT EXISTS historical_inventory_compact (
+                        day INTEGER NOT NULL,
+                        product_id INTEGER NOT NULL,
+                        total_available INTEGER,
+                        supplier_id INTEGER,
+                        PRIMARY KEY (day, product_id)) WITHOUT ROWID''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_historical_compact_product
+                    ON historical_inventory_compact (product_id, day)''')
+    # Lets "WHERE date = ?" against the view seek instead of scanning, since
+    # SQLite matches the view's date expression to this index.
+    conn.execute(f'''CREATE INDEX IF NOT EXISTS idx_historical_compact_date
+                     ON historical_inventory_compact ({DATE_FROM_DAY.format('day')}, product_id)''')
+
+    conn.execute(f'''CREATE VIEW historical_inventory AS
+                     SELECT k.nc_code AS nc_code,
+                            {DATE_FROM_DAY.format('h.day')} AS date,
+                            h.total_available AS total_available,
+                            h.supplier_id AS supplier_id
+                     FROM historical_inventory_compact h
+                     LEFT JOIN product_keys k ON k.product_id = h.product_id''')
+
+    # Writers keep inserting (nc_code, date, ...) rows; the triggers map them
+    # onto the integer keys. The outer statement's conflict clause (e.g.
+    # INSERT OR IGNORE) carries through to the insert below.
+    conn.execute(f'''CREATE TRIGGER historical_inventory_insert
+                     INSTEAD OF INSERT ON historical_inventory
+                     BEGIN
+                         INSERT INTO product_keys (nc_code)
+                         SELECT NEW.nc_code
+                         WHERE NOT EXISTS (SELECT 1 FROM product_keys WHERE nc_code = NEW.nc_code);
+                         INSERT INTO historical_inventory_compact (day, product_id, total_available, supplier_id)
+                         VALUES ({DAY_FROM_DATE.format('NEW.date')},
+                                 (SELECT product_id FROM product_keys WHERE nc_code = NEW.nc_code),
+                                 NEW.total_available, NEW.supplier_id);
+                     END''')
+    conn.execute(f'''CREATE TRIGGER historical_inventory_delete
+                     INSTEAD OF DELETE ON historical_inventory
+                     BEGIN
+                         DELETE FROM historical_inventory_compact
+                         WHERE day = {DAY_FROM_DATE.format('OLD.date')}
+                           AND product_id = (SELECT product_id FROM product_keys WHERE nc_code = OLD.nc_code);
+                     END''')
+
+
+def convert_to_compact(conn):
+    """Rewrite a row-table historical_inventory into the compact layout."""
+    if storage_layout(conn) != 'table':
+        return False
+
+    # Bring the row table up to date first so later migrations never have
+    # to reason about both layouts.
+    migrate(conn)
+    try:
+        conn.execute('BEGIN')
+        conn.execute('ALTER TABLE historical_inventory RENAME TO historical_inventory_rows')
+        create_compact_schema(conn)
+        conn.execute('''INSERT INTO product_keys (nc_code)
+                        SELECT DISTINCT nc_code FROM historical_inventory_rows ORDER BY nc_code''')
+        conn.execute(f'''INSERT INTO historical_inventory_compact (day, product_id, total_available, supplier_id)
+                         SELECT {DAY_FROM_DATE.format('r.date')}, k.product_id, r.total_available, r.supplier_id
+                         FROM historical_inventory_rows r
+                         JOIN product_keys k ON k.nc_code = r.nc_code
+                         ORDER BY 1, 2''')
+        conn.execute('DROP TABLE historical_inventory_rows')
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return True
+
+
+def convert_to_rows(conn):
+    """Turn a compact database back into the original row table."""
+    if storage_layout(conn) != 'compact':
+        return False
+
+    try:
+        conn.execute('BEGIN')
+        conn.execute('''CREATE TABLE historical_inventory_rows (
+                            nc_code TEXT,
+                            date TEXT,
+                            total_available INTEGER,
+                            supplier_id INTEGER,
+                            PRIMARY KEY (nc_code, date),
+                            FOREIGN KEY (nc_code) REFERENCES inventory (nc_code),
+                            FOREIGN KEY (supplier_id) REFERENCES suppliers (id))''')
+        conn.execute('''INSERT INTO historical_inventory_rows
+                        SELECT nc_code, date, total_available, supplier_id FROM historical_inventory''')
+        conn.execute('DROP VIEW historical_inventory')
+        conn.execute('DROP TABLE historical_inventory_compact')
+        conn.execute('DROP TABLE product_keys')
+        conn.execute('ALTER TABLE historical_inventory_rows RENAME TO historical_inventory')
+        conn.execute('''CREATE INDEX idx_historical_inventory_date
+                        ON historical_inventory (date, nc_code, total_available, supplier_id)''')
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Convert historical_inventory between the row and compact layouts.')
+    parser.add_argument('--revert', action='store_true',
+                        help='Convert a compact database back to the row table')
+    args = parser.parse_args()
+
+    db_file = os.getenv("DB_FILE_PATH")
+    before = os.path.getsize(db_file)
+    start = time.perf_counter()
+
+    conn = sqlite3.connect(db_file)
+    changed = convert_to_rows(conn) if args.revert else convert_to_compact(conn)
+    if not changed:
+        print(f"{db_file} already uses the {storage_layout(conn)} layout")
+        conn.close()
+        return
+
+    # Reclaim the pages the old layout used, then refresh planner statistics.
+    conn.execute('VACUUM')
+    conn.execute('ANALYZE')
+    conn.close()
+
+    after = os.path.getsize(db_file)
+    print(f"Converted {db_file} to the {'row' if args.revert else 'compact'} layout "
+          f"in {time.perf_counter() - start:.1f}s: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,275 @@
-import os
+import argparse
 import csv
+import json
+import mmap
+import os
+import re
+import shutil
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+EXPECTED_HEADER = ["NC Code", "Brand Name", "Total Available", "Size",
+                   "Cases Per Pallet", "Supplier", "Supplier Allotment", "Broker Name"]
+# Every line of an export ends with a comma, so rows have one empty field more
+FIELD_COUNT = len(EXPECTED_HEADER) + 1
+INTEGER_FIELDS = [2, 4, 6]  # Total Available, Cases Per Pallet, Supplier Allotment
+REQUIRED_FIELDS = [1, 3, 5]  # Brand Name, Size, Supplier
+NC_CODE = re.compile(r'="\d+"$')
+
+# Fast path: a well-formed export matches this from end to end, so only
+# files that don't need the row-by-row walk below to find their problems.
+# It may reject a row row_problem() accepts, never the other way round.
+# Exports don't escape quotes inside names ("Hirsch "The Horizon" Bourbon"),
+# so only a quote followed by a comma closes a field, as csv.reader reads it.
+_ANY = rb'"[^"\r\n]*+(?:"(?!,)[^"\r\n]*+)*+"'
+_TEXT = rb'"(?![ \t]*",)[^"\r\n]*+(?:"(?!,)[^"\r\n]*+)*+"'  # not blank
+_INT = rb'"\d++"'
+_ROW = rb','.join([rb'="\d++"', _TEXT, _INT, _TEXT, _INT, _TEXT, _INT, _ANY]) + rb','
+# Possessive quantifiers: a row matches one way or not at all, so never backtrack
+WELL_FORMED = re.compile(rb'(?:%s(?:\r?\n|\Z))++' % _ROW)
+ROW_CODES = re.compile(rb'\n(="\d+")')
+
+# A file with any of these can't be loaded as-is and is quarantined. The
+# loaders already keep one row per NC code, so duplicates only warn.
+FATAL_KINDS = {'filename', 'empty', 'blank', 'header', 'encoding', 'truncated', 'schema'}
+# Problems listed per file in the report; all of them are still counted
+MAX_LISTED = 20
+
+
+def iter_lines(mm):
+    """Yield (line number, bytes without the line ending) from an mmap."""
+    start = 0
+    line_no = 0
+    size = len(mm)
+    while start < size:
+        end = mm.find(b'\n', start)
+        if end == -1:
+            end = size
+        line_no += 1
+        line = mm[start:end]
+        yield line_no, line[:-1] if line.endswith(b'\r') else line
+        start = end + 1
+
+
+def row_problem(row):
+    """Return (kind, detail) for a data row that breaks the schema, or None."""
+    if len(row) != FIELD_COUNT or row[-1]:
+        return 'schema', f'{len(row)} fields'
+    if not NC_CODE.match(row[0]):
+        return 'schema', f'bad NC Code {row[0]!r}'
+    for n in INTEGER_FIELDS:
+        if not row[n].isdigit():
+            return 'schema', f'bad {EXPECTED_HEADER[n]} {row[n]!r}'
+    for n in REQUIRED_FIELDS:
+        if not row[n].strip():
+            return 'schema', f'empty {EXPECTED_HEADER[n]}'
+    return None
+
+
+def validate_file(file_path):
+    """Check one backup end to end and return its report entry.
+
+    The entry holds the file's row count, a count per problem kind, the
+    first MAX_LISTED problems with their line numbers, and 'valid', which
+    is False when any problem is in FATAL_KINDS.
+    """
+    start = time.perf_counter()
+    file_name = os.path.basename(file_path)
+    counts = Counter()
+    problems = []
+
+    def report(kind, line, detail):
+        counts[kind] += 1
+        if len(problems) < MAX_LISTED:
+            problems.append({'kind': kind, 'line': line, 'detail': detail})
+
+    try:
+        datetime.strptime(file_name, '%Y%m%d.csv')
+    except ValueError:
+        report('filename', None, 'name is not YYYYMMDD.csv')
+
+    size = os.path.getsize(file_path)
+    rows = 0
+    if size == 0:
+        report('empty', None, 'file is empty')
+    else:
+        with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            rows = well_formed_rows(mm, report)
+            if rows is not None:
+                return result(file_path, size, rows, counts, problems, start)
 
+            rows = 0
+            last_line = 0
 
-def is_valid_format(file_path):
-    """Checks if the given file matches the expected CSV format."""
-    expected_header = ["NC Code", "Brand Name", "Total Available", "Size",
-                       "Cases Per Pallet", "Supplier", "Supplier Allotment", "Broker Name"]
+            def decoded():
+                nonlocal last_line
+                for line_no, line in iter_lines(mm):
+                    last_line = line_no
+                    try:
+                        yield line.decode('utf-8-sig' if line_no == 1 else 'utf-8')
+                    except UnicodeDecodeError as exc:
+                        report('encoding', line_no, str(exc))
+                        yield line.decode('utf-8', errors='replace')
 
-    with open(file_path, 'r', newline='') as file:
-        try:
-            reader = csv.reader(file)
-            header = next(reader)
+            reader = csv.reader(decoded())
+            header = next(reader, [])
+            if [h.strip() for h in header if h.strip()] != EXPECTED_HEADER:
+                report('header', 1, f'unexpected header {header!r}')
+            else:
+                seen = {}
+                previous = None
+                for row in reader:
+                    if not row:
+                        continue
+                    if previous is not None:
+                        check_row(previous, seen, report)
+                    previous = (last_line, row)
+                    rows += 1
+                if previous is not None:
+                    # A download cut short leaves a partial last row
+                    line_no, row = previous
+                    if len(row) < FIELD_COUNT:
+                        report('truncated', line_no, f'last row has {len(row)} of {FIELD_COUNT} fields')
+                    else:
+                        check_row(previous, seen, report)
+                if rows == 0:
+                    report('blank', None, 'header only, no rows')
 
-            # Strip whitespace and remove empty strings from header fields
-            header = [h.strip() for h in header if h.strip()]
+    return result(file_path, size, rows, counts, problems, start)
 
-            if header != expected_header:
-                print(f"Header mismatch in {file_path}: {header}")
-                return False
 
-            for row in reader:
-                if not row or not row[0].strip().startswith('="'):
-                    print(f"Row format mismatch in {file_path}: {row}")
-                    return False
-                if reader.line_num > 35:  # Check first 35 lines
-                    break
-        except csv.Error as e:
-            print(f"CSV error in {file_path}: {e}")
-            return False
+def well_formed_rows(mm, report):
+    """Row count if the file passes the fast path, else None.
 
-    return True
+    Duplicate NC codes don't fail it; they are reported with their line
+    numbers, worked out from the match offsets.
+    """
+    header_end = mm.find(b'\n')
+    if header_end == -1:
+        return None
+    header = next(csv.reader([mm[:header_end].decode('utf-8-sig', errors='replace')]), [])
+    if [h.strip() for h in header if h.strip()] != EXPECTED_HEADER:
+        return None
+    if not WELL_FORMED.fullmatch(mm, header_end + 1):
+        return None
+    try:
+        str(mm, 'utf-8')
+    except UnicodeDecodeError:
+        return None
+    codes = ROW_CODES.findall(mm, header_end)
+    if len(set(codes)) != len(codes):
+        seen = {}
+        line_no, position = 1, header_end
+        for match in ROW_CODES.finditer(mm, header_end):
+            line_no += mm[position:match.start() + 1].count(b'\n')
+            position = match.start() + 1
+            code = match.group(1).decode()
+            if code in seen:
+                report('duplicate_key', line_no, f'NC Code {code} also on line {seen[code]}')
+            else:
+                seen[code] = line_no
+    return len(codes)
 
 
-def find_non_conforming_files(folder_path):
+def result(file_path, size, rows, counts, problems, start):
+    return {'file': os.path.basename(file_path),
+            'path': file_path,
+            'valid': not FATAL_KINDS & set(counts),
+            'size': size,
+            'rows': rows,
+            'counts': dict(counts),
+            'problems': problems,
+            'seconds': round(time.perf_counter() - start, 4)}
+
+
+def check_row(entry, seen, report):
+    line_no, row = entry
+    problem = row_problem(row)
+    if problem:
+        report(problem[0], line_no, problem[1])
+        return
+    if row[0] in seen:
+        report('duplicate_key', line_no, f'NC Code {row[0]} also on line {seen[row[0]]}')
+    else:
+        seen[row[0]] = line_no
+
+
+def validate_files(file_paths, workers=1):
+    """validate_file over file_paths, in order, using a process pool when workers > 1."""
+    if workers <= 1 or len(file_paths) <= 1:
+        return [validate_file(path) for path in file_paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(validate_file, file_paths, chunksize=max(1, len(file_paths) // (workers * 4))))
+
+
+def build_report(results):
+    """Summary plus every file that has a problem, ready for json.dump."""
+    totals = Counter()
+    for result in results:
+        totals.update(result['counts'])
+    return {'checked': len(results),
+            'invalid': sum(not result['valid'] for result in results),
+            'rows': sum(result['rows'] for result in results),
+            'counts': dict(totals),
+            'files': [result for result in results if result['counts']]}
+
+
+def quarantine(results, quarantine_dir):
+    """Move every invalid file into quarantine_dir; returns the new paths."""
+    moved = []
+    for result in results:
+        if result['valid']:
+            continue
+        os.makedirs(quarantine_dir, exist_ok=True)
+        destination = os.path.join(quarantine_dir, result['file'])
+        shutil.move(result['path'], destination)
+        moved.append(destination)
+    return moved
+
+
+def find_non_conforming_files(folder_path, workers=1):
     """Finds and returns a list of non-conforming files in the given folder."""
-    non_conforming_files = []
-    for filename in filter(lambda f: f.endswith('.csv'), os.listdir(folder_path)):
-        file_path = os.path.join(folder_path, filename)
-        if not is_valid_format(file_path):
-            non_conforming_files.append(filename)
-    return non_conforming_files
+    file_paths = sorted(os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith('.csv'))
+    return [result['file'] for result in validate_files(file_paths, workers) if not result['valid']]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check backup CSVs for blank, truncated, duplicate and malformed rows.')
+    parser.add_argument('paths', nargs='*', default=[os.getenv('BACKUP_DIR', 'csv_bkups')],
+                        help='CSV files or folders of them (default: $BACKUP_DIR or csv_bkups)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--report', help='Write the JSON report here instead of stdout')
+    parser.add_argument('--quarantine', metavar='DIR', help='Move invalid files into DIR')
+    args = parser.parse_args()
+
+    file_paths = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            file_paths += sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('.csv'))
+        else:
+            file_paths.append(path)
+
+    start = time.perf_counter()
+    results = validate_files(file_paths, args.workers)
+    report = build_report(results)
+    report['seconds'] = round(time.perf_counter() - start, 2)
+    if args.quarantine:
+        report['quarantined'] = quarantine(results, args.quarantine)
+
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump(report, file, indent=1)
+        print(f"Checked {report['checked']} files ({report['rows']} rows) in {report['seconds']}s, "
+              f"{report['invalid']} invalid; report in {args.report}")
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    sys.exit(1 if report['invalid'] else 0)
 
 
-folder_path = 'csv_bkups'  # Replace with your folder path
-non_conforming_files = find_non_conforming_files(folder_path)
-print("Non-conforming files:", non_conforming_files)
+if __name__ == "__main__":
+    main()
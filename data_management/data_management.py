@@ -1,9 +1,16 @@
+import codecs
+import csv
+import hashlib
+import itertools
 import sqlite3
-import pandas as pd
 from dotenv import load_dotenv
 import os
 import requests
 from datetime import datetime
+from migrations import migrate
+from ingest_hooks import run_post_ingest
+from historical_insert import INSERT_HISTORICAL_SQL, initialize_manifest, record_manifest_entry
+from change_storage import apply_staged_changes
 
 # Load environment variables from .env file
 load_dotenv()
@@ -43,6 +50,10 @@ def initialize_db(conn):
 
     conn.commit()
 
+    # Indexes and later schema changes are versioned so they also reach
+    # databases created before they existed.
+    migrate(conn)
+
 
 def create_db_connection(db_file):
     """Create a database connection to the SQLite database specified by db_file."""
@@ -54,24 +65,73 @@ def create_db_connection(db_file):
     return None
 
 
-def fetch_and_save_inventory(url, backup_dir):
-    """Fetch inventory data from the provided URL and save it to a CSV file."""
-    response = requests.get(url)
-    if response.status_code == 200:
-        today = datetime.now().strftime("%Y%m%d")
-        filename = f"{backup_dir}/{today}.csv"
-        os.makedirs(backup_dir, exist_ok=True)
-        with open(filename, 'wb') as file:
-            file.write(response.content)
-        return filename
-    else:
-        print(f"Failed to fetch data. Status code: {response.status_code}")
+# Download chunk size, and how many CSV rows are written per executemany
+CHUNK_SIZE = 64 * 1024
+BATCH_ROWS = 5000
+
+UPSERT_INVENTORY_SQL = '''INSERT INTO inventory (nc_code, brand_name, total_available, size,
+                                              cases_per_pallet, supplier_id, broker_id)
+                         VALUES (?, ?, ?, ?, ?, ?, ?)
+                         ON CONFLICT (nc_code) DO UPDATE SET
+                             brand_name = excluded.brand_name,
+                             total_available = excluded.total_available,
+                             size = excluded.size,
+                             cases_per_pallet = excluded.cases_per_pallet,
+                             supplier_id = excluded.supplier_id,
+                             broker_id = excluded.broker_id'''
+
+
+def tee_lines(chunks, file, hasher=None):
+    """Yield decoded text lines from byte chunks while copying the bytes to file.
+
+    Only one chunk plus a partial line is held at a time.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    pending = ''
+    for chunk in chunks:
+        file.write(chunk)
+        if hasher is not None:
+            hasher.update(chunk)
+        *lines, pending = (pending + decoder.decode(chunk)).split('\n')
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def _to_int(value):
+    value = value.strip()
+    return int(value) if value else None
+
+
+def parse_inventory_rows(lines):
+    """Parse report lines into dicts with the columns update_inventory needs."""
+    for record in csv.DictReader(lines):
+        if not record.get('NC Code'):
+            continue
+        yield {'nc_code': record['NC Code'],
+               'brand_name': record['Brand Name'],
+               'total_available': _to_int(record['Total Available']),
+               'size': record['Size'],
+               'cases_per_pallet': _to_int(record['Cases Per Pallet']),
+               'supplier': record['Supplier'],
+               'broker': record['Broker Name']}
+
+
+def load_name_map(conn, table_name):
+    """Return {name: id} for suppliers or brokers."""
+    return dict(conn.execute(f"SELECT name, id FROM {table_name}").fetchall())
+
+
+def resolve_id(conn, table_name, ids, name):
+    """Look name up in ids, inserting it into table_name the first time it's seen."""
+    if not name:
         return None
-
-
-def read_csv_data(file_path):
-    """Read CSV data from the given file path."""
-    return pd.read_csv(file_path)
+    if name not in ids:
+        conn.execute(f'INSERT OR IGNORE INTO {table_name} (name) VALUES (?)', (name,))
+        ids[name] = conn.execute(f"SELECT id FROM {table_name} WHERE name = ?", (name,)).fetchone()[0]
+    return ids[name]
 
 
 def insert_unique_data(conn, table_name, data):
@@ -83,52 +143,105 @@ def insert_unique_data(conn, table_name, data):
     conn.commit()
 
 
-def update_inventory(conn, df):
-    """Update the inventory table and move old data to historical_inventory."""
-    cursor = conn.cursor()
-
-    # Insert or update current inventory
-    for _, row in df.iterrows():
-        cursor.execute('''INSERT OR REPLACE INTO inventory (nc_code, brand_name, total_available, 
-                          size, cases_per_pallet, supplier_id, broker_id) 
-                          VALUES (?, ?, ?, ?, ?, 
-                          (SELECT id FROM suppliers WHERE name = ?), 
-                          (SELECT id FROM brokers WHERE name = ?))''',
-                       (row['NC Code'], row['Brand Name'], row['Total Available'],
-                           row['Size'], row['Cases Per Pallet'], row['Supplier'], row['Broker Name']))
-
-    # Move old data to historical_inventory
-    cursor.execute('''INSERT INTO historical_inventory (nc_code, date, total_available, supplier_id)
-                      SELECT nc_code, date('now'), total_available, supplier_id FROM inventory''')
+def update_inventory(conn, rows, report_date, batch_size=BATCH_ROWS):
+    """Upsert the report's rows into inventory and record them as report_date's snapshot.
+
+    rows is an iterable from parse_inventory_rows. Everything runs in one
+    transaction, so a download that fails part way leaves the database
+    untouched. Returns the number of rows read.
+    """
+    with conn:
+        return _write_inventory_rows(conn, rows, report_date, batch_size)
+
+
+def _write_inventory_rows(conn, rows, report_date, batch_size=BATCH_ROWS):
+    """Write rows batch_size at a time, resolving names through in-memory id maps."""
+    supplier_ids = load_name_map(conn, 'suppliers')
+    broker_ids = load_name_map(conn, 'brokers')
+    date = str(report_date)
+    # A rerun for the same day replaces its snapshot rather than keeping
+    # the rows the earlier run wrote
+    conn.execute("DELETE FROM historical_inventory WHERE date = ?", (date,))
+    rows = iter(rows)
+    count = 0
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            # The change layout needs the whole day before it can tell
+            # which products dropped out of the report
+            apply_staged_changes(conn)
+            return count
+        inventory = []
+        history = []
+        for row in batch:
+            supplier_id = resolve_id(conn, 'suppliers', supplier_ids, row['supplier'])
+            broker_id = resolve_id(conn, 'brokers', broker_ids, row['broker'])
+            inventory.append((row['nc_code'], row['brand_name'], row['total_available'], row['size'],
+                              row['cases_per_pallet'], supplier_id, broker_id))
+            history.append((row['nc_code'], date, row['total_available'], supplier_id))
+        conn.executemany(UPSERT_INVENTORY_SQL, inventory)
+        # Same rows historical_insert.py would load from the backup file
+        conn.executemany(INSERT_HISTORICAL_SQL, history)
+        count += len(batch)
+
+
+def stream_inventory(conn, url, backup_dir, report_date):
+    """Download the report for report_date straight into the database.
+
+    The response is read in chunks that are written to the backup CSV and
+    parsed as they arrive. The rows and the backup's ingest_manifest entry
+    (so historical_insert.py skips it) commit together; the CSV is only
+    moved into place after that. Returns the number of rows loaded, or
+    None if the download failed.
+    """
+    response = requests.get(url, stream=True, timeout=60)
+    if response.status_code != 200:
+        print(f"Failed to fetch data. Status code: {response.status_code}")
+        response.close()
+        return None
 
-    conn.commit()
+    os.makedirs(backup_dir, exist_ok=True)
+    initialize_manifest(conn)
+    file_name = f"{report_date:%Y%m%d}.csv"
+    filename = os.path.join(backup_dir, file_name)
+    tmp_filename = filename + '.tmp'
+    hasher = hashlib.sha256()
+    try:
+        with conn:
+            with response, open(tmp_filename, 'wb') as file:
+                lines = tee_lines(response.iter_content(CHUNK_SIZE), file, hasher)
+                count = _write_inventory_rows(conn, parse_inventory_rows(lines), report_date)
+            # A rename keeps the mtime, so this stat matches the final file
+            record_manifest_entry(conn, file_name, os.stat(tmp_filename), hasher.hexdigest(), count)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+    os.replace(tmp_filename, filename)
+    return count
 
 
 def main():
     db_file = os.getenv("DB_FILE_PATH")
     inventory_url = os.getenv("INVENTORY_URL")
     backup_dir = os.getenv("BACKUP_DIR")
-
-    csv_file = fetch_and_save_inventory(inventory_url, backup_dir)
-    if csv_file:
-        conn = create_db_connection(db_file)
-        if conn is not None:
-            initialize_db(conn)
-            df = read_csv_data(csv_file)
-
-            # Insert unique suppliers and brokers
-            insert_unique_data(conn, 'suppliers', df['Supplier'].unique())
-            insert_unique_data(conn, 'brokers', df['Broker Name'].unique())
-
-            # Update inventory
-            update_inventory(conn, df)
-
-            conn.close()
-            print("Database update complete.")
-        else:
-            print("Error! Cannot create the database connection.")
-    else:
+    # The report is today's; taken once so the backup name, the snapshot
+    # rows and the post-ingest refresh all agree on the date.
+    report_date = datetime.now().date()
+
+    conn = create_db_connection(db_file)
+    if conn is None:
+        print("Error! Cannot create the database connection.")
+        return
+    initialize_db(conn)
+
+    count = stream_inventory(conn, inventory_url, backup_dir, report_date)
+    if count is None:
         print("Failed to download or save inventory data.")
+    else:
+        run_post_ingest(conn, [report_date.isoformat()], inventory_changed=True)
+        print(f"Database update complete: {count} products for {report_date}.")
+    conn.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,5 @@
+# Days since 1970-01-01, as used by the compact and change storage layouts.
+# Kept as SQL snippets so tables, views, triggers and indexes all agree on
+# the exact expressions.
+DAY_FROM_DATE = "CAST(strftime('%s', {}) AS INTEGER) / 86400"
+DATE_FROM_DAY = "date({} * 86400, 'unixepoch')"
@@ -0,0 +1,61 @@
+from storage_layouts import snapshot_dates_table
+
+
+def snapshot_neighbours(conn, date):
+    """Return the snapshot dates immediately before and after date (either may be None)."""
+    table = snapshot_dates_table(conn)
+    prev_date = conn.execute(
+        f"SELECT MAX(date) FROM {table} WHERE date < ?", (date,)).fetchone()[0]
+    next_date = conn.execute(
+        f"SELECT MIN(date) FROM {table} WHERE date > ?", (date,)).fetchone()[0]
+    return prev_date, next_date
+
+
+def write_day_delta(conn, date, prev_date):
+    """Recompute inventory_deltas for date against the snapshot before it.
+
+    Only products present on both days whose quantity moved are stored, which
+    is exactly what compare_inventory_data returns for that pair of dates.
+    """
+    conn.execute("DELETE FROM inventory_deltas WHERE date = ?", (date,))
+    if prev_date is None:
+        return 0
+    # Same operand order as the Python it replaces, so the floats match
+    # bit for bit: abs(t2 - t1) / (t1 + 1) * 100
+    cursor = conn.execute('''INSERT INTO inventory_deltas (date, nc_code, prev_date, prev_total,
+                                                           total_available, percentage_change)
+                             SELECT h2.date, h2.nc_code, h1.date, h1.total_available, h2.total_available,
+                                    ABS(h2.total_available - h1.total_available) * 1.0
+                                        / (h1.total_available + 1) * 100
+                             FROM historical_inventory h1
+                             JOIN historical_inventory h2 ON h1.nc_code = h2.nc_code
+                             WHERE h1.date = ? AND h2.date = ?
+                               AND h1.total_available != h2.total_available''',
+                          (prev_date, date))
+    return cursor.rowcount
+
+
+def refresh_deltas(conn, dates):
+    """Bring inventory_deltas up to date after the given snapshot dates were (re)written.
+
+    A new day also changes the delta of the snapshot after it, whose
+    previous day it now is, so that one is recomputed as well.
+    """
+    touched = set()
+    for date in dates:
+        prev_date, next_date = snapshot_neighbours(conn, date)
+        touched.add((date, prev_date))
+        if next_date is not None:
+            touched.add((next_date, date))
+    with conn:
+        for date, prev_date in sorted(touched):
+            write_day_delta(conn, date, prev_date)
+    return len(touched)
+
+
+def backfill_deltas(conn):
+    """Compute deltas for every snapshot date. Runs inside the caller's transaction."""
+    dates = [row[0] for row in conn.execute(
+        f"SELECT DISTINCT date FROM {snapshot_dates_table(conn)} ORDER BY date")]
+    for prev_date, date in zip([None] + dates, dates):
+        write_day_delta(conn, date, prev_date)
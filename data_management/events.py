@@ -0,0 +1,161 @@
+import argparse
+import os
+import sqlite3
+from dotenv import load_dotenv
+from storage_layouts import snapshot_dates_table
+from deltas import snapshot_neighbours
+
+# Load environment variables from .env file
+load_dotenv()
+
+# A move between two positive quantities is a jump when it is at least
+# JUMP_PERCENT (measured as inventory_deltas.percentage_change) and at
+# least JUMP_MIN_CASES cases.
+JUMP_PERCENT = float(os.getenv('EVENT_JUMP_PERCENT', 100))
+JUMP_MIN_CASES = int(os.getenv('EVENT_JUMP_MIN_CASES', 10))
+
+
+def create_event_tables(conn):
+    # One row per product per snapshot on which it restocked (zero or absent
+    # before, positive now), sold out (positive before, zero now) or jumped
+    conn.execute('''CREATE TABLE IF NOT EXISTS inventory_events (
+                        nc_code TEXT NOT NULL,
+                        date TEXT NOT NULL,
+                        kind TEXT NOT NULL CHECK (kind IN ('restock', 'stockout', 'jump')),
+                        prev_date TEXT,
+                        prev_total INTEGER,
+                        total_available INTEGER,
+                        PRIMARY KEY (nc_code, date)) WITHOUT ROWID''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_inventory_events_date
+                    ON inventory_events (date, kind)''')
+    # Brands someone wants to hear about, grouped into named lists
+    conn.execute('''CREATE TABLE IF NOT EXISTS watchlist_brands (
+                        watchlist TEXT NOT NULL,
+                        brand_name TEXT NOT NULL,
+                        PRIMARY KEY (watchlist, brand_name)) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS watchlist_alerts (
+                        watchlist TEXT NOT NULL,
+                        date TEXT NOT NULL,
+                        nc_code TEXT NOT NULL,
+                        brand_name TEXT,
+                        kind TEXT NOT NULL,
+                        PRIMARY KEY (watchlist, date, nc_code)) WITHOUT ROWID''')
+
+
+def write_day_events(conn, date, prev_date):
+    """Recompute inventory_events for date against the snapshot before it.
+
+    Transitions between two reported quantities come from inventory_deltas,
+    so this must run after the day's deltas. A product missing from the
+    previous report that now has stock counts as a restock with no
+    prev_total; one that drops out of a report is not a stock-out.
+    """
+    conn.execute("DELETE FROM inventory_events WHERE date = ?", (date,))
+    if prev_date is None:
+        return 0
+    cursor = conn.execute('''INSERT INTO inventory_events (nc_code, date, kind, prev_date,
+                                                           prev_total, total_available)
+                             SELECT nc_code, date,
+                                    CASE WHEN prev_total = 0 THEN 'restock'
+                                         WHEN total_available = 0 THEN 'stockout'
+                                         ELSE 'jump' END,
+                                    prev_date, prev_total, total_available
+                             FROM inventory_deltas
+                             WHERE date = ?
+                               AND (prev_total = 0 OR total_available = 0
+                                    OR (percentage_change >= ?
+                                        AND ABS(total_available - prev_total) >= ?))''',
+                          (date, JUMP_PERCENT, JUMP_MIN_CASES))
+    written = cursor.rowcount
+
+    # Two reads of one date each, which both storage layouts serve cheaply
+    before = {row[0] for row in conn.execute(
+        "SELECT nc_code FROM historical_inventory WHERE date = ?", (prev_date,))}
+    appeared = [(nc_code, date, prev_date, total) for nc_code, total in conn.execute(
+        "SELECT nc_code, total_available FROM historical_inventory WHERE date = ? AND total_available > 0",
+        (date,)) if nc_code not in before]
+    conn.executemany('''INSERT INTO inventory_events (nc_code, date, kind, prev_date, total_available)
+                        VALUES (?, ?, 'restock', ?, ?)''', appeared)
+    return written + len(appeared)
+
+
+def evaluate_watchlists(conn, dates):
+    """Rebuild watchlist_alerts for the given dates in one pass over their events.
+
+    Runs inside the caller's transaction; returns the number of alerts.
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return 0
+    placeholders = ', '.join('?' * len(dates))
+    conn.execute(f"DELETE FROM watchlist_alerts WHERE date IN ({placeholders})", dates)
+    cursor = conn.execute(f'''INSERT INTO watchlist_alerts (watchlist, date, nc_code, brand_name, kind)
+                              SELECT w.watchlist, e.date, e.nc_code, p.brand_name, e.kind
+                              FROM inventory_events e
+                              JOIN products p ON p.source_code = e.nc_code
+                              JOIN watchlist_brands w ON w.brand_name = p.brand_name
+                              WHERE e.date IN ({placeholders})''', dates)
+    return cursor.rowcount
+
+
+def refresh_events(conn, dates):
+    """Bring inventory_events and watchlist_alerts up to date after the given dates were (re)written.
+
+    As with deltas, the snapshot after each new date is recomputed too.
+    Returns (days refreshed, alerts raised).
+    """
+    touched = set()
+    for date in dates:
+        prev_date, next_date = snapshot_neighbours(conn, date)
+        touched.add((date, prev_date))
+        if next_date is not None:
+            touched.add((next_date, date))
+    with conn:
+        for date, prev_date in sorted(touched):
+            write_day_events(conn, date, prev_date)
+        alerts = evaluate_watchlists(conn, [date for date, _ in touched])
+    return len(touched), alerts
+
+
+def backfill_events(conn):
+    """Derive events for every snapshot date. Runs inside the caller's transaction."""
+    dates = [row[0] for row in conn.execute(
+        f"SELECT DISTINCT date FROM {snapshot_dates_table(conn)} ORDER BY date")]
+    for prev_date, date in zip([None] + dates, dates):
+        write_day_events(conn, date, prev_date)
+    evaluate_watchlists(conn, dates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the brand watchlists checked after each load.')
+    parser.add_argument('watchlist')
+    parser.add_argument('--add', nargs='+', default=[], metavar='BRAND')
+    parser.add_argument('--remove', nargs='+', default=[], metavar='BRAND')
+    args = parser.parse_args()
+
+    # Imported here: migrations imports this module
+    from migrations import migrate
+
+    conn = sqlite3.connect(os.getenv("DB_FILE_PATH"))
+    migrate(conn)
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO watchlist_brands (watchlist, brand_name) VALUES (?, ?)",
+                         [(args.watchlist, brand) for brand in args.add])
+        conn.executemany("DELETE FROM watchlist_brands WHERE watchlist = ? AND brand_name = ?",
+                         [(args.watchlist, brand) for brand in args.remove])
+        if args.add:
+            # Past events of newly watched brands show up straight away
+            dates = [row[0] for row in conn.execute("SELECT DISTINCT date FROM inventory_events")]
+            evaluate_watchlists(conn, dates)
+        elif args.remove:
+            conn.execute('''DELETE FROM watchlist_alerts WHERE watchlist = ?
+                            AND brand_name NOT IN (SELECT brand_name FROM watchlist_brands WHERE watchlist = ?)''',
+                         (args.watchlist, args.watchlist))
+    brands = [row[0] for row in conn.execute(
+        "SELECT brand_name FROM watchlist_brands WHERE watchlist = ? ORDER BY brand_name", (args.watchlist,))]
+    print(f"{args.watchlist}: {', '.join(brands) or 'no brands'}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
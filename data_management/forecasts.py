@@ -0,0 +1,161 @@
+import json
+import math
+import os
+import sqlite3
+from datetime import date as Date, timedelta
+import numpy as np
+from dotenv import load_dotenv
+from storage_layouts import snapshot_dates_table
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Trend is fitted on the last WINDOW_DAYS days of history, with a
+# day-of-week offset per weekday when WEEKLY is on.
+WINDOW_DAYS = int(os.getenv('FORECAST_WINDOW_DAYS', 90))
+WEEKLY = os.getenv('FORECAST_WEEKLY', '1') == '1'
+# Projected stock-out/restock dates further out than this are not reported
+HORIZON_DAYS = int(os.getenv('FORECAST_HORIZON_DAYS', 365))
+
+
+def load_brand_series(conn, window_start):
+    """Daily totals per brand since window_start as (brands, dates, totals, observed).
+
+    totals and observed are (brands x dates) arrays; observed marks the
+    days a brand had at least one product in the snapshot.
+    """
+    rows = conn.execute('''SELECT i.brand_name, h.date, SUM(h.total_available)
+                           FROM historical_inventory h
+                           JOIN inventory i ON h.nc_code = i.nc_code
+                           WHERE h.date >= ?
+                           GROUP BY i.brand_name, h.date''', (window_start,)).fetchall()
+    brands = sorted({row[0] for row in rows})
+    dates = sorted({row[1] for row in rows})
+    brand_index = {brand: n for n, brand in enumerate(brands)}
+    date_index = {day: n for n, day in enumerate(dates)}
+    totals = np.zeros((len(brands), len(dates)))
+    observed = np.zeros((len(brands), len(dates)))
+    for brand, day, total in rows:
+        totals[brand_index[brand], date_index[day]] = total
+        observed[brand_index[brand], date_index[day]] = 1
+    return brands, dates, totals, observed
+
+
+def design_matrix(days, weekdays, weekly=WEEKLY):
+    """Columns: intercept, day number and, if weekly, Tuesday..Sunday indicators."""
+    columns = [np.ones(len(days)), np.asarray(days, dtype=float)]
+    if weekly:
+        columns += [(np.asarray(weekdays) == wd).astype(float) for wd in range(1, 7)]
+    return np.column_stack(columns)
+
+
+def fit_all(X, totals, observed):
+    """Least squares for every brand at once.
+
+    Solves the normal equations X'WX b = X'Wy for each brand in one batched
+    call, W being that brand's observed days. The pseudo-inverse keeps
+    brands with too few days (singular X'WX) from failing the batch.
+    """
+    xtx = np.einsum('bd,di,dj->bij', observed, X, X)
+    xty = np.einsum('bd,di,bd->bi', observed, X, totals)
+    return np.einsum('bij,bj->bi', np.linalg.pinv(xtx), xty)
+
+
+def project_dates(coefficients, weekly_mean, last_day, last_total, window_start):
+    """Projected (stockout_date, restock_date) from a brand's trend, either may be None."""
+    intercept = coefficients[0] + weekly_mean
+    slope = coefficients[1]
+    if slope == 0:
+        return None, None
+    # Rounded so float noise in the fit can't push a whole day either way
+    crossing = round(-intercept / slope, 6)
+    if last_total > 0 and slope < 0:
+        day = max(math.ceil(crossing), last_day + 1)
+        kind = 'stockout'
+    elif last_total <= 0 and slope > 0:
+        day = max(math.ceil(crossing), last_day + 1)
+        kind = 'restock'
+    else:
+        return None, None
+    if day - last_day > HORIZON_DAYS:
+        return None, None
+    projected = (window_start + timedelta(days=day)).isoformat()
+    return (projected, None) if kind == 'stockout' else (None, projected)
+
+
+def current_window_start(conn):
+    """First day of the fitting window ending at the latest snapshot, or None."""
+    latest = conn.execute(f"SELECT MAX(date) FROM {snapshot_dates_table(conn)}").fetchone()[0]
+    if latest is None:
+        return None
+    return Date.fromisoformat(latest) - timedelta(days=WINDOW_DAYS - 1)
+
+
+def fit_forecasts(conn, weekly=WEEKLY):
+    """Fit every brand on the latest window; returns brand_forecasts rows."""
+    window_start = current_window_start(conn)
+    if window_start is None:
+        return []
+    brands, days, totals, observed = load_brand_series(conn, window_start.isoformat())
+    if observed.size == 0:
+        # No brand has history in the window, e.g. inventory isn't loaded yet
+        return []
+    # The latest snapshot, also for brands last seen earlier in the window
+    window_end = (window_start + timedelta(days=WINDOW_DAYS - 1)).isoformat()
+    parsed = [Date.fromisoformat(day) for day in days]
+    offsets = [(day - window_start).days for day in parsed]
+    X = design_matrix(offsets, [day.weekday() for day in parsed], weekly)
+    coefficients = fit_all(X, totals, observed)
+
+    last_observed = observed.shape[1] - 1 - np.argmax(observed[:, ::-1], axis=1)
+    records = []
+    for n, brand in enumerate(brands):
+        coef = coefficients[n]
+        # Monday is the baseline day, so its offset is 0
+        weekly_offsets = [0.0] + [float(c) for c in coef[2:]] if weekly else [0.0] * 7
+        last = last_observed[n]
+        stockout, restock = project_dates(coef, float(np.mean(weekly_offsets)), offsets[last],
+                                          totals[n, last], window_start)
+        records.append((brand, window_start.isoformat(), window_end, int(observed[n].sum()),
+                        float(coef[0]), float(coef[1]), json.dumps(weekly_offsets),
+                        int(totals[n, last]), stockout, restock))
+    return records
+
+
+def store_forecasts(conn, records):
+    """Replace brand_forecasts with records. Runs inside the caller's transaction."""
+    conn.execute("DELETE FROM brand_forecasts")
+    conn.executemany('''INSERT INTO brand_forecasts (brand_name, window_start, window_end, observations,
+                                                     intercept, slope, weekly, last_total,
+                                                     stockout_date, restock_date, fitted_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))''', records)
+
+
+def refresh_forecasts(conn, dates=None):
+    """Refit and store every brand's forecast after an ingest touched dates.
+
+    Nothing is refitted when all of dates fall before the current window,
+    e.g. when old backups are reloaded. Returns the number of brands fitted.
+    """
+    window_start = current_window_start(conn)
+    if window_start is None or (dates and max(dates) < window_start.isoformat()):
+        return 0
+    records = fit_forecasts(conn)
+    with conn:
+        store_forecasts(conn, records)
+    return len(records)
+
+
+def main():
+    # Imported here: migrations imports this module for its backfill
+    from migrations import migrate
+
+    conn = sqlite3.connect(os.getenv("DB_FILE_PATH"))
+    migrate(conn)
+    fitted = refresh_forecasts(conn)
+    conn.close()
+    print(f"Fitted forecasts for {fitted} brands over the last {WINDOW_DAYS} days")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,165 +1,246 @@
+import matplotlib
+matplotlib.use('Agg')  # workers have no display
 import matplotlib.pyplot as plt
+import argparse
+import hashlib
+import json
+import re
 import sqlite3
 import datetime
+import time
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 import os
 import pandas as pd
+from storage_layouts import snapshot_dates_table
+from migrations import migrate
 
 # Load environment variables from .env file
 load_dotenv()
 
-
-def convert_size_to_ml(size):
-    """Convert different size formats to milliliters."""
-    try:
-        if 'L' in size.upper():
-            # Convert from liters to milliliters
-            return float(size.upper().replace('L', '')) * 1000
-        elif 'ML' in size.upper():
-            # Already in milliliters
-            return float(size.upper().replace('ML', ''))
-        else:
-            # Unknown format
-            return 0
-    except ValueError:
-        # Handle cases where the conversion to float fails
-        return 0
-
-
-def calculate_total_ml_available(row):
-    """Calculate total milliliters available for a brand."""
-    size_ml = convert_size_to_ml(row['size'])
-    return size_ml * row['total_available'] * row['cases_per_pallet']
-
-
-def process_query_results(rows):
-    for row in rows:
-        row['total_ml_available'] = calculate_total_ml_available(row)
-    return rows
-
-
-def generate_inventory_graph(conn):
-    cursor = conn.cursor()
-
-    # Query to get data (example: total inventory over time)
-    cursor.execute(
-        'SELECT date, SUM(total_available) FROM historical_inventory GROUP BY date')
-    data = cursor.fetchall()
-
-    # Separate the data into two lists for plotting
-    dates = [datetime.datetime.strptime(row[0], '%Y-%m-%d') for row in data]
-    totals = [row[1] for row in data]
-
-    # Generate the plot
+GRAPH_DIR = os.getenv('GRAPH_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'web', 'static', 'img', 'graphs'))
+# Brands are ranked by total cases over the WINDOW_DAYS ending at the latest snapshot
+WINDOW_DAYS = int(os.getenv('GRAPH_WINDOW_DAYS', 53))
+# Builds kept per figure; the home page lists every PNG in GRAPH_DIR
+KEEP_BUILDS = int(os.getenv('GRAPH_KEEP', 3))
+# What each figure was last drawn from, so unchanged ones aren't redrawn
+MANIFEST_FILE = '.graphs.json'
+
+# (file name part, title, first rank, last rank)
+BRAND_FIGURES = [('top8', 'Top 8 Brands - Inventory Over Time', 1, 8),
+                 ('top9t18', 'Brands 9-18 - Inventory Over Time', 9, 18),
+                 ('top50', 'Top 50 - Inventory Over Time', 1, 50)]
+
+GRAPH_FILE = re.compile(r'^(\d{8})_(.+)\.png$')
+
+
+def latest_snapshot_date(conn):
+    return conn.execute(f"SELECT MAX(date) FROM {snapshot_dates_table(conn)}").fetchone()[0]
+
+
+def load_daily_totals(conn):
+    """(dates, totals) for the total-cases figure, from the rollup the loaders keep current."""
+    rows = conn.execute('SELECT date, total_available FROM rollup_daily_totals ORDER BY date').fetchall()
+    return [row[0] for row in rows], [row[1] for row in rows]
+
+
+def rank_brands(conn, start_date, end_date, count):
+    """The count brands with the most cases over [start_date, end_date], largest first."""
+    cursor = conn.execute('''SELECT i.brand_name, SUM(h.total_available) as total
+                             FROM historical_inventory h
+                             JOIN inventory i ON h.nc_code = i.nc_code
+                             WHERE h.date BETWEEN ? AND ?
+                             GROUP BY i.brand_name
+                             ORDER BY total DESC, i.brand_name
+                             LIMIT ?''', (start_date, end_date, count))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def load_brand_volumes(conn, brands):
+    """DataFrame of brand_name, date, total: mL available per brand per snapshot."""
+    placeholders = ','.join('?' * len(brands))
+    # Sizes were parsed into products.size_ml at ingest
+    return pd.read_sql_query(f'''SELECT p.brand_name, h.date,
+                                      SUM(h.total_available * COALESCE(p.cases_per_pallet, 0)
+                                          * COALESCE(p.size_ml, 0)) AS total
+                               FROM products p
+                               JOIN historical_inventory h ON h.nc_code = p.source_code
+                               WHERE p.brand_name IN ({placeholders})
+                               GROUP BY p.brand_name, h.date
+                               ORDER BY p.brand_name, h.date''', conn, params=brands)
+
+
+def figure_specs(conn, end_date, window_days=WINDOW_DAYS):
+    """Everything each figure is drawn from, keyed by its file name part.
+
+    Brands are ranked once for all the brand figures.
+    """
+    file_date = end_date.replace('-', '')
+    dates, totals = load_daily_totals(conn)
+    specs = {'inv_over_time': {'file': f'{file_date}_inv_over_time.png',
+                               'title': 'Total Cases Over Time',
+                               'ylabel': 'Total Case Inventory',
+                               'marker': 'o',
+                               'series': [[None, dates, totals]]}}
+
+    start_date = (datetime.date.fromisoformat(end_date) - datetime.timedelta(days=window_days - 1)).isoformat()
+    ranked = rank_brands(conn, start_date, end_date, max(last for _, _, _, last in BRAND_FIGURES))
+    volumes = load_brand_volumes(conn, ranked) if ranked else None
+    by_brand = {} if volumes is None else {brand: group for brand, group in volumes.groupby('brand_name')}
+    for top, title, first, last in BRAND_FIGURES:
+        series = [[brand, by_brand[brand]['date'].tolist(), by_brand[brand]['total'].tolist()]
+                  for brand in ranked[first - 1:last] if brand in by_brand]
+        specs[f'brand_{top}'] = {'file': f'{file_date}_brand_{top}_inv_over_time.png',
+                                 'title': title,
+                                 'ylabel': 'Total mL Available',
+                                 'legend': True,
+                                 'series': series,
+                                 'window': [start_date, end_date]}
+    return specs
+
+
+def spec_digest(spec):
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+def render_figure(spec, path):
+    """Draw one figure and write it to path; runs in a worker process."""
     plt.figure(figsize=(15, 8))
     # Set the style of the plot to be suitable for dark mode
     plt.style.use('dark_background')
-    plt.plot(dates, totals, marker='o')
-    plt.title('Total Cases Over Time', color='white')
+    for label, dates, values in spec['series']:
+        plt.plot(pd.to_datetime(dates), values, label=label, marker=spec.get('marker'))
+    plt.title(spec['title'], color='white')
     plt.xlabel('Date', color='white')
-    plt.ylabel('Total Case Inventory', color='white')
+    plt.ylabel(spec['ylabel'], color='white')
+    if spec.get('legend') and spec['series']:
+        plt.legend()
     plt.grid(True, color='gray')
     plt.tight_layout()
 
-    date = datetime.datetime.now().strftime("%Y%m%d")
-    # Save the plot
-    plt.savefig(
-        f'../web/static/img/graphs/{date}_inv_over_time.png')
-
-
-def query_inventory_data(conn, limit, offset):
-    cursor = conn.cursor()
-
-    # Query to find top brands based on historical inventory levels
-    top_brands_query = '''
-    SELECT i.brand_name, SUM(h.total_available) as total
-    FROM historical_inventory h
-    JOIN inventory i ON h.nc_code = i.nc_code
-    WHERE h.date BETWEEN ? AND ?
-    GROUP BY i.brand_name
-    ORDER BY total DESC
-    LIMIT ? OFFSET ?
-    '''
-    start_date = '2023-10-01'
-    end_date = '2023-11-22'
-    # Execute the query with all four parameters
-    cursor.execute(top_brands_query, (start_date, end_date, limit, offset))
-    top_brands = [row[0] for row in cursor.fetchall()]
-
-    # Prepare placeholders for SQL IN clause
-    placeholders = ','.join('?' * len(top_brands))
-
-    # Query to get historical inventory data for these brands
-    historical_query = '''
-    SELECT i.brand_name, h.date, h.total_available, i.cases_per_pallet, i.size
-    FROM historical_inventory h
-    JOIN inventory i ON h.nc_code = i.nc_code
-    WHERE i.brand_name IN ({})
-    ORDER BY i.brand_name, h.date
-    '''.format(placeholders)
-
-    cursor.execute(historical_query, top_brands)
-    data = cursor.fetchall()
-
-    # Calculate total_ml_available and create a DataFrame
-    processed_data = []
-    for row in data:
-        # Assuming 'size' is the fifth column in the SELECT
-        size_ml = convert_size_to_ml(row[4])
-        # Assuming 'total_available' and 'cases_per_pallet' are the third and fourth columns
-        total_ml_available = size_ml * row[2] * row[3]
-        processed_data.append({
-            'brand_name': row[0],  # Assuming 'brand_name' is the first column
-            'date': row[1],  # Assuming 'date' is the second column
-            'total_ml_available': total_ml_available
-        })
-
-    return pd.DataFrame(processed_data, columns=['brand_name', 'date', 'total_ml_available'])
-
-
-def plot_inventory_trends(df, title, top):
-    plt.figure(figsize=(15, 8))
-    # Set the style of the plot to be suitable for dark mode
-    plt.style.use('dark_background')
-    for brand in df['brand_name'].unique():
-        brand_df = df[df['brand_name'] == brand]
-        plt.plot(brand_df['date'], brand_df['total'], label=brand)
-
-    plt.title(title, color='white')
-    plt.xlabel('Date', color='white')
-    plt.ylabel('Total mL Available', color='white')
-    plt.legend()
-    plt.grid(True, color='gray')
-
-    date = datetime.datetime.now().strftime("%Y%m%d")
-
-    # Save the plot with the current date in the filename
-    plt.savefig(
-        f'../web/static/img/graphs/{date}_brand_{top}_inv_over_time.png')
+    # The web app may list the directory mid-build; only finished files appear
+    tmp_path = path + '.tmp'
+    plt.savefig(tmp_path, format='png')
     plt.close()
+    os.replace(tmp_path, path)
+    return path
+
+
+def generate_inventory_graph(conn, graph_dir=GRAPH_DIR):
+    """Draw just the total-cases figure for the latest snapshot."""
+    end_date = latest_snapshot_date(conn)
+    if end_date is None:
+        return None
+    dates, totals = load_daily_totals(conn)
+    return render_figure({'title': 'Total Cases Over Time', 'ylabel': 'Total Case Inventory', 'marker': 'o',
+                          'series': [[None, dates, totals]]},
+                         os.path.join(graph_dir, f"{end_date.replace('-', '')}_inv_over_time.png"))
+
+
+def read_data_version(conn):
+    return conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()[0]
+
+
+def load_manifest(graph_dir):
+    path = os.path.join(graph_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_manifest(graph_dir, manifest):
+    path = os.path.join(graph_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def cleanup_graphs(graph_dir, keep=KEEP_BUILDS):
+    """Delete all but the newest `keep` dated PNGs of each figure; keep <= 0 keeps everything."""
+    if keep <= 0:
+        return []
+    builds = {}
+    for name in os.listdir(graph_dir):
+        match = GRAPH_FILE.match(name)
+        if match:
+            builds.setdefault(match.group(2), []).append(name)
+    removed = []
+    for names in builds.values():
+        for name in sorted(names, reverse=True)[keep:]:
+            os.remove(os.path.join(graph_dir, name))
+            removed.append(name)
+    return sorted(removed)
+
+
+def build_graphs(conn, graph_dir=GRAPH_DIR, window_days=WINDOW_DAYS, workers=1, keep=KEEP_BUILDS, force=False):
+    """Draw the home page figures that changed since the last build.
+
+    Nothing is queried when data_version and the window match the last
+    build. Otherwise each figure's inputs are loaded and only figures whose
+    inputs differ from what their existing PNG was drawn from are redrawn,
+    across `workers` processes. Returns (drawn, skipped, removed) file names.
+    """
+    os.makedirs(graph_dir, exist_ok=True)
+    end_date = latest_snapshot_date(conn)
+    if end_date is None:
+        return [], [], []
+    version = read_data_version(conn)
+    manifest = load_manifest(graph_dir)
+    figures = manifest.get('figures', {})
+
+    def drawn(entry):
+        return entry and os.path.exists(os.path.join(graph_dir, entry['file']))
+
+    if (not force and manifest.get('data_version') == version and manifest.get('window_days') == window_days
+            and figures and all(drawn(entry) for entry in figures.values())):
+        return [], sorted(entry['file'] for entry in figures.values()), cleanup_graphs(graph_dir, keep)
+
+    pending, skipped = {}, []
+    for name, spec in figure_specs(conn, end_date, window_days).items():
+        digest = spec_digest(spec)
+        entry = figures.get(name)
+        if not force and drawn(entry) and entry['digest'] == digest:
+            skipped.append(entry['file'])
+            continue
+        pending[name] = (spec, digest)
+
+    paths = [os.path.join(graph_dir, spec['file']) for spec, _ in pending.values()]
+    specs = [spec for spec, _ in pending.values()]
+    if workers > 1 and len(specs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(specs))) as pool:
+            list(pool.map(render_figure, specs, paths))
+    else:
+        for spec, path in zip(specs, paths):
+            render_figure(spec, path)
+
+    for name, (spec, digest) in pending.items():
+        figures[name] = {'file': spec['file'], 'digest': digest}
+    save_manifest(graph_dir, {'data_version': version, 'window_days': window_days, 'figures': figures})
+    return sorted(spec['file'] for spec in specs), sorted(skipped), cleanup_graphs(graph_dir, keep)
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Draw the graphs shown on the home page.')
+    parser.add_argument('--out', default=GRAPH_DIR, help='Directory for the PNGs (default: $GRAPH_DIR)')
+    parser.add_argument('--window-days', type=int, default=WINDOW_DAYS,
+                        help='Days before the latest snapshot that brands are ranked over')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--keep', type=int, default=KEEP_BUILDS,
+                        help='Builds kept per figure; 0 keeps them all')
+    parser.add_argument('--force', action='store_true', help='Redraw every figure')
+    args = parser.parse_args()
+
     db_file = os.getenv("DB_FILE_PATH")
     # Connect to the database
     conn = sqlite3.connect(db_file)
+    migrate(conn)
 
-    # Call the function to generate the graph
-    generate_inventory_graph(conn)
-
-    # Get data for top 15 brands
-    top_15_df = query_inventory_data(conn, 8, 0)
-    plot_inventory_trends(
-        top_15_df, 'Top 8 Brands - Inventory Over Time', "top8")
-
-    # Get data for brands ranked 16-31
-    next_16_df = query_inventory_data(conn, 9, 15)
-    plot_inventory_trends(
-        next_16_df, 'Brands 9-18 - Inventory Over Time', "top9t18")
-
-    top_50_df = query_inventory_data(conn, 50, 0)
-    plot_inventory_trends(
-        top_50_df, 'Top 50 - Inventory Over Time', "top50")
+    start = time.perf_counter()
+    drawn, skipped, removed = build_graphs(conn, args.out, args.window_days, args.workers, args.keep, args.force)
+    print(f"Drew {len(drawn)} graphs, {len(skipped)} unchanged, removed {len(removed)} old ones "
+          f"in {time.perf_counter() - start:.1f}s")
 
     # Close the database connection
     conn.close()
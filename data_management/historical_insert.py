@@ -2,8 +2,16 @@ import sqlite3
 import pandas as pd
 import os
 import glob
+import argparse
+import hashlib
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from dotenv import load_dotenv
+from ingest_hooks import run_post_ingest
+from csv_validator import quarantine, validate_files
+from change_storage import apply_staged_changes
 
 # Load environment variables from .env file
 load_dotenv()
@@ -62,11 +70,197 @@ def insert_historical_data(conn, df, date):
     # print(f"Data for date {date} inserted successfully.")
 
 
-def process_csv_files(folder_path, db_path):
+def load_supplier_map(conn):
+    """Return a {supplier name: id} dict so lookups don't cost a SELECT per row."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT name, id FROM suppliers")
+    return dict(cursor.fetchall())
+
+
+def prepare_historical_rows(df, date, supplier_map):
+    """Turn a backup DataFrame into (nc_code, date, total_available, supplier_id) tuples."""
+    df = df.drop(columns=[col for col in df.columns if 'Unnamed:' in col])
+    df = df.rename(columns={'NC Code': 'nc_code',
+                   'Total Available': 'total_available'})
+
+    # A file only ever holds one date, so de-duplicating on nc_code matches
+    # the (nc_code, date) de-duplication done by insert_historical_data
+    df = df.drop_duplicates(subset=['nc_code'])
+
+    supplier_ids = df['Supplier'].map(supplier_map)
+    supplier_ids = [None if pd.isna(sid) else int(sid) for sid in supplier_ids]
+
+    date_str = str(date)
+    return list(zip(df['nc_code'].tolist(),
+                    [date_str] * len(df),
+                    df['total_available'].tolist(),
+                    supplier_ids))
+
+
+INSERT_HISTORICAL_SQL = '''INSERT OR IGNORE INTO historical_inventory (nc_code, date, total_available, supplier_id) VALUES (?, ?, ?, ?)'''
+
+
+def write_historical_rows(conn, rows):
+    """Write prepared rows with one executemany inside one transaction.
+
+    Rows already present for (nc_code, date) are left untouched, the same as
+    insert_historical_data. Returns the number of rows actually inserted.
+    """
+    with conn:
+        return _insert_rows(conn, rows)
+
+
+def _insert_rows(conn, rows):
+    """Run INSERT_HISTORICAL_SQL over rows and return how many were new.
+
+    Counted from the table rather than taken from cursor.rowcount, which stays
+    at 0 when historical_inventory is the compact view and a trigger inserts.
+    In the change layout staged writes, including a DELETE just before, are
+    folded into runs before each count.
+    """
+    dates = sorted({row[1] for row in rows})
+    count_sql = f"SELECT COUNT(*) FROM historical_inventory WHERE date IN ({', '.join('?' * len(dates))})"
+    apply_staged_changes(conn)
+    before = conn.execute(count_sql, dates).fetchone()[0]
+    conn.executemany(INSERT_HISTORICAL_SQL, rows)
+    apply_staged_changes(conn)
+    return conn.execute(count_sql, dates).fetchone()[0] - before
+
+
+def insert_historical_data_bulk(conn, df, date, supplier_map=None):
+    """Insert one day's snapshot in a single transaction."""
+    if supplier_map is None:
+        supplier_map = load_supplier_map(conn)
+
+    rows = prepare_historical_rows(df, date, supplier_map)
+    return write_historical_rows(conn, rows)
+
+
+def initialize_manifest(conn):
+    """Create the table recording which backup files have been ingested."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS ingest_manifest (
+                        file_name TEXT PRIMARY KEY,
+                        size INTEGER,
+                        mtime REAL,
+                        content_hash TEXT,
+                        row_count INTEGER,
+                        ingested_at TEXT)''')
+    conn.commit()
+
+
+def load_manifest(conn):
+    """Return {file_name: (size, mtime, content_hash)} for every ingested file."""
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT file_name, size, mtime, content_hash FROM ingest_manifest")
+    return {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+
+def record_manifest_entry(conn, file_name, stat, content_hash, row_count):
+    conn.execute('''INSERT OR REPLACE INTO ingest_manifest (file_name, size, mtime, content_hash, row_count, ingested_at)
+                    VALUES (?, ?, ?, ?, ?, ?)''',
+                 (file_name, stat.st_size, stat.st_mtime, content_hash, row_count,
+                  datetime.now().isoformat(timespec='seconds')))
+
+
+def ingest_parsed_file(conn, file_name, date, rows, stat, content_hash, replace=False):
+    """Write one parsed file and its manifest entry in a single transaction.
+
+    With replace=True the day's existing rows are dropped first, so a backup
+    that changed after it was ingested overwrites the stale snapshot rather
+    than being ignored row by row.
+    """
+    with conn:
+        if replace:
+            conn.execute(
+                "DELETE FROM historical_inventory WHERE date = ?", (str(date),))
+        inserted = _insert_rows(conn, rows)
+        record_manifest_entry(conn, file_name, stat, content_hash, len(rows))
+    return inserted
+
+
+def parse_backup_file(file_path, supplier_map):
+    """Read and normalize one backup CSV into rows ready for the writer.
+
+    Returns (file_name, date, rows, content_hash, seconds); rows is None when
+    the file name is not a YYYYMMDD date or the file can't be parsed.
+    """
+    start = time.perf_counter()
+    file_name = os.path.basename(file_path)
+    date_str = file_name.split('.')[0]  # Extract date from filename
+    with open(file_path, 'rb') as file:
+        data = file.read()
+    content_hash = hashlib.sha256(data).hexdigest()
+    try:
+        date = datetime.strptime(
+            convert_date_format(date_str), "%Y-%m-%d").date()
+        rows = prepare_historical_rows(
+            pd.read_csv(io.BytesIO(data)), date, supplier_map)
+    except ValueError:
+        date, rows = None, None
+    return file_name, date, rows, content_hash, time.perf_counter() - start
+
+
+# Set in each pool worker by _init_parse_worker so the supplier map is
+# pickled once per process rather than once per file.
+_worker_supplier_map = None
+
+
+def _init_parse_worker(supplier_map):
+    global _worker_supplier_map
+    _worker_supplier_map = supplier_map
+
+
+def _parse_in_worker(file_path):
+    return parse_backup_file(file_path, _worker_supplier_map)
+
+
+def iter_parsed_files(file_paths, supplier_map, workers):
+    """Yield parse_backup_file results, in completion order when workers > 1."""
+    if workers <= 1:
+        for file_path in file_paths:
+            yield parse_backup_file(file_path, supplier_map)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_parse_worker,
+                             initargs=(supplier_map,)) as pool:
+        # map() hands results back in submission order, which would stall
+        # the writer behind one slow file; as_completed streams them instead.
+        futures = [pool.submit(_parse_in_worker, path) for path in file_paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def preflight(file_paths, quarantine_dir, workers=1):
+    """Validate file_paths before loading; returns the ones fit to load.
+
+    Files csv_validator rejects (empty, header only, truncated, malformed
+    rows) are moved to quarantine_dir, or just skipped if it is None.
+    """
+    results = validate_files(file_paths, workers)
+    rejected = [result for result in results if not result['valid']]
+    if quarantine_dir:
+        quarantine(rejected, quarantine_dir)
+    for result in rejected:
+        action = f"moved to {quarantine_dir}" if quarantine_dir else "skipped"
+        print(f"Invalid backup {result['file']} {result['counts']}: {action}")
+    return [result['path'] for result in results if result['valid']]
+
+
+def process_csv_files(folder_path, db_path, mode='bulk', workers=1, full_rescan=False,
+                      validate=True, quarantine_dir=None):
     conn = create_db_connection(db_path)
-    if conn is not None:
+    if conn is None:
+        return
+
+    file_paths = sorted(glob.glob(os.path.join(folder_path, '*.csv')))
+    if mode == 'row':
+        if validate:
+            file_paths = preflight(file_paths, quarantine_dir)
+        loaded_dates = []
         # Process each CSV file in the folder
-        for file_path in glob.glob(os.path.join(folder_path, '*.csv')):
+        for file_path in file_paths:
             print(f'Reading CSV file: {file_path}')
             file_name = os.path.basename(file_path)
             date_str = file_name.split('.')[0]  # Extract date from filename
@@ -78,15 +272,113 @@ def process_csv_files(folder_path, db_path):
                 df = pd.read_csv(file_path)
                 # print(f'DataFrame head after reading CSV: \n{df.head()}')
                 insert_historical_data(conn, df, date)
+                loaded_dates.append(str(date))
             except ValueError:
                 print(f"Invalid filename format: {file_name}")
 
+        run_post_ingest(conn, loaded_dates)
         conn.close()
+        return
 
+    # The pool only parses; this process is the single writer and owns the
+    # connection, so SQLite never sees concurrent write transactions.
+    wall_start = time.perf_counter()
+    parse_seconds = 0.0
+    write_seconds = 0.0
+    rows_inserted = 0
+    supplier_map = load_supplier_map(conn)
+
+    initialize_manifest(conn)
+    manifest = {} if full_rescan else load_manifest(conn)
+
+    # Files whose size and mtime match the manifest are skipped without
+    # being opened; everything else is read and hashed by the parse stage.
+    stats = {}
+    pending = []
+    unchanged = []
+    for file_path in file_paths:
+        file_name = os.path.basename(file_path)
+        stats[file_name] = os.stat(file_path)
+        entry = manifest.get(file_name)
+        if entry and entry[:2] == (stats[file_name].st_size, stats[file_name].st_mtime):
+            unchanged.append(file_name)
+        else:
+            pending.append(file_path)
+    if validate:
+        pending = preflight(pending, quarantine_dir, workers)
+
+    ingested = []
+    loaded_dates = []
+    for file_name, date, rows, content_hash, seconds in iter_parsed_files(pending, supplier_map, workers):
+        parse_seconds += seconds
+        if rows is None:
+            print(f"Invalid filename format: {file_name}")
+            continue
+
+        write_start = time.perf_counter()
+        entry = manifest.get(file_name)
+        if entry and entry[2] == content_hash:
+            # Touched but not modified; refresh size/mtime so the next run
+            # can skip it without hashing.
+            with conn:
+                record_manifest_entry(conn, file_name, stats[file_name],
+                                      content_hash, len(rows))
+            unchanged.append(file_name)
+            write_seconds += time.perf_counter() - write_start
+            continue
+
+        # A full rescan re-syncs every day, whatever the manifest says
+        inserted = ingest_parsed_file(conn, file_name, date, rows, stats[file_name],
+                                      content_hash, replace=full_rescan or entry is not None)
+        write_seconds += time.perf_counter() - write_start
+
+        ingested.append(file_name)
+        loaded_dates.append(str(date))
+        rows_inserted += inserted
+        print(f"Inserted {inserted} rows for {date} from {file_name}")
+
+    run_post_ingest(conn, loaded_dates)
+    conn.close()
+    wall_seconds = time.perf_counter() - wall_start
+
+    print(f"Skipped {len(unchanged)} unchanged files, ingested {len(ingested)}/{len(file_paths)} "
+          f"files, {rows_inserted} rows inserted, workers={workers}")
+    print(f"  parse: {parse_seconds:8.2f}s (summed across workers)")
+    print(f"  write: {write_seconds:8.2f}s")
+    print(f"  wall:  {wall_seconds:8.2f}s "
+          f"({rows_inserted / wall_seconds if wall_seconds else 0:,.0f} rows/sec)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load CSV backups into historical_inventory.')
+    parser.add_argument('--mode', choices=['bulk', 'row'], default='bulk',
+                        help='bulk: one executemany per file (default), '
+                             'row: legacy per-row SELECT/INSERT')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes parsing CSVs in bulk mode '
+                             '(default 1)')
+    parser.add_argument('--no-validate', dest='validate', action='store_false',
+                        help='Load files without checking them with csv_validator first')
+    parser.add_argument('--quarantine', metavar='DIR',
+                        help='Move invalid files into DIR (default: skip and report them, '
+                             'leaving them where they are)')
+    parser.add_argument('--full', action='store_true',
+                        help='Ignore the ingest manifest and re-read every file')
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+    if args.mode == 'row' and args.workers > 1:
+        parser.error('--workers only applies to --mode bulk')
 
-if __name__ == "__main__":
     db_file = os.getenv("DB_FILE_PATH")
     backup_dir = os.getenv("BACKUP_DIR")
     # folder_path = input("Enter the folder path containing CSV files: ")
     # db_path = input("Enter the path to your SQLite database file: ")
-    process_csv_files(backup_dir, db_file)
+    process_csv_files(backup_dir, db_file, mode=args.mode, validate=args.validate,
+                      quarantine_dir=args.quarantine,
+                      workers=args.workers, full_rescan=args.full)
+
+
+if __name__ == "__main__":
+    main()
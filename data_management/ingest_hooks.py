@@ -0,0 +1,49 @@
+from change_storage import apply_staged_changes
+from deltas import refresh_deltas
+from events import refresh_events
+from forecasts import refresh_forecasts
+from migrations import migrate
+from products import refresh_products
+from rollups import refresh_rollups
+from search_index import refresh_search_index
+
+
+def bump_data_version(conn):
+    """Advance the data_version stamp; the web tier drops cached results when it moves."""
+    migrate(conn)
+    with conn:
+        conn.execute('''UPDATE data_version
+                        SET version = version + 1, updated_at = datetime('now')
+                        WHERE id = 1''')
+    return conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()[0]
+
+
+def run_post_ingest(conn, dates, inventory_changed=False):
+    """Everything that has to happen after new snapshot dates were written.
+
+    Called once per ingest run by both loaders with the dates they touched;
+    inventory_changed is set when the current inventory table was rewritten.
+    """
+    if not dates:
+        return
+    migrate(conn)
+    # The loaders apply their own rows; this catches any other writer
+    with conn:
+        apply_staged_changes(conn)
+    refreshed = refresh_deltas(conn, dates)
+    print(f"Refreshed inventory deltas for {refreshed} dates")
+    if inventory_changed:
+        # The inventory is the report for the latest date loaded
+        with conn:
+            changed = refresh_products(conn, max(dates))
+            refresh_search_index(conn)
+        print(f"Recorded attribute changes for {changed} products")
+    # After products, so alerts name each product's current brand
+    refreshed, alerts = refresh_events(conn, dates)
+    print(f"Refreshed inventory events for {refreshed} dates, {alerts} watchlist alerts")
+    refresh_rollups(conn, dates, inventory_changed)
+    fitted = refresh_forecasts(conn, dates)
+    if fitted:
+        print(f"Refitted forecasts for {fitted} brands")
+    version = bump_data_version(conn)
+    print(f"Data version is now {version}")
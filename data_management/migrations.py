@@ -0,0 +1,201 @@
+import sqlite3
+import os
+from dotenv import load_dotenv
+from storage_layouts import snapshot_dates_table
+from deltas import backfill_deltas
+from events import backfill_events, create_event_tables
+from forecasts import fit_forecasts, store_forecasts
+from products import create_product_tables, refresh_products
+from rollups import backfill_daily_totals, rebuild_inventory_rollups
+from search_index import create_search_index, refresh_search_index
+from sizes import size_to_ml
+
+# Load environment variables from .env file
+load_dotenv()
+
+
+def _v1_date_first_indexes(conn):
+    """Covering indexes for date-first reads and brand/supplier filters."""
+    # compare_inventory_data, the range comparison, /available-dates and the
+    # index graphs all pick rows by date before anything else; the primary
+    # key leads with nc_code so it can't serve them.
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_historical_inventory_date
+                    ON historical_inventory (date, nc_code, total_available, supplier_id)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_inventory_brand_name
+                    ON inventory (brand_name)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_inventory_supplier_id
+                    ON inventory (supplier_id)''')
+
+
+def _v2_data_version(conn):
+    """Single-row stamp that ingest bumps so readers can drop cached results."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS data_version (
+                        id INTEGER PRIMARY KEY CHECK (id = 1),
+                        version INTEGER NOT NULL,
+                        updated_at TEXT)''')
+    conn.execute(
+        "INSERT OR IGNORE INTO data_version (id, version, updated_at) VALUES (1, 0, datetime('now'))")
+
+
+def _v3_inventory_deltas(conn):
+    """Per-day changes against the previous snapshot, so direct comparisons skip the self-join."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS inventory_deltas (
+                        date TEXT NOT NULL,
+                        nc_code TEXT NOT NULL,
+                        prev_date TEXT NOT NULL,
+                        prev_total INTEGER,
+                        total_available INTEGER,
+                        percentage_change REAL NOT NULL,
+                        PRIMARY KEY (date, nc_code)) WITHOUT ROWID''')
+    # Serves "top movers for a day" straight off the index, LIMIT included
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_inventory_deltas_change
+                    ON inventory_deltas (date, percentage_change DESC)''')
+    backfill_deltas(conn)
+
+
+def _v4_rollups(conn):
+    """Pre-aggregated tables for the /data-analysis graphs."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS rollup_daily_totals (
+                        date TEXT PRIMARY KEY,
+                        total_available INTEGER NOT NULL) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS rollup_brand_totals (
+                        brand_name TEXT,
+                        total_available INTEGER,
+                        volume_ml INTEGER)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_rollup_brand_totals_total
+                    ON rollup_brand_totals (total_available DESC)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_rollup_brand_totals_volume
+                    ON rollup_brand_totals (volume_ml DESC)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS rollup_supplier_totals (
+                        supplier_name TEXT PRIMARY KEY,
+                        total_available INTEGER)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS rollup_size_counts (
+                        size TEXT,
+                        occurrences INTEGER NOT NULL)''')
+    backfill_daily_totals(conn)
+    _v4_inventory_rollups(conn)
+
+
+def _v4_inventory_rollups(conn):
+    """The brand, supplier and size rollups as v4 shipped them, parsing sizes per row.
+
+    rollups.rebuild_inventory_rollups now reads products, which only exists
+    from v6 on; v6 rebuilds these from it.
+    """
+    conn.create_function('size_to_ml', 1, size_to_ml, deterministic=True)
+    conn.execute("DELETE FROM rollup_brand_totals")
+    conn.execute('''INSERT INTO rollup_brand_totals (brand_name, total_available, volume_ml)
+                    SELECT brand_name, SUM(total_available),
+                           SUM(total_available * COALESCE(size_to_ml(size), 0))
+                    FROM inventory GROUP BY brand_name''')
+    conn.execute("DELETE FROM rollup_supplier_totals")
+    conn.execute('''INSERT INTO rollup_supplier_totals (supplier_name, total_available)
+                    SELECT suppliers.name, SUM(inventory.total_available)
+                    FROM inventory JOIN suppliers ON inventory.supplier_id = suppliers.id
+                    GROUP BY suppliers.name''')
+    conn.execute("DELETE FROM rollup_size_counts")
+    conn.execute('''INSERT INTO rollup_size_counts (size, occurrences)
+                    SELECT size, COUNT(*) FROM inventory GROUP BY size''')
+
+
+def _v5_brand_forecasts(conn):
+    """Per-brand trend fitted at ingest, with projected stock-out and restock dates."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS brand_forecasts (
+                        brand_name TEXT PRIMARY KEY,
+                        window_start TEXT NOT NULL,
+                        window_end TEXT NOT NULL,
+                        observations INTEGER NOT NULL,
+                        intercept REAL NOT NULL,
+                        slope REAL NOT NULL,
+                        weekly TEXT NOT NULL,
+                        last_total INTEGER,
+                        stockout_date TEXT,
+                        restock_date TEXT,
+                        fitted_at TEXT)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_brand_forecasts_stockout
+                    ON brand_forecasts (stockout_date)''')
+    store_forecasts(conn, fit_forecasts(conn))
+
+
+def _v6_products(conn):
+    """Product dimension with parsed sizes and canonical codes, plus attribute history."""
+    create_product_tables(conn)
+    # The current inventory is as of the latest snapshot
+    as_of = conn.execute(f"SELECT MAX(date) FROM {snapshot_dates_table(conn)}").fetchone()[0]
+    refresh_products(conn, as_of or conn.execute("SELECT date('now')").fetchone()[0])
+    rebuild_inventory_rollups(conn)
+
+
+def _v7_inventory_events(conn):
+    """Restock, stock-out and jump events per product, and the watchlists checked against them."""
+    create_event_tables(conn)
+    backfill_events(conn)
+
+
+def _v8_brand_search(conn):
+    """FTS5 indexes of brand, supplier and broker names for the brand typeahead."""
+    create_search_index(conn)
+    refresh_search_index(conn)
+
+
+# Ordered list of (schema version, migration). The database records the last
+# version applied in PRAGMA user_version, so each step runs exactly once.
+MIGRATIONS = [
+    (1, _v1_date_first_indexes),
+    (2, _v2_data_version),
+    (3, _v3_inventory_deltas),
+    (4, _v4_rollups),
+    (5, _v5_brand_forecasts),
+    (6, _v6_products),
+    (7, _v7_inventory_events),
+    (8, _v8_brand_search),
+]
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Apply every pending migration, then refresh planner statistics.
+
+    Each migration runs in its own transaction together with the version
+    bump, so an interrupted upgrade can simply be re-run. Returns the list of
+    versions applied.
+    """
+    applied = []
+    for version, migration in MIGRATIONS:
+        if version <= schema_version(conn):
+            continue
+        try:
+            conn.execute('BEGIN')
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            # Backfills run Python (pandas, numpy) as well as SQL; any
+            # failure must leave the schema at the previous version
+            conn.rollback()
+            raise
+        applied.append(version)
+
+    if applied:
+        conn.execute('ANALYZE')
+        conn.commit()
+    return applied
+
+
+def main():
+    db_file = os.getenv("DB_FILE_PATH")
+    conn = sqlite3.connect(db_file)
+    applied = migrate(conn)
+    if applied:
+        print(f"Migrated {db_file} to schema version {schema_version(conn)} "
+              f"(applied {', '.join(map(str, applied))})")
+    else:
+        print(f"{db_file} is already at schema version {schema_version(conn)}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from ingest_hooks import bump_data_version
+
+# Load environment variables from .env file
+load_dotenv()
+
+STATE_FILE = '_sync_state.json'
+
+
+def month_signatures(conn):
+    """Return {'YYYY-MM': [row count, total_available sum]} for historical_inventory."""
+    cursor = conn.cursor()
+    cursor.execute('''SELECT substr(date, 1, 7) AS month, COUNT(*), SUM(total_available)
+                      FROM historical_inventory GROUP BY month''')
+    return {row[0]: [row[1], row[2]] for row in cursor.fetchall()}
+
+
+def _write_atomically(table, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+
+def export_month(conn, month, out_dir):
+    """Write one month of history to <out_dir>/historical_inventory/month=YYYY-MM/."""
+    df = pd.read_sql_query('''SELECT date, nc_code, total_available, supplier_id
+                              FROM historical_inventory
+                              WHERE date BETWEEN ? AND ?
+                              ORDER BY date, nc_code''',
+                           conn, params=(f"{month}-01", f"{month}-31"))
+    df['date'] = pd.to_datetime(df['date']).dt.date
+    df['supplier_id'] = df['supplier_id'].astype('Int64')
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    _write_atomically(table, os.path.join(
+        out_dir, 'historical_inventory', f'month={month}', 'part-0.parquet'))
+    return len(df)
+
+
+def export_inventory(conn, out_dir):
+    """Write the current inventory, with supplier and broker names resolved."""
+    df = pd.read_sql_query('''SELECT i.nc_code, i.brand_name, i.total_available, i.size,
+                                     i.cases_per_pallet, s.name AS supplier_name, b.name AS broker_name,
+                                     p.size_ml
+                              FROM inventory i
+                              LEFT JOIN products p ON p.source_code = i.nc_code
+                              LEFT JOIN suppliers s ON i.supplier_id = s.id
+                              LEFT JOIN brokers b ON i.broker_id = b.id''', conn)
+    df['size_ml'] = df['size_ml'].astype('Int64')
+    _write_atomically(pa.Table.from_pandas(df, preserve_index=False),
+                      os.path.join(out_dir, 'inventory.parquet'))
+    return len(df)
+
+
+def sync_parquet(conn, out_dir, full=False):
+    """Bring the Parquet snapshot in out_dir up to date with the database.
+
+    Only months whose row count or quantity total changed since the last sync
+    are rewritten. data_version is bumped afterwards, so the web tier's
+    cached figures and ETags pick the export up. Returns the list of months
+    written.
+    """
+    state_path = os.path.join(out_dir, STATE_FILE)
+    previous = {}
+    if not full and os.path.exists(state_path):
+        with open(state_path) as file:
+            previous = json.load(file)
+
+    current = month_signatures(conn)
+    changed = sorted(month for month, sig in current.items()
+                     if previous.get(month) != sig)
+    for month in changed:
+        rows = export_month(conn, month, out_dir)
+        print(f"Wrote {rows} rows for {month}")
+
+    for month in set(previous) - set(current):
+        shutil.rmtree(os.path.join(out_dir, 'historical_inventory',
+                      f'month={month}'), ignore_errors=True)
+
+    export_inventory(conn, out_dir)
+
+    os.makedirs(out_dir, exist_ok=True)
+    with open(state_path + '.tmp', 'w') as file:
+        json.dump(current, file, indent=1, sort_keys=True)
+    os.replace(state_path + '.tmp', state_path)
+    bump_data_version(conn)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Export inventory history as Parquet, one partition per month.')
+    parser.add_argument('--out', default=os.getenv('PARQUET_DIR', 'parquet'),
+                        help='Output directory (default: $PARQUET_DIR or ./parquet)')
+    parser.add_argument('--full', action='store_true',
+                        help='Rewrite every month instead of only changed ones')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    conn = sqlite3.connect(os.getenv("DB_FILE_PATH"))
+    changed = sync_parquet(conn, args.out, full=args.full)
+    conn.close()
+    print(f"Synced {len(changed)} months to {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+from sizes import size_to_ml
+
+# One row per product with its attributes parsed once at ingest, so readers
+# multiply integers instead of parsing '.75L' or '="00009"' per row.
+
+
+def canonical_nc_code(code):
+    """'="00009"' (the export's Excel literal) -> '00009'; plain codes pass through."""
+    if code is None:
+        return None
+    code = code.strip()
+    if code.startswith('="') and code.endswith('"'):
+        code = code[2:-1]
+    return code.strip()
+
+
+def register_product_functions(conn):
+    """Expose canonical_nc_code and size_to_ml to SQL on this connection."""
+    conn.create_function('canonical_nc_code', 1, canonical_nc_code, deterministic=True)
+    conn.create_function('size_to_ml', 1, size_to_ml, deterministic=True)
+
+
+def create_product_tables(conn):
+    # source_code is the key the other tables still use ('="00009"')
+    conn.execute('''CREATE TABLE IF NOT EXISTS products (
+                        nc_code TEXT PRIMARY KEY,
+                        source_code TEXT UNIQUE NOT NULL,
+                        brand_name TEXT,
+                        size TEXT,
+                        size_ml INTEGER,
+                        cases_per_pallet INTEGER,
+                        supplier_id INTEGER,
+                        broker_id INTEGER,
+                        FOREIGN KEY (supplier_id) REFERENCES suppliers (id),
+                        FOREIGN KEY (broker_id) REFERENCES brokers (id))''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_products_brand_name
+                    ON products (brand_name, size_ml, cases_per_pallet)''')
+    # Brand, supplier and broker as of each report date; valid_to is the
+    # first date they no longer held, NULL for the current row.
+    conn.execute('''CREATE TABLE IF NOT EXISTS product_history (
+                        nc_code TEXT NOT NULL,
+                        valid_from TEXT NOT NULL,
+                        valid_to TEXT,
+                        brand_name TEXT,
+                        supplier_id INTEGER,
+                        broker_id INTEGER,
+                        PRIMARY KEY (nc_code, valid_from)) WITHOUT ROWID''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_product_history_changes
+                    ON product_history (valid_from)''')
+
+
+def refresh_products(conn, as_of):
+    """Bring products in line with the current inventory, as reported on as_of.
+
+    Products whose brand, supplier or broker changed (or that are new) get a
+    product_history row starting at as_of, closing the previous one. Runs
+    inside the caller's transaction; returns the number of products that
+    changed.
+    """
+    register_product_functions(conn)
+    changed = conn.execute('''SELECT canonical_nc_code(i.nc_code), i.brand_name, i.supplier_id, i.broker_id
+                              FROM inventory i
+                              LEFT JOIN products p ON p.source_code = i.nc_code
+                              WHERE p.nc_code IS NULL
+                                 OR p.brand_name IS NOT i.brand_name
+                                 OR p.supplier_id IS NOT i.supplier_id
+                                 OR p.broker_id IS NOT i.broker_id''').fetchall()
+    conn.executemany('''UPDATE product_history SET valid_to = ?
+                        WHERE nc_code = ? AND valid_to IS NULL AND valid_from < ?''',
+                     [(as_of, row[0], as_of) for row in changed])
+    # A second load on the same date overwrites that date's row
+    conn.executemany('''INSERT INTO product_history (nc_code, valid_from, brand_name, supplier_id, broker_id)
+                        VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT (nc_code, valid_from) DO UPDATE SET
+                            brand_name = excluded.brand_name,
+                            supplier_id = excluded.supplier_id,
+                            broker_id = excluded.broker_id''',
+                     [(row[0], as_of) + tuple(row[1:]) for row in changed])
+
+    conn.execute('''INSERT INTO products (nc_code, source_code, brand_name, size, size_ml,
+                                          cases_per_pallet, supplier_id, broker_id)
+                    SELECT canonical_nc_code(nc_code), nc_code, brand_name, size, size_to_ml(size),
+                           cases_per_pallet, supplier_id, broker_id
+                    FROM inventory WHERE true
+                    ON CONFLICT (nc_code) DO UPDATE SET
+                        source_code = excluded.source_code,
+                        brand_name = excluded.brand_name,
+                        size = excluded.size,
+                        size_ml = excluded.size_ml,
+                        cases_per_pallet = excluded.cases_per_pallet,
+                        supplier_id = excluded.supplier_id,
+                        broker_id = excluded.broker_id''')
+    return len(changed)
@@ -1,7 +1,146 @@
-import requests
-import datetime
 import argparse
+import datetime
+import json
+import os
+import random
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+EXPORT_URL = 'https://abc2.nc.gov/StoresBoards/ExportExcel'
+CHECKPOINT_FILE = '.fetch_checkpoint.json'
+
+# Worth another try: throttling and server-side hiccups
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_local = threading.local()
+
+
+def get_session(pool_size):
+    """One keep-alive session per worker thread; requests.Session isn't thread-safe."""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _local.session = session
+    return session
+
+
+def date_range(start_date, end_date):
+    day = start_date
+    while day <= end_date:
+        yield day
+        day += datetime.timedelta(days=1)
+
+
+def backup_path(out_dir, day):
+    return os.path.join(out_dir, day.strftime('%Y%m%d.csv'))
+
+
+def write_atomically(path, content):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+
+
+class Checkpoint:
+    """The last error per failed date, saved after every change.
+
+    Which days are done is read from out_dir itself, so a deleted backup
+    is fetched again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.failed = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as file:
+                self.failed = json.load(file).get('failed', {})
+
+    def mark(self, key, error=None):
+        with self._lock:
+            if error is None:
+                if self.failed.pop(key, None) is None:
+                    return
+            else:
+                self.failed[key] = error
+            write_atomically(self.path, json.dumps({'failed': self.failed}, indent=1).encode())
+
+
+def fetch_day(url, day, retries=5, backoff=1.0, timeout=60, pool_size=4):
+    """POST the export request for one day; returns the CSV bytes.
+
+    Connection errors and RETRY_STATUSES are retried with exponential
+    backoff plus jitter, honouring Retry-After. Anything else raises.
+    """
+    cookies = {'BrandName': '', 'ReportDate': day.strftime('%m/%d/%Y')}
+    session = get_session(pool_size)
+    for attempt in range(retries + 1):
+        try:
+            response = session.post(url, cookies=cookies, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            error = str(exc)
+            delay = backoff * 2 ** attempt
+        else:
+            if response.status_code == 200:
+                return response.content
+            error = f'status {response.status_code}'
+            if response.status_code not in RETRY_STATUSES:
+                break
+            retry_after = response.headers.get('Retry-After', '')
+            delay = float(retry_after) if retry_after.isdigit() else backoff * 2 ** attempt
+        if attempt < retries:
+            time.sleep(delay + random.uniform(0, backoff))
+    raise RuntimeError(f'{day:%Y%m%d}: {error}')
+
+
+def fetch_range(start_date, end_date, out_dir, url=EXPORT_URL, workers=4, retries=5, backoff=1.0,
+                checkpoint_path=None, force=False):
+    """Download every day in [start_date, end_date] into out_dir.
+
+    Days with a file already in out_dir are skipped unless force is set.
+    A failed day is recorded in the checkpoint and the rest of the range
+    carries on. Returns (fetched, skipped, failed).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint = Checkpoint(checkpoint_path or os.path.join(out_dir, CHECKPOINT_FILE))
+
+    pending = []
+    skipped = 0
+    for day in date_range(start_date, end_date):
+        if not force and os.path.exists(backup_path(out_dir, day)):
+            skipped += 1
+        else:
+            pending.append(day)
+
+    fetched, failed = 0, []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(fetch_day, url, day, retries, backoff, pool_size=workers): day
+                   for day in pending}
+        for future in as_completed(futures):
+            day = futures[future]
+            key = day.strftime('%Y%m%d')
+            try:
+                write_atomically(backup_path(out_dir, day), future.result())
+            except Exception as exc:
+                failed.append(key)
+                checkpoint.mark(key, str(exc))
+                sys.stderr.write(f'Failed to fetch {key}: {exc}\n')
+                continue
+            fetched += 1
+            checkpoint.mark(key)
+            print(f'Saved {backup_path(out_dir, day)}')
+    return fetched, skipped, sorted(failed)
 
 
 def main():
@@ -12,62 +151,34 @@ def main():
                         help='Start date in YYYYMMDD format')
     parser.add_argument('--date_end', required=True,
                         help='End date in YYYYMMDD format')
+    parser.add_argument('--out', default=os.getenv('BACKUP_DIR', '.'),
+                        help='Directory for the CSVs (default: $BACKUP_DIR or .)')
+    parser.add_argument('--url', default=os.getenv('EXPORT_URL', EXPORT_URL))
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Days downloaded at once')
+    parser.add_argument('--retries', type=int, default=5)
+    parser.add_argument('--backoff', type=float, default=1.0,
+                        help='Seconds before the first retry; doubles each time')
+    parser.add_argument('--checkpoint',
+                        help=f'Where failed days are recorded (default: <out>/{CHECKPOINT_FILE})')
+    parser.add_argument('--force', action='store_true',
+                        help='Download days that already have a file')
     args = parser.parse_args()
 
     # Convert start and end dates to datetime objects
-    start_date = datetime.datetime.strptime(args.date_start, '%Y%m%d')
-    end_date = datetime.datetime.strptime(args.date_end, '%Y%m%d')
-    print(f'Start date: {start_date.strftime("%Y%m%d")}')
-    print(f'End date: {end_date.strftime("%Y%m%d")}')
-
-    # URL and initial cookies
-    url = 'https://abc2.nc.gov/StoresBoards/ExportExcel'
-
-    # Iterate through the date range
-    current_date = start_date
-    print(f'Current date: {current_date.strftime("%Y%m%d")}')
-
-    print(f'URL: {url}')
-    print(f'Checking if {current_date} is >= {end_date}')
-    while current_date <= end_date:
-        print(f'Current date: {current_date.strftime("%Y%m%d")}')
-        print(f'End date: {end_date.strftime("%Y%m%d")}')
-        # Prepare the cookies for the current date
-        cookies = {'BrandName': '',
-                   'ReportDate': current_date.strftime('%m/%d/%Y')}
-        print(f'Cookies: {cookies}')
-        # Make the POST request
-        response = requests.post(url, cookies=cookies)
-
-        # Write request and response information to sys.stdout
-        sys.stdout.write(
-            f'Sending POST request to {url} for {current_date.strftime("%Y%m%d")}\n')
-        sys.stdout.write(f'Response status code: {response.status_code}\n')
-        sys.stdout.flush()  # Ensure immediate output
-
-        # Check if the request was successful (status code 200)
-        print(f'Checking if {response.status_code} == 200')
-        if response.status_code == 200:
-            print(f'{response.status_code} == 200')
-            # Specify the file name with the current date
-            file_name = current_date.strftime('%Y%m%d.csv')
-
-            # Save the response content as a CSV file
-            with open(file_name, 'wb') as file:
-                file.write(response.content)
-
-            sys.stdout.write(f'Successfully saved CSV file as {file_name}\n')
-            sys.stdout.flush()  # Ensure immediate output
-        else:
-            sys.stderr.write(
-                f'Failed to make the POST request for {current_date.strftime("%Y%m%d")}. Status code: {response.status_code}\n')
-            sys.stderr.flush()  # Ensure immediate output
-            break
-
-        # Move to the next date
-        print(f'Completed for {current_date}')
-        current_date += datetime.timedelta(days=1)
-        print(f'Moving on to {current_date}')
+    start_date = datetime.datetime.strptime(args.date_start, '%Y%m%d').date()
+    end_date = datetime.datetime.strptime(args.date_end, '%Y%m%d').date()
+
+    start = time.perf_counter()
+    fetched, skipped, failed = fetch_range(start_date, end_date, args.out, url=args.url,
+                                           workers=args.workers, retries=args.retries,
+                                           backoff=args.backoff, checkpoint_path=args.checkpoint,
+                                           force=args.force)
+    print(f'Fetched {fetched} days, skipped {skipped} already present, '
+          f'{len(failed)} failed in {time.perf_counter() - start:.1f}s')
+    if failed:
+        print(f'Failed: {", ".join(failed)} (re-run to retry them)')
+        sys.exit(1)
 
 
 if __name__ == "__main__":
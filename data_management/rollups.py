@@ -0,0 +1,58 @@
+# Aggregates behind /data-analysis, kept current by the ingest hook so the
+# page reads a few small tables instead of grouping all of history.
+
+
+def refresh_daily_totals(conn, dates):
+    """Recompute rollup_daily_totals for the given snapshot dates."""
+    dates = sorted(set(dates))
+    if not dates:
+        return
+    placeholders = ', '.join('?' * len(dates))
+    # A date whose rows were all removed drops out of the rollup too
+    conn.execute(f"DELETE FROM rollup_daily_totals WHERE date IN ({placeholders})", dates)
+    conn.execute(f'''INSERT INTO rollup_daily_totals (date, total_available)
+                     SELECT date, SUM(total_available) FROM historical_inventory
+                     WHERE date IN ({placeholders})
+                     GROUP BY date''', dates)
+
+
+def rebuild_inventory_rollups(conn):
+    """Rebuild the brand, supplier and size rollups from the current inventory.
+
+    Volumes use products.size_ml, so refresh_products() has to run first.
+    """
+    conn.execute("DELETE FROM rollup_brand_totals")
+    conn.execute('''INSERT INTO rollup_brand_totals (brand_name, total_available, volume_ml)
+                    SELECT i.brand_name, SUM(i.total_available),
+                           SUM(i.total_available * COALESCE(p.size_ml, 0))
+                    FROM inventory i LEFT JOIN products p ON p.source_code = i.nc_code
+                    GROUP BY i.brand_name''')
+    conn.execute("DELETE FROM rollup_supplier_totals")
+    conn.execute('''INSERT INTO rollup_supplier_totals (supplier_name, total_available)
+                    SELECT suppliers.name, SUM(inventory.total_available)
+                    FROM inventory JOIN suppliers ON inventory.supplier_id = suppliers.id
+                    GROUP BY suppliers.name''')
+    conn.execute("DELETE FROM rollup_size_counts")
+    conn.execute('''INSERT INTO rollup_size_counts (size, occurrences)
+                    SELECT size, COUNT(*) FROM inventory GROUP BY size''')
+
+
+def refresh_rollups(conn, dates, inventory_changed=False):
+    """Bring the rollups up to date after an ingest touched the given dates."""
+    with conn:
+        refresh_daily_totals(conn, dates)
+        if inventory_changed:
+            rebuild_inventory_rollups(conn)
+
+
+def backfill_daily_totals(conn):
+    """Rebuild rollup_daily_totals from all of history. Runs inside the caller's transaction."""
+    conn.execute("DELETE FROM rollup_daily_totals")
+    conn.execute('''INSERT INTO rollup_daily_totals (date, total_available)
+                    SELECT date, SUM(total_available) FROM historical_inventory GROUP BY date''')
+
+
+def backfill_rollups(conn):
+    """Build every rollup from scratch. Runs inside the caller's transaction."""
+    backfill_daily_totals(conn)
+    rebuild_inventory_rollups(conn)
@@ -0,0 +1,32 @@
+# Full-text indexes behind /brands/search: one row per brand with the names
+# of its suppliers and brokers. brand_search matches whole words and word
+# prefixes; brand_search_trigram, keyed by the same rowid, matches any three
+# letters of the brand so misspelt queries still find something.
+
+
+def create_search_index(conn):
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS brand_search USING fts5(
+                        brand_name, supplier_names, broker_names,
+                        tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3')''')
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS brand_search_trigram USING fts5(
+                        brand_name, tokenize = 'trigram')''')
+
+
+def refresh_search_index(conn):
+    """Rebuild both indexes from the current inventory; runs inside the caller's transaction.
+
+    Rowids follow brand order, so an empty search can page through brands
+    alphabetically by rowid. Returns the number of brands indexed.
+    """
+    conn.execute("DELETE FROM brand_search")
+    conn.execute("DELETE FROM brand_search_trigram")
+    cursor = conn.execute('''INSERT INTO brand_search (rowid, brand_name, supplier_names, broker_names)
+                             SELECT ROW_NUMBER() OVER (ORDER BY i.brand_name), i.brand_name,
+                                    GROUP_CONCAT(DISTINCT s.name), GROUP_CONCAT(DISTINCT b.name)
+                             FROM inventory i
+                             LEFT JOIN suppliers s ON s.id = i.supplier_id
+                             LEFT JOIN brokers b ON b.id = i.broker_id
+                             WHERE i.brand_name IS NOT NULL
+                             GROUP BY i.brand_name''')
+    conn.execute("INSERT INTO brand_search_trigram (rowid, brand_name) SELECT rowid, brand_name FROM brand_search")
+    return cursor.rowcount
@@ -0,0 +1,15 @@
+import re
+
+# Bottle sizes as the state's feed writes them: '.75L', '1.75L', '50ML'
+_SIZE = re.compile(r'^\s*(\d*\.?\d+)\s*(ML|L)\s*$', re.IGNORECASE)
+
+
+def size_to_ml(size):
+    """Parse a size string into whole millilitres, or None if it isn't one."""
+    match = _SIZE.match(size or '')
+    if match is None:
+        return None
+    amount, unit = match.groups()
+    if unit.upper() == 'L':
+        return round(float(amount) * 1000)
+    return round(float(amount))
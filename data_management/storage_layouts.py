@@ -0,0 +1,18 @@
+# Layout checks shared by the loaders and the web tier. Deliberately free of
+# import-time side effects (no load_dotenv), so the web process can import
+# it without picking up this folder's .env.
+
+
+def uses_change_storage(conn):
+    """True once change_storage.convert_to_changes() has run on this database."""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                        "AND name = 'historical_inventory_runs'").fetchone() is not None
+
+
+def snapshot_dates_table(conn):
+    """Table to read snapshot dates from: snapshot_days in the change layout.
+
+    Asking the view for MAX(date) or DISTINCT date would rebuild every
+    product's row for every day first.
+    """
+    return 'snapshot_days' if uses_change_storage(conn) else 'historical_inventory'
@@ -0,0 +1,100 @@
+import argparse
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ExportHandler(BaseHTTPRequestHandler):
+    """Answers ExportExcel POSTs with the backup CSV for the ReportDate cookie.
+
+    A GET returns the newest backup, like the current-inventory report
+    data_management.py downloads. It is sent in chunks without a
+    Content-Length, as a slow export would arrive.
+    """
+
+    # Chunked transfer encoding needs HTTP/1.1
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        names = sorted(name for name in os.listdir(self.server.backup_dir) if name.endswith('.csv'))
+        if not names:
+            self.send_error(404)
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        with open(os.path.join(self.server.backup_dir, names[-1]), 'rb') as file:
+            for chunk in iter(lambda: file.read(64 * 1024), b''):
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+        self.wfile.write(b'0\r\n\r\n')
+
+    def do_POST(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        if random.random() < server.failure_rate:
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        cookie = SimpleCookie(self.headers.get('Cookie', ''))
+        try:
+            day = datetime.strptime(cookie['ReportDate'].value, '%m/%d/%Y')
+        except (KeyError, ValueError):
+            self.send_error(400, 'Missing or bad ReportDate cookie')
+            return
+        path = os.path.join(server.backup_dir, day.strftime('%Y%m%d.csv'))
+        if not os.path.exists(path):
+            self.send_error(404)
+            return
+        with open(path, 'rb') as file:
+            body = file.read()
+        with server.lock:
+            server.requests_served += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(backup_dir, host='127.0.0.1', port=0, failure_rate=0.0, latency=0.0):
+    """ThreadingHTTPServer replaying backup_dir; port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), ExportHandler)
+    server.backup_dir = backup_dir
+    server.failure_rate = failure_rate
+    server.latency = latency
+    server.requests_served = 0
+    server.lock = threading.Lock()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve csv_bkups the way the ABC export endpoint does, for testing the fetcher.')
+    parser.add_argument('--dir', default=os.path.join(os.path.dirname(__file__), 'csv_bkups'))
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help='Fraction of requests answered with 503')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds to wait before every response')
+    args = parser.parse_args()
+
+    server = make_server(args.dir, port=args.port, failure_rate=args.failure_rate, latency=args.latency)
+    print(f'Serving {args.dir} at http://127.0.0.1:{server.server_address[1]}/StoresBoards/ExportExcel')
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
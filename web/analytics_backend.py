@@ -0,0 +1,178 @@
+import os
+import pandas as pd
+
+# Every backend returns the same DataFrames (same column names and order) so
+# the routes that draw the figures don't care where the numbers came from.
+# Bottle sizes are parsed once, at ingest/export time, by
+# data_management/sizes.py; the backends only read the resulting mL.
+
+
+def sql_string(value):
+    """value as a single-quoted SQL string literal."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+class SQLiteBackend:
+    """Read the rollup tables the ingest hook maintains in inventory.db."""
+
+    name = 'sqlite'
+
+    def __init__(self, connect):
+        self.connect = connect
+
+    def _query(self, sql, params=()):
+        conn = self.connect()
+        try:
+            return pd.read_sql_query(sql, conn, params=params)
+        finally:
+            conn.close()
+
+    def daily_totals(self):
+        return self._query(
+            "SELECT date, total_available as sum_of_total_available FROM rollup_daily_totals ORDER BY date")
+
+    def brand_totals(self, limit=15):
+        return self._query(
+            "SELECT brand_name, total_available as sum_of_total_available FROM rollup_brand_totals ORDER BY total_available DESC LIMIT ?", (limit,))
+
+    def size_counts(self):
+        return self._query(
+            "SELECT size as bottle_size, occurrences as count_of_size_occurrence FROM rollup_size_counts")
+
+    def supplier_totals(self, limit=15):
+        return self._query(
+            "SELECT supplier_name as name, total_available as sum_of_inv_total_avail FROM rollup_supplier_totals ORDER BY total_available DESC LIMIT ?", (limit,))
+
+    def brand_volumes(self, limit=15):
+        return self._query(
+            "SELECT brand_name, volume_ml as total_volume_ml FROM rollup_brand_totals ORDER BY volume_ml DESC LIMIT ?", (limit,))
+
+
+class ArrowBackend:
+    """Memory-mapped Arrow dataset over the Parquet export."""
+
+    name = 'arrow'
+
+    def __init__(self, parquet_dir):
+        self.history_path = os.path.join(parquet_dir, 'historical_inventory')
+        self.inventory_path = os.path.join(parquet_dir, 'inventory.parquet')
+
+    def _history(self):
+        import pyarrow.dataset as ds
+        import pyarrow.fs as fs
+
+        # Discovered on every call: parquet_export.py adds month partitions
+        # while workers keep running
+        return ds.dataset(self.history_path, format='parquet', partitioning='hive',
+                          filesystem=fs.LocalFileSystem(use_mmap=True))
+
+    def _inventory(self):
+        import pyarrow.parquet as pq
+        return pq.read_table(self.inventory_path, memory_map=True).to_pandas()
+
+    @staticmethod
+    def _top(df, by, value, name, limit):
+        totals = df.groupby(by, dropna=False, sort=False)[value].sum()
+        totals = totals.sort_values(ascending=False, kind='stable').head(limit)
+        return totals.rename(name).reset_index()
+
+    def daily_totals(self):
+        table = self._history().to_table(columns=['date', 'total_available'])
+        totals = table.group_by('date').aggregate([('total_available', 'sum')])
+        df = totals.to_pandas().rename(
+            columns={'total_available_sum': 'sum_of_total_available'})
+        df['date'] = df['date'].astype(str)
+        return df.sort_values('date', ignore_index=True)[['date', 'sum_of_total_available']]
+
+    def brand_totals(self, limit=15):
+        return self._top(self._inventory(), 'brand_name', 'total_available', 'sum_of_total_available', limit)
+
+    def size_counts(self):
+        counts = self._inventory().groupby('size', dropna=False).size()
+        return counts.rename('count_of_size_occurrence').rename_axis('bottle_size').reset_index()
+
+    def supplier_totals(self, limit=15):
+        df = self._inventory().dropna(subset=['supplier_name'])
+        df = df.rename(columns={'supplier_name': 'name'})
+        return self._top(df, 'name', 'total_available', 'sum_of_inv_total_avail', limit)
+
+    def brand_volumes(self, limit=15):
+        df = self._inventory()
+        df['total_volume_ml'] = df['total_available'] * df['size_ml'].fillna(0).astype('int64')
+        return self._top(df, 'brand_name', 'total_volume_ml', 'total_volume_ml', limit)
+
+
+class DuckDBBackend:
+    """DuckDB SQL over the Parquet export."""
+
+    name = 'duckdb'
+
+    def __init__(self, parquet_dir):
+        import duckdb
+
+        self.conn = duckdb.connect()
+        history_glob = os.path.join(
+            parquet_dir, 'historical_inventory', '*', '*.parquet')
+        # Views can't take bound parameters, so the paths go in as quoted
+        # literals. read_parquet globs again on every query.
+        self.conn.execute(f"""CREATE VIEW historical_inventory AS
+                              SELECT * FROM read_parquet({sql_string(history_glob)}, hive_partitioning = true)""")
+        self.conn.execute(f"""CREATE VIEW inventory AS
+                              SELECT * FROM read_parquet({sql_string(os.path.join(parquet_dir, 'inventory.parquet'))})""")
+
+    def _query(self, sql, params=()):
+        # A cursor per call: DuckDB connections must not be shared across
+        # the threads a Flask worker may serve requests on.
+        cursor = self.conn.cursor()
+        try:
+            return cursor.execute(sql, list(params)).df()
+        finally:
+            cursor.close()
+
+    def daily_totals(self):
+        return self._query("""SELECT CAST(date AS VARCHAR) AS date, CAST(SUM(total_available) AS BIGINT) AS sum_of_total_available
+                              FROM historical_inventory GROUP BY date ORDER BY date""")
+
+    def brand_totals(self, limit=15):
+        return self._query("""SELECT brand_name, CAST(SUM(total_available) AS BIGINT) AS sum_of_total_available
+                              FROM inventory GROUP BY brand_name
+                              ORDER BY sum_of_total_available DESC LIMIT ?""", (limit,))
+
+    def size_counts(self):
+        return self._query("""SELECT size AS bottle_size, COUNT(*) AS count_of_size_occurrence
+                              FROM inventory GROUP BY size""")
+
+    def supplier_totals(self, limit=15):
+        return self._query("""SELECT supplier_name AS name, CAST(SUM(total_available) AS BIGINT) AS sum_of_inv_total_avail
+                              FROM inventory WHERE supplier_name IS NOT NULL GROUP BY supplier_name
+                              ORDER BY sum_of_inv_total_avail DESC LIMIT ?""", (limit,))
+
+    def brand_volumes(self, limit=15):
+        return self._query("""SELECT brand_name, CAST(SUM(total_available * COALESCE(size_ml, 0)) AS BIGINT) AS total_volume_ml
+                              FROM inventory GROUP BY brand_name
+                              ORDER BY total_volume_ml DESC LIMIT ?""", (limit,))
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'arrow': ArrowBackend,
+    'duckdb': DuckDBBackend,
+}
+
+_instances = {}
+
+
+def get_backend(name, connect, parquet_dir):
+    """Return a shared backend instance; the Parquet ones are created once per process.
+
+    Neither caches the export's file list, so months written later are
+    read without a restart.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown ANALYTICS_BACKEND {name!r}; expected one of {sorted(BACKENDS)}")
+    if name == 'sqlite':
+        return SQLiteBackend(connect)
+    key = (name, parquet_dir)
+    if key not in _instances:
+        _instances[key] = BACKENDS[name](parquet_dir)
+    return _instances[key]
@@ -1,10 +1,20 @@
 from flask import Flask
+import db
+import metrics
 from blueprints.inventory import inventory_bp
+from config import Config
 
 app = Flask(__name__)
+app.config.from_object(Config)
+db.init_app(app)
+if app.config['METRICS_ENABLED']:
+    metrics.init_app(app)
 
 # Register Blueprints
 app.register_blueprint(inventory_bp, url_prefix='/')
+if app.config['ENABLE_ANALYTICS']:
+    from blueprints.analytics import analytics_bp
+    app.register_blueprint(analytics_bp, url_prefix='/')
 
 if __name__ == '__main__':
     app.run(debug=True)
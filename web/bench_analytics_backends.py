@@ -0,0 +1,60 @@
+import argparse
+import os
+import sqlite3
+import statistics
+import time
+
+from analytics_backend import BACKENDS, get_backend
+
+# The five /data-analysis graphs, in page order.
+GRAPHS = ['daily_totals', 'brand_totals', 'size_counts', 'supplier_totals', 'brand_volumes']
+
+
+def connect():
+    conn = sqlite3.connect(os.getenv('DB_FILE_PATH'))
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def comparable(df):
+    """Row order of ties and GROUP BY output differs between engines; sort it away."""
+    df = df.copy()
+    df.columns = range(len(df.columns))
+    return sorted(map(tuple, df.astype(str).values.tolist()))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time the /data-analysis queries on each analytics backend.')
+    parser.add_argument('--parquet-dir', default=os.getenv('PARQUET_DIR', '../data_management/parquet'))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS))
+    args = parser.parse_args()
+
+    reference = {}
+    print(f"{'graph':<16}" + ''.join(f"{name:>12}" for name in args.backends) + '   (median ms)')
+    timings = {name: {} for name in args.backends}
+    for name in args.backends:
+        start = time.perf_counter()
+        backend = get_backend(name, connect, args.parquet_dir)
+        timings[name]['open'] = (time.perf_counter() - start) * 1000
+        for graph in GRAPHS:
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                df = getattr(backend, graph)()
+                samples.append((time.perf_counter() - start) * 1000)
+            timings[name][graph] = statistics.median(samples)
+            rows = comparable(df)
+            reference.setdefault(graph, (name, rows))
+            if rows != reference[graph][1]:
+                print(f"WARNING: {name}.{graph} differs from {reference[graph][0]}")
+
+    for graph in ['open'] + GRAPHS:
+        print(f"{graph:<16}" + ''.join(f"{timings[name][graph]:>12.1f}" for name in args.backends))
+    print(f"{'total':<16}" + ''.join(
+        f"{sum(timings[name][g] for g in GRAPHS):>12.1f}" for name in args.backends))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import os
+import sqlite3
+import statistics
+import threading
+import time
+
+from app import app
+from config import Config
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def consecutive_date_pairs():
+    conn = sqlite3.connect(os.getenv('DB_FILE_PATH'))
+    dates = [row[0] for row in conn.execute(
+        "SELECT DISTINCT date FROM historical_inventory ORDER BY date")]
+    conn.close()
+    return list(zip(dates, dates[1:]))
+
+
+def run(name, request, total, concurrency):
+    """Fire total requests from concurrency threads; returns latencies in ms."""
+    latencies = []
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            start = time.perf_counter()
+            response = request(client, n)
+            elapsed = (time.perf_counter() - start) * 1000
+            assert response.status_code == 200, (name, response.status_code)
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare request latency with and without the SQLite connection pool.')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    pairs = consecutive_date_pairs()
+    endpoints = {
+        '/available-dates': lambda client, n: client.get('/available-dates'),
+        # A different pair each time so the result cache doesn't answer
+        'POST / (direct)': lambda client, n: client.post('/', data={
+            'comparisonType': 'direct', 'date1': pairs[-1 - n % len(pairs)][0],
+            'date2': pairs[-1 - n % len(pairs)][1]}),
+    }
+
+    pool_size = Config.SQLITE_POOL_SIZE or 8
+    print(f"{'endpoint':<20}{'mode':<10}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for name, request in endpoints.items():
+        for mode, size in [('fresh', 0), ('pooled', pool_size)]:
+            Config.SQLITE_POOL_SIZE = size
+            from blueprints.inventory import cache
+            cache.clear()
+            run(name, request, min(50, args.requests), args.concurrency)  # warm up
+            cache.clear()
+            latencies = run(name, request, args.requests, args.concurrency)
+            print(f"{name:<20}{mode:<10}{percentile(latencies, 50):>10.2f}"
+                  f"{percentile(latencies, 99):>10.2f}{statistics.mean(latencies):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Runs in a fresh interpreter per sample so nothing is already imported.
+CHILD = '''
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+rss_import = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+client = app.app.test_client()
+for url in sys.argv[1:]:
+    client.get(url)
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'rss_import_mb': rss_import / 1024,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy_modules': sorted(m for m in ('pandas', 'numpy', 'plotly.express', 'pyarrow', 'duckdb', 'sklearn')
+                            if m in sys.modules),
+}))
+'''
+
+
+def sample(urls, env):
+    output = subprocess.run([sys.executable, '-c', CHILD, *urls], env=env, check=True,
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure cold import time and per-worker memory of the Flask app.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--urls', nargs='*', default=['/available-dates', '/available-suppliers'],
+                        help='Requests a worker serves before memory is read')
+    parser.add_argument('--max-import-ms', type=float,
+                        help='Exit non-zero if the median import time is above this')
+    parser.add_argument('--max-rss-mb', type=float,
+                        help='Exit non-zero if the median RSS after --urls is above this')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    samples = [sample(args.urls, env) for _ in range(args.repeat)]
+    import_ms = statistics.median(s['import_ms'] for s in samples)
+    rss_import = statistics.median(s['rss_import_mb'] for s in samples)
+    rss = statistics.median(s['rss_mb'] for s in samples)
+    print(f"import app:            {import_ms:8.1f} ms (median of {args.repeat})")
+    print(f"RSS after import:      {rss_import:8.1f} MB")
+    print(f"RSS after requests:    {rss:8.1f} MB")
+    print(f"heavy modules loaded:  {', '.join(samples[-1]['heavy_modules']) or 'none'}")
+
+    failed = False
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"FAIL: import time above {args.max_import_ms} ms")
+        failed = True
+    if args.max_rss_mb is not None and rss > args.max_rss_mb:
+        print(f"FAIL: RSS above {args.max_rss_mb} MB")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+from flask import Blueprint, render_template, request, jsonify, current_app, Response, make_response, send_file
+import json
+from blueprints.inventory import cache, get_db_connection
+from figures import PLOTLY_JS_PATH, PLOTLY_VERSION, cached_figures, figures_etag
+
+# Graph pages. pandas, NumPy and plotly.express are imported inside the
+# functions that build figures, so workers that never draw one don't pay
+# for them; set ENABLE_ANALYTICS=0 to leave this blueprint out entirely.
+analytics_bp = Blueprint('analytics_bp', __name__)
+
+
+def get_analytics_backend():
+    from analytics_backend import get_backend
+
+    return get_backend(current_app.config.get('ANALYTICS_BACKEND', 'sqlite'),
+                       get_db_connection, current_app.config.get('PARQUET_DIR'))
+
+
+def render_figures(template, key, build, **context):
+    """Render a page of figures, answering 304 when the browser's copy is current.
+
+    The ETag follows the data version, so a page only changes after ingest;
+    the serialized figures are cached under the same version.
+    """
+    etag = figures_etag(cache.version(), key)
+    if etag and request.method in ('GET', 'HEAD') and request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        figures = cached_figures(cache, key, build)
+        response = make_response(render_template(
+            template, figures=figures, plotly_version=PLOTLY_VERSION, **context))
+    if etag:
+        response.set_etag(etag)
+        # Browsers may keep the page but must revalidate it each time
+        response.cache_control.no_cache = True
+    return response
+
+
+@analytics_bp.route('/plotly.min.js')
+def plotly_js():
+    # Versioned URL (?v=), so it can be cached for good
+    return send_file(PLOTLY_JS_PATH, mimetype='text/javascript', max_age=365 * 24 * 60 * 60)
+
+
+def brand_figures(selected_brands):
+    """Five figures per brand, in the order the brands were picked."""
+    import plotly.express as px
+    from brand_analytics import brand_datasets, forecast_trend, load_brand_history, load_forecasts
+
+    conn = get_db_connection()
+    history = load_brand_history(conn, selected_brands)
+    forecasts = load_forecasts(conn, selected_brands)
+    conn.close()
+    datasets = brand_datasets(history)
+
+    figures = []
+    # Brands without history are skipped
+    for brand in selected_brands:
+        if brand not in datasets:
+            continue
+        data = datasets[brand]
+
+        # Graph 1: Brand's Inventory Over Time with Predictive Trend
+        df = data['daily']
+        fig = px.scatter(df, x='date', y='total_available',
+                         title=f'Inventory Over Time for {brand}')
+        # Trend fitted at ingest, projected a month past the last snapshot
+        if brand in forecasts:
+            trend = forecast_trend(forecasts[brand])
+            fig.add_scatter(x=trend['date'], y=trend['predicted'],
+                            mode='lines', name='Predicted')
+        fig.update_layout(plot_bgcolor='rgba(0,0,0,0)',
+                          paper_bgcolor='rgba(0,0,0,0)', font_color='white')
+        figures.append(fig)
+
+        # Graph 2: Average Monthly Inventory Levels
+        fig_monthly = px.bar(data['monthly'], x='month', y='avg_available',
+                             title=f'Average Monthly Inventory for {brand}')
+        fig_monthly.update_layout(
+            plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color='white')
+        figures.append(fig_monthly)
+
+        # Graph 3: Rate of Inventory Change
+        fig_rate = px.line(data['rate'], x='date', y='rate_change',
+                           title=f'Rate of Inventory Change for {brand}')
+        fig_rate.update_layout(plot_bgcolor='rgba(0,0,0,0)',
+                               paper_bgcolor='rgba(0,0,0,0)', font_color='white')
+        figures.append(fig_rate)
+
+        # Graph 4: Inventory Size Distribution Over Time
+        fig_size = px.bar(data['sizes'], x='date', y='total_available',
+                          color='size', title=f'Inventory Size Distribution for {brand}')
+        fig_size.update_layout(plot_bgcolor='rgba(0,0,0,0)',
+                               paper_bgcolor='rgba(0,0,0,0)', font_color='white')
+        figures.append(fig_size)
+
+        # Graph 5: Supplier and Broker Influence on Inventory
+        fig_supplier_broker = px.line(data['supplier_broker'], x='date', y='total_available',
+                                      color='supplier_broker', title=f'Supplier and Broker Influence for {brand}')
+        fig_supplier_broker.update_traces(mode='markers+lines')
+        fig_supplier_broker.update_layout(
+            plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color='white')
+        figures.append(fig_supplier_broker)
+
+    return figures
+
+
+@analytics_bp.route('/forecasts')
+def forecasts():
+    """Stored brand forecasts, soonest projected stock-out first."""
+    brands = request.args.getlist('brand')
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    query = '''SELECT brand_name, window_start, window_end, observations, intercept, slope, weekly,
+                      last_total, stockout_date, restock_date, fitted_at
+               FROM brand_forecasts'''
+    params = []
+    if brands:
+        query += f" WHERE brand_name IN ({', '.join('?' * len(brands))})"
+        params += brands
+    elif request.args.get('projected'):
+        # Only brands with a projected stock-out or restock
+        query += " WHERE stockout_date IS NOT NULL OR restock_date IS NOT NULL"
+    query += " ORDER BY stockout_date IS NULL, stockout_date, restock_date IS NULL, restock_date, brand_name LIMIT ?"
+    params.append(limit)
+
+    conn = get_db_connection()
+    rows = [dict(row) for row in conn.execute(query, params)]
+    conn.close()
+    for row in rows:
+        row['weekly'] = json.loads(row['weekly'])
+    return jsonify(rows)
+
+
+@analytics_bp.route('/brand-analysis', methods=['GET', 'POST'])
+def brand_analysis():
+    selected_brands = list(dict.fromkeys(request.values.getlist('brand[]')))
+    # The selector only carries the chosen brands; it looks up others
+    # through /brands/search as the user types
+    return render_figures('brand_analysis.html', 'figures-brand-' + json.dumps(selected_brands),
+                          lambda: brand_figures(selected_brands),
+                          selected_brands=selected_brands)
+
+
+def data_analysis_figures(backend):
+    import plotly.express as px
+
+    # Graph 1: Inventory Levels Over Time (Aggregated by Day)
+    df = backend.daily_totals()
+    fig1 = px.line(df, x='date', y='sum_of_total_available', title='Aggregated Inventory Over Time',
+                   labels={'date': 'Date', 'sum_of_total_available': 'Current Sum of Total Available Cases'})
+    fig1.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font_color='white'
+    )
+
+    # Graph 2: Brand-wise Inventory Distribution (Top 15)
+    brand_df = backend.brand_totals(15)
+    fig2 = px.bar(brand_df, x='brand_name', y='sum_of_total_available',
+                  title='Top 15 Brand-wise Inventory Distribution',
+                  labels={'brand_name': 'Brand Name', 'sum_of_total_available': 'Current Sum of Total Available Cases'})
+    fig2.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font_color='white'
+    )
+
+    # Graph 3: Inventory Size Distribution
+    size_df = backend.size_counts()
+    fig3 = px.bar(size_df, x='bottle_size', y='count_of_size_occurrence',
+                  title='Inventory Size Distribution',
+                  labels={'bottle_size': 'Size of Bottle', 'count_of_size_occurrence': 'Current Count of Occurence of Bottle Size'})
+    fig3.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font_color='white'
+    )
+
+    # Graph 4: Supplier Contribution to Inventory (Top 15)
+    supplier_df = backend.supplier_totals(15)
+    fig4 = px.bar(supplier_df, x='name', y='sum_of_inv_total_avail',
+                  title='Current Top 15 Supplier Contribution to Inventory',
+                  labels={'name': 'Supplier', 'sum_of_inv_total_avail': 'Current Sum of Total Available Cases'})
+    fig4.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font_color='white'
+    )
+
+    # Graph 5: Top 15 Brands by Total Volume (ML)
+    volume_df = backend.brand_volumes(15)
+    fig5 = px.bar(volume_df, x='brand_name', y='total_volume_ml', title='Top 15 Brands by Total Volume (mL)',
+                  labels={'brand_name': 'Brand Name', 'total_volume_ml': 'Current Sum of Total Volume (mL)'})
+    fig5.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font_color='white'
+    )
+
+    return [fig1, fig2, fig3, fig4, fig5]
+
+
+@analytics_bp.route('/data-analysis')
+def data_analysis():
+    backend = get_analytics_backend()
+    return render_figures('data_analysis.html', f'figures-data-analysis-{backend.name}',
+                          lambda: data_analysis_figures(backend))
@@ -1,100 +1,153 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, current_app, Response, stream_with_context
+import bisect
+import itertools
 import sqlite3
 import os
-import pandas as pd
-import plotly.express as px
-from sklearn.linear_model import LinearRegression
-import numpy as np
+import sys
+import db
+import metrics
+from brand_search import search_brands
+from cache import ResultCache, make_store
+from config import Config
+
+# The storage layout helpers are shared with the ingest scripts
+sys.path.insert(0, os.path.join(os.path.dirname(
+    __file__), '..', '..', 'data_management'))
+from storage_layouts import snapshot_dates_table, uses_change_storage  # noqa: E402
 
 inventory_bp = Blueprint('inventory_bp', __name__)
 
-# Global cache dictionary
-cache = {}
 
-
-def generate_cache_key(date1, date2, suppliers):
+def generate_cache_key(date1, date2, suppliers, limit=None, offset=0):
     supplier_key = '-'.join(sorted(suppliers)) if suppliers else 'all'
-    return f"{date1}-{date2}-{supplier_key}"
+    return f"{date1}-{date2}-{supplier_key}-{limit}-{offset}"
 
 
-def generate_cache_key_date_range(start_date, end_date, suppliers):
+def generate_cache_key_date_range(start_date, end_date, suppliers, after=None, page_size=None):
     supplier_key = '-'.join(sorted(suppliers)) if suppliers else 'all'
-    return f"range-{start_date}-{end_date}-{supplier_key}"
+    return f"range-{start_date}-{end_date}-{supplier_key}-{after}-{page_size}"
 
 
 def get_db_connection():
-    conn = sqlite3.connect(os.getenv('DB_FILE_PATH'))
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Pooled; close() returns it, and teardown returns it if nobody did
+    return db.connect(os.getenv('DB_FILE_PATH'))
+
+
+def read_data_version():
+    """Current data_version stamp, bumped by the ingest scripts after each load."""
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            "SELECT version FROM data_version WHERE id = 1").fetchone()
+        return row[0] if row else None
+    except sqlite3.OperationalError:
+        # Database predates the data_version migration
+        return None
+    finally:
+        conn.close()
+
+
+# Comparison results, bounded and dropped whenever a new day is ingested
+cache = ResultCache(make_store(Config.CACHE_BACKEND, max_entries=Config.CACHE_MAX_ENTRIES,
+                               max_bytes=Config.CACHE_MAX_BYTES, path=Config.CACHE_PATH),
+                    ttl=Config.CACHE_TTL, version_source=read_data_version,
+                    version_check_interval=Config.CACHE_VERSION_CHECK_SECONDS)
+metrics.register_cache('results', cache)
 
 
-def compare_inventory_data(date1, date2, suppliers=None):
-    key = generate_cache_key(date1, date2, suppliers)
+def previous_snapshot_date(conn, date):
+    return conn.execute(
+        f"SELECT MAX(date) FROM {snapshot_dates_table(conn)} WHERE date < ?", (date,)).fetchone()[0]
 
-    if key in cache:
-        print("Fetching results from cache")
-        return cache[key]
+
+def compare_inventory_data(date1, date2, suppliers=None, limit=None, offset=0):
+    key = generate_cache_key(date1, date2, suppliers, limit, offset)
+
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
 
     conn = get_db_connection()
-    query = '''SELECT h1.nc_code, i.brand_name, h1.total_available as total_available_date1,
-               h2.total_available as total_available_date2, s.name as supplier_name
-               FROM historical_inventory h1
-               JOIN historical_inventory h2 ON h1.nc_code = h2.nc_code
-               JOIN inventory i ON h1.nc_code = i.nc_code'''
+    try:
+        # Consecutive snapshots are pre-computed in inventory_deltas at ingest
+        use_deltas = previous_snapshot_date(conn, date2) == date1
+        if use_deltas:
+            conn.execute("SELECT 1 FROM inventory_deltas LIMIT 1")
+    except sqlite3.OperationalError:
+        # Database predates the inventory_deltas migration
+        use_deltas = False
+
+    if use_deltas:
+        query = '''SELECT d.nc_code, i.brand_name, d.prev_total as total_available_date1,
+                   d.total_available as total_available_date2, s.name as supplier_name,
+                   d.percentage_change
+                   FROM inventory_deltas d
+                   JOIN inventory i ON d.nc_code = i.nc_code'''
+        where = ' WHERE d.date = ? AND d.prev_date = ?'
+        params = [date2, date1]
+        nc_code = 'd.nc_code'
+    else:
+        # Same arithmetic as inventory_deltas: abs(t2 - t1) / (t1 + 1) * 100
+        query = '''SELECT h1.nc_code, i.brand_name, h1.total_available as total_available_date1,
+                   h2.total_available as total_available_date2, s.name as supplier_name,
+                   ABS(h2.total_available - h1.total_available) * 1.0
+                       / (h1.total_available + 1) * 100 as percentage_change
+                   FROM historical_inventory h1
+                   JOIN historical_inventory h2 ON h1.nc_code = h2.nc_code
+                   JOIN inventory i ON h1.nc_code = i.nc_code'''
+        where = ' WHERE h1.date = ? AND h2.date = ? AND h1.total_available != h2.total_available'
+        params = [date1, date2]
+        nc_code = 'h1.nc_code'
 
     # Adjusting JOIN based on suppliers parameter
     if suppliers and 'all' not in suppliers:
-        query += ' INNER JOIN suppliers s ON i.supplier_id = s.id'
-        query += ' WHERE h1.date = ? AND h2.date = ? AND h1.total_available != h2.total_available'
+        query += ' INNER JOIN suppliers s ON i.supplier_id = s.id' + where
         placeholders = ', '.join('?' * len(suppliers))
         query += f" AND s.name IN ({placeholders})"
-        params = [date1, date2] + suppliers
+        params += suppliers
     else:
-        query += ' LEFT JOIN suppliers s ON i.supplier_id = s.id'
-        query += ' WHERE h1.date = ? AND h2.date = ? AND h1.total_available != h2.total_available'
-        params = [date1, date2]
+        query += ' LEFT JOIN suppliers s ON i.supplier_id = s.id' + where
+
+    # Largest movers first; LIMIT -1 means no limit in SQLite
+    query += f' ORDER BY percentage_change DESC, {nc_code} LIMIT ? OFFSET ?'
+    params += [limit if limit is not None else -1, offset]
 
     cursor = conn.cursor()
     cursor.execute(query, params)
-    raw_rows = cursor.fetchall()
+    rows = [dict(row) for row in cursor.fetchall()]
     conn.close()
 
-    # Convert rows to dictionaries and calculate percentage change
-    rows = []
-    for row in raw_rows:
-        dict_row = dict(row)
-        total_available_date1 = dict_row['total_available_date1']
-        total_available_date2 = dict_row['total_available_date2']
-        dict_row['percentage_change'] = abs(
-            total_available_date2 - total_available_date1) / (total_available_date1 + 1) * 100
-        rows.append(dict_row)
-
-    # Sort rows by percentage change
-    rows.sort(key=lambda x: x['percentage_change'], reverse=True)
-
     # Cache the results
-    cache[key] = rows
+    cache.set(key, rows)
     return rows
 
 
-def compare_inventory_data_date_range(start_date, end_date, suppliers=None):
-    # Generate a unique cache key for date range
-    key = generate_cache_key_date_range(start_date, end_date, suppliers)
+def range_dates(start_date, end_date):
+    conn = get_db_connection()
+    dates = [row[0] for row in conn.execute(
+        f"SELECT DISTINCT date FROM {snapshot_dates_table(conn)} WHERE date BETWEEN ? AND ? ORDER BY date",
+        (start_date, end_date))]
+    conn.close()
+    return dates
+
+
+def iter_range_brands(start_date, end_date, suppliers=None, after=None):
+    """Yield (brand_name, {'supplier_name', 'totals': {date: total}}) in brand order.
 
-    # Check if the results are in cache
-    if key in cache:
-        print("Fetching results from cache")
-        return cache[key]
+    Rows come off the cursor one brand at a time, so memory use depends on
+    the number of days in the range, not the number of rows. Brands sort
+    after `after` when given, which is how the JSON API pages.
+    """
     conn = get_db_connection()
-    cursor = conn.cursor()
+    if uses_change_storage(conn):
+        yield from _iter_range_brands_from_runs(conn, start_date, end_date, suppliers, after)
+        return
 
-    # SQL query to fetch inventory data between start_date and end_date
-    query = '''SELECT h1.nc_code, i.brand_name, h1.date, h1.total_available, s.name as supplier_name
-               FROM historical_inventory h1
-               JOIN inventory i ON h1.nc_code = i.nc_code
+    query = '''SELECT i.brand_name, h1.date, h1.total_available, s.name as supplier_name
+               FROM inventory i
+               JOIN historical_inventory h1 ON h1.nc_code = i.nc_code
                LEFT JOIN suppliers s ON i.supplier_id = s.id
                WHERE h1.date BETWEEN ? AND ?'''
-
     params = [start_date, end_date]
 
     # If suppliers are specified and not 'all'
@@ -103,17 +156,140 @@ def compare_inventory_data_date_range(start_date, end_date, suppliers=None):
         query += f" AND s.name IN ({placeholders})"
         params.extend(suppliers)
 
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-
-    # Processing the result
-    results = [{'nc_code': row[0], 'brand_name': row[1], 'date': row[2],
-                'total_available': row[3], 'supplier_name': row[4]} for row in rows]
+    if after is not None:
+        query += " AND i.brand_name > ?"
+        params.append(after)
+
+    # Products sharing a brand collapse into one row; the last nc_code wins
+    # for each date, as it always has.
+    query += " ORDER BY i.brand_name, i.nc_code, h1.date"
+
+    try:
+        brand, data = None, None
+        for row in conn.execute(query, params):
+            if data is None or row[0] != brand:
+                if data is not None:
+                    yield brand, data
+                brand, data = row[0], {'supplier_name': row[3], 'totals': {}}
+            data['totals'][row[1]] = row[2]
+        if data is not None:
+            yield brand, data
+    finally:
+        conn.close()
+
+
+def _iter_range_brands_from_runs(conn, start_date, end_date, suppliers, after):
+    """iter_range_brands for the change layout: one row per run, not per day.
+
+    Each run overlapping the range is spread over the snapshot dates it
+    covers here, in the same order the row query returns them, so the
+    output is identical.
+    """
+    snapshots = conn.execute("SELECT day, date FROM snapshot_days WHERE date BETWEEN ? AND ? ORDER BY day",
+                             (start_date, end_date)).fetchall()
+    if not snapshots:
+        conn.close()
+        return
+    days = [row[0] for row in snapshots]
+    dates = [row[1] for row in snapshots]
+
+    # From the run covering the first day onwards, off the (product_id, start_day) key
+    query = '''SELECT i.brand_name, r.start_day, r.end_day, r.total_available, s.name as supplier_name
+               FROM inventory i
+               JOIN product_keys k ON k.nc_code = i.nc_code
+               JOIN historical_inventory_runs r
+                   ON r.product_id = k.product_id
+                  AND r.start_day BETWEEN COALESCE((SELECT MAX(start_day) FROM historical_inventory_runs
+                                                    WHERE product_id = k.product_id AND start_day <= ?), ?)
+                                      AND ?
+               LEFT JOIN suppliers s ON i.supplier_id = s.id
+               WHERE (r.end_day IS NULL OR r.end_day >= ?)'''
+    params = [days[0], days[0], days[-1], days[0]]
 
-    # Cache the results
-    cache[key] = results
+    if suppliers and 'all' not in suppliers:
+        placeholders = ', '.join('?' * len(suppliers))
+        query += f" AND s.name IN ({placeholders})"
+        params.extend(suppliers)
 
-    return results
+    if after is not None:
+        query += " AND i.brand_name > ?"
+        params.append(after)
+
+    query += " ORDER BY i.brand_name, i.nc_code, r.start_day"
+
+    try:
+        brand, data = None, None
+        for row in conn.execute(query, params):
+            first = bisect.bisect_left(days, row[1])
+            last = len(days) if row[2] is None else bisect.bisect_right(days, row[2])
+            if first >= last:
+                continue  # the run falls between two snapshots in the range
+            if data is None or row[0] != brand:
+                if data is not None:
+                    yield brand, data
+                brand, data = row[0], {'supplier_name': row[4], 'totals': {}}
+            totals = data['totals']
+            for date in dates[first:last]:
+                totals[date] = row[3]
+        if data is not None:
+            yield brand, data
+    finally:
+        conn.close()
+
+
+def range_comparison_page(start_date, end_date, suppliers=None, after=None, page_size=100):
+    """One page of the range comparison, keyed by brand: (brands, next_cursor)."""
+    key = generate_cache_key_date_range(start_date, end_date, suppliers, after, page_size)
+
+    cached = cache.get(key)
+    if cached is not None:
+        return cached['brands'], cached['next_cursor']
+
+    brands = []
+    next_cursor = None
+    rows = iter_range_brands(start_date, end_date, suppliers, after)
+    for brand, data in rows:
+        if len(brands) == page_size:
+            next_cursor = brands[-1]['brand_name']
+            break
+        brands.append({'brand_name': brand, **data})
+    rows.close()
+
+    cache.set(key, {'brands': brands, 'next_cursor': next_cursor})
+    return brands, next_cursor
+
+
+# graph_dir -> (directory mtime, file names) as last listed
+_graph_listings = {}
+
+
+def list_graphs(graph_dir):
+    """PNG names in graph_dir, most recent first.
+
+    Only re-read when the directory's mtime moves, which gen_index_graphs.py
+    causes every time it adds or removes a file.
+    """
+    mtime = os.stat(graph_dir).st_mtime_ns
+    listing = _graph_listings.get(graph_dir)
+    if listing is None or listing[0] != mtime:
+        names = sorted((f for f in os.listdir(graph_dir) if f.endswith('.png')), reverse=True)
+        listing = _graph_listings[graph_dir] = (mtime, names)
+    return listing[1]
+
+
+@inventory_bp.route('/range-comparison')
+def range_comparison():
+    """Paginated JSON for the range comparison. Pass next_cursor back as ?after=."""
+    start_date = request.args['start']
+    end_date = request.args['end']
+    suppliers = request.args.getlist('supplier')
+    page_size = min(request.args.get('page_size', Config.RANGE_PAGE_SIZE, type=int),
+                    Config.RANGE_MAX_PAGE_SIZE)
+    brands, next_cursor = range_comparison_page(
+        start_date, end_date, suppliers, request.args.get('after'), max(page_size, 1))
+    return jsonify({'dates': range_dates(start_date, end_date),
+                    'brands': brands,
+                    'next_cursor': next_cursor})
 
 
 @inventory_bp.route('/available-dates')
@@ -121,7 +297,7 @@ def available_dates():
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute(
-        "SELECT DISTINCT date FROM historical_inventory ORDER BY date DESC")
+        f"SELECT DISTINCT date FROM {snapshot_dates_table(conn)} ORDER BY date DESC")
     dates = [row[0] for row in cursor.fetchall()]
     conn.close()
     return jsonify(dates)
@@ -137,195 +313,141 @@ def available_suppliers():
     return jsonify(suppliers)
 
 
-@inventory_bp.route('/brand-analysis', methods=['GET', 'POST'])
-def brand_analysis():
-    conn = get_db_connection()
-    brands_df = pd.read_sql_query(
-        "SELECT DISTINCT brand_name FROM inventory", conn)
-    brands = brands_df['brand_name'].tolist()
-
-    selected_brands = request.form.getlist(
-        'brand[]') if request.method == 'POST' else []
-    # suppliers = request.form.getlist('supplier[]')
-
-    graphs_html = []
-    if selected_brands:
-        for brand in selected_brands:
-            safe_brand = brand.replace("'", "''")
-
-        # Corrected Graph 1: Brand's Inventory Over Time with Predictive Trend
-        df = pd.read_sql_query(f"""
-            SELECT DATE(h.date) as date, SUM(h.total_available) as total_available 
-            FROM historical_inventory h
-            JOIN inventory i ON h.nc_code = i.nc_code
-            WHERE i.brand_name = '{safe_brand}' 
-            GROUP BY DATE(h.date)
-            """, conn)
-        df['date_num'] = pd.to_datetime(df['date']).map(pd.Timestamp.toordinal)
-        X = df[['date_num']]
-        y = df['total_available']
-
-        # Fit linear regression model
-        model = LinearRegression().fit(X, y)
-        df['predicted'] = model.predict(X)
-
-        fig = px.scatter(df, x='date', y='total_available',
-                         title=f'Inventory Over Time for {brand}')
-        fig.add_scatter(x=df['date'], y=df['predicted'],
-                        mode='lines', name='Predicted')
-        fig.update_layout(plot_bgcolor='rgba(0,0,0,0)',
-                          paper_bgcolor='rgba(0,0,0,0)', font_color='white')
-        graphs_html.append(fig.to_html())
-
-        # Graph 2: Average Monthly Inventory Levels
-        df_monthly = pd.read_sql_query(f"""
-            SELECT strftime('%Y-%m', h.date) as month, AVG(h.total_available) as avg_available
-            FROM historical_inventory h
-            JOIN inventory i ON h.nc_code = i.nc_code
-            WHERE i.brand_name = '{safe_brand}'
-            GROUP BY month
-            """, conn)
-        fig_monthly = px.bar(df_monthly, x='month', y='avg_available',
-                             title=f'Average Monthly Inventory for {brand}')
-        fig_monthly.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color='white')
-        graphs_html.append(fig_monthly.to_html())
-
-        # Graph 3: Rate of Inventory Change
-        df_rate = pd.read_sql_query(f"""
-            SELECT h.date, (h.total_available - LAG(h.total_available) OVER (ORDER BY h.date)) as rate_change
-            FROM historical_inventory h
-            JOIN inventory i ON h.nc_code = i.nc_code
-            WHERE i.brand_name = '{safe_brand}'
-            """, conn)
-        fig_rate = px.line(df_rate, x='date', y='rate_change',
-                           title=f'Rate of Inventory Change for {brand}')
-        fig_rate.update_layout(plot_bgcolor='rgba(0,0,0,0)',
-                               paper_bgcolor='rgba(0,0,0,0)', font_color='white')
-        graphs_html.append(fig_rate.to_html())
-
-        # Graph 4: Inventory Size Distribution Over Time
-        df_size = pd.read_sql_query(f"""
-            SELECT h.date, i.size, SUM(h.total_available) as total_available
-            FROM historical_inventory h
-            JOIN inventory i ON h.nc_code = i.nc_code
-            WHERE i.brand_name = '{safe_brand}'
-            GROUP BY h.date, i.size
-            """, conn)
-        fig_size = px.bar(df_size, x='date', y='total_available',
-                          color='size', title=f'Inventory Size Distribution for {brand}')
-        fig_size.update_layout(plot_bgcolor='rgba(0,0,0,0)',
-                               paper_bgcolor='rgba(0,0,0,0)', font_color='white')
-        graphs_html.append(fig_size.to_html())
-
-        # Graph 5: Supplier and Broker Influence on Inventory
-        df_supplier_broker = pd.read_sql_query(f"""
-            SELECT h.date, 
-                s.name || ' / ' || b.name as supplier_broker, 
-                SUM(h.total_available) as total_available
-            FROM historical_inventory h
-            JOIN inventory i ON h.nc_code = i.nc_code
-            JOIN suppliers s ON i.supplier_id = s.id
-            JOIN brokers b ON i.broker_id = b.id
-            WHERE i.brand_name = '{safe_brand}'
-            GROUP BY h.date, s.name, b.name
-            """, conn)
-
-        fig_supplier_broker = px.line(df_supplier_broker, x='date', y='total_available',
-                                      color='supplier_broker', title=f'Supplier and Broker Influence for {brand}')
-        fig_supplier_broker.update_traces(mode='markers+lines')
-        fig_supplier_broker.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color='white')
-        graphs_html.append(fig_supplier_broker.to_html())
-
-    return render_template('brand_analysis.html', brands=brands, graphs_html=graphs_html)
-
-
-@inventory_bp.route('/data-analysis')
-def data_analysis():
+def not_migrated():
+    """503 for endpoints whose tables the ingest scripts haven't created yet."""
+    return jsonify({'error': 'The database has not been migrated yet; run an ingest first'}), 503
+
+
+@inventory_bp.route('/brands/search')
+def brands_search():
+    """A page of brands matching ?q= (by brand, supplier or broker name), for the brand selector."""
+    page = max(request.args.get('page', 1, type=int), 1)
+    page_size = min(max(request.args.get('page_size', 20, type=int), 1), 100)
     conn = get_db_connection()
+    try:
+        brands, more = search_brands(conn, request.args.get('q', ''), page, page_size)
+    except sqlite3.OperationalError:
+        return not_migrated()
+    finally:
+        conn.close()
+    return jsonify({'brands': brands, 'page': page, 'more': more})
+
 
-    # Graph 1: Inventory Levels Over Time (Aggregated by Day)
-    df = pd.read_sql_query(
-        "SELECT DATE(date) as date, SUM(total_available) as sum_of_total_available FROM historical_inventory GROUP BY DATE(date)", conn)
-    fig1 = px.line(df, x='date', y='sum_of_total_available', title='Aggregated Inventory Over Time',
-                   labels={'date': 'Date', 'sum_of_total_available': 'Current Sum of Total Available Cases'})
-    fig1.update_layout(
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font_color='white'
-    )
-
-    # Graph 2: Brand-wise Inventory Distribution (Top 15)
-    brand_df = pd.read_sql_query(
-        "SELECT brand_name, SUM(total_available) as sum_of_total_available FROM inventory GROUP BY brand_name ORDER BY sum_of_total_available DESC LIMIT 15", conn)
-    fig2 = px.bar(brand_df, x='brand_name', y='sum_of_total_available',
-                  title='Top 15 Brand-wise Inventory Distribution',
-                  labels={'brand_name': 'Brand Name', 'sum_of_total_available': 'Current Sum of Total Available Cases'})
-    fig2.update_layout(
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font_color='white'
-    )
-
-    # Graph 3: Inventory Size Distribution
-    size_df = pd.read_sql_query(
-        "SELECT size as bottle_size, COUNT(*) as count_of_size_occurrence FROM inventory GROUP BY bottle_size", conn)
-    fig3 = px.bar(size_df, x='bottle_size', y='count_of_size_occurrence',
-                  title='Inventory Size Distribution',
-                  labels={'bottle_size': 'Size of Bottle', 'count_of_size_occurrence': 'Current Count of Occurence of Bottle Size'})
-    fig3.update_layout(
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font_color='white'
-    )
-
-    # Graph 4: Supplier Contribution to Inventory (Top 15)
-    supplier_df = pd.read_sql_query(
-        "SELECT suppliers.name, SUM(inventory.total_available) as sum_of_inv_total_avail FROM inventory JOIN suppliers ON inventory.supplier_id = suppliers.id GROUP BY suppliers.name ORDER BY sum_of_inv_total_avail DESC LIMIT 15", conn)
-    fig4 = px.bar(supplier_df, x='name', y='sum_of_inv_total_avail',
-                  title='Current Top 15 Supplier Contribution to Inventory',
-                  labels={'name': 'Supplier', 'sum_of_inv_total_avail': 'Current Sum of Total Available Cases'})
-    fig4.update_layout(
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font_color='white'
-    )
-
-    # Graph 5: Top 15 Brands by Total Volume (ML)
-    volume_query = """
-    SELECT brand_name, 
-           SUM(total_available * CASE 
-               WHEN size LIKE '%ML' THEN CAST(REPLACE(size, 'ML', '') AS INTEGER)
-               WHEN size LIKE '%L' THEN CAST(REPLACE(size, 'L', '') AS INTEGER) * 1000
-               WHEN size LIKE '%.L' THEN CAST(REPLACE(size, '.L', '') AS INTEGER) * 1000
-               ELSE 0
-           END) as total_volume_ml
-    FROM inventory
-    GROUP BY brand_name
-    ORDER BY total_volume_ml DESC
-    LIMIT 15
+EVENT_KINDS = ('restock', 'stockout', 'jump')
+
+
+@inventory_bp.route('/restocks')
+def restocks():
+    """Products that restocked after ?since=, newest first.
+
+    ?kind=stockout or ?kind=jump lists those events instead; ?brand= narrows
+    to brands. Read from inventory_events, which the loaders keep current.
     """
-    volume_df = pd.read_sql_query(volume_query, conn)
-    fig5 = px.bar(volume_df, x='brand_name', y='total_volume_ml', title='Top 15 Brands by Total Volume (mL)',
-                  labels={'brand_name': 'Brand Name', 'total_volume_ml': 'Current Sum of Total Volume (mL)'})
-    fig5.update_layout(
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font_color='white'
-    )
+    kind = request.args.get('kind', 'restock')
+    if kind not in EVENT_KINDS:
+        return jsonify({'error': f"kind must be one of {', '.join(EVENT_KINDS)}"}), 400
+    brands = request.args.getlist('brand')
+    limit = min(request.args.get('limit', 500, type=int), 5000)
+    query = '''SELECT e.date, e.nc_code, p.brand_name, p.size, s.name AS supplier_name, e.kind,
+                      e.prev_date, e.prev_total, e.total_available
+               FROM inventory_events e
+               JOIN products p ON p.source_code = e.nc_code
+               LEFT JOIN suppliers s ON s.id = p.supplier_id
+               WHERE e.date > ? AND e.kind = ?'''
+    params = [request.args.get('since', ''), kind]
+    if brands:
+        query += f" AND p.brand_name IN ({', '.join('?' * len(brands))})"
+        params += brands
+    query += " ORDER BY e.date DESC, p.brand_name, e.nc_code LIMIT ?"
+    params.append(limit)
 
-    # Convert the figures to HTML
-    graphs_html = [fig.to_html() for fig in [fig1, fig2, fig3, fig4, fig5]]
+    conn = get_db_connection()
+    try:
+        rows = [dict(row) for row in conn.execute(query, params)]
+    except sqlite3.OperationalError:
+        return not_migrated()
+    finally:
+        conn.close()
+    return jsonify(rows)
 
-    return render_template('data_analysis.html', graphs_html=graphs_html)
+
+def brand_availability(conn, brands):
+    """{brand: in_stock, cases, last_in_stock, last_restock, last_stockout} from the event index.
+
+    last_in_stock is the latest snapshot while any product of the brand has
+    cases, else the last day before its most recent stock-out.
+    """
+    placeholders = ', '.join('?' * len(brands))
+    latest = conn.execute(f"SELECT MAX(date) FROM {snapshot_dates_table(conn)}").fetchone()[0]
+    cases = dict(conn.execute(f'''SELECT brand_name, SUM(total_available) FROM inventory
+                                  WHERE brand_name IN ({placeholders}) GROUP BY brand_name''', brands).fetchall())
+    events = {row[0]: tuple(row)[1:] for row in conn.execute(
+        f'''SELECT p.brand_name,
+                   MAX(CASE WHEN e.kind = 'restock' THEN e.date END),
+                   MAX(CASE WHEN e.kind = 'stockout' THEN e.date END),
+                   MAX(CASE WHEN e.kind = 'stockout' THEN e.prev_date END)
+            FROM products p
+            JOIN inventory_events e ON e.nc_code = p.source_code
+            WHERE p.brand_name IN ({placeholders})
+            GROUP BY p.brand_name''', brands)}
+    availability = {}
+    for brand in brands:
+        if brand not in cases:
+            continue
+        last_restock, last_stockout, before_stockout = events.get(brand, (None, None, None))
+        in_stock = (cases[brand] or 0) > 0
+        availability[brand] = {'in_stock': in_stock,
+                               'cases': cases[brand],
+                               'last_in_stock': latest if in_stock else before_stockout,
+                               'last_restock': last_restock,
+                               'last_stockout': last_stockout}
+    return availability
+
+
+@inventory_bp.route('/brand-availability')
+def brand_availability_json():
+    """When each ?brand= was last in stock, restocked and sold out. Unknown brands are left out."""
+    brands = list(dict.fromkeys(request.args.getlist('brand')))
+    if not brands:
+        return jsonify({'error': 'brand is required'}), 400
+    conn = get_db_connection()
+    try:
+        availability = brand_availability(conn, brands)
+    except sqlite3.OperationalError:
+        return not_migrated()
+    finally:
+        conn.close()
+    return jsonify(availability)
+
+
+@inventory_bp.route('/watchlist-alerts')
+def watchlist_alerts():
+    """Events for a watchlist's brands after ?since=, as evaluated after each load."""
+    watchlist = request.args.get('watchlist')
+    if not watchlist:
+        return jsonify({'error': 'watchlist is required'}), 400
+    query = '''SELECT date, nc_code, brand_name, kind FROM watchlist_alerts
+               WHERE watchlist = ? AND date > ?'''
+    params = [watchlist, request.args.get('since', '')]
+    kinds = request.args.getlist('kind')
+    if kinds:
+        query += f" AND kind IN ({', '.join('?' * len(kinds))})"
+        params += kinds
+    query += " ORDER BY date DESC, brand_name, nc_code LIMIT ?"
+    params.append(min(request.args.get('limit', 500, type=int), 5000))
+
+    conn = get_db_connection()
+    try:
+        rows = [dict(row) for row in conn.execute(query, params)]
+    except sqlite3.OperationalError:
+        return not_migrated()
+    finally:
+        conn.close()
+    return jsonify(rows)
 
 
 @inventory_bp.route('/', methods=['GET', 'POST'])
 def index():
-    structured_results = None
-    unique_dates = None
-
     if request.method == 'POST':
         comparison_type = request.form.get('comparisonType')
         date1 = request.form['date1']
@@ -333,26 +455,22 @@ def index():
         suppliers = request.form.getlist('supplier[]')
 
         if comparison_type == 'direct':
-            results = compare_inventory_data(date1, date2, suppliers)
+            limit = request.form.get('limit', type=int)
+            offset = request.form.get('offset', 0, type=int)
+            results = compare_inventory_data(date1, date2, suppliers, limit, offset)
             return render_template('results.html', results=results, date1=date1, date2=date2, comparison_type=comparison_type)
 
         elif comparison_type == 'range':
-            results = compare_inventory_data_date_range(
-                date1, date2, suppliers)
-            unique_dates = sorted(set(row['date'] for row in results))
-            structured_results = {}
-            for row in results:
-                brand = row['brand_name']
-                if brand not in structured_results:
-                    structured_results[brand] = {
-                        'supplier_name': row['supplier_name'], 'totals': {}}
-                structured_results[brand]['totals'][row['date']
-                                                    ] = row['total_available']
-            return render_template('results.html', results=structured_results, unique_dates=unique_dates, comparison_type=comparison_type)
-
-    graph_dir = 'static/img/graphs/'
-    graph_filenames = sorted(
-        [f for f in os.listdir(graph_dir) if f.endswith('.png')],
-        reverse=True  # Sort to get the most recent files first
-    )
-    return render_template('index.html', graph_filenames=graph_filenames)
+            # Streamed: rows are rendered as they come off the cursor
+            brands = iter_range_brands(date1, date2, suppliers)
+            first = next(brands, None)
+            if first is None:
+                return render_template('results.html', results=None, comparison_type=comparison_type)
+            stream = current_app.jinja_env.get_template('results.html').stream(
+                results=itertools.chain([first], brands), unique_dates=range_dates(date1, date2),
+                comparison_type=comparison_type)
+            # Send a few hundred table rows per chunk, not one per cell
+            stream.enable_buffering(1000)
+            return Response(stream_with_context(stream))
+
+    return render_template('index.html', graph_filenames=list_graphs('static/img/graphs/'))
@@ -0,0 +1,100 @@
+import json
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+# One pass over history for every selected brand, pre-aggregated to one row
+# per brand/date/size/supplier/broker. `products` counts the product rows
+# folded into each group so averages over products can still be taken.
+BRAND_HISTORY_SQL = '''SELECT i.brand_name, h.date, i.size, s.name AS supplier_name, b.name AS broker_name,
+                              SUM(h.total_available) AS total_available, COUNT(*) AS products
+                       FROM inventory i
+                       JOIN historical_inventory h ON h.nc_code = i.nc_code
+                       LEFT JOIN suppliers s ON i.supplier_id = s.id
+                       LEFT JOIN brokers b ON i.broker_id = b.id
+                       WHERE i.brand_name IN ({placeholders})
+                       GROUP BY i.brand_name, h.date, i.size, s.name, b.name'''
+
+
+def load_brand_history(conn, brands):
+    """Fetch the grouped history of all brands with a single query."""
+    brands = list(dict.fromkeys(brands))
+    if not brands:
+        return pd.DataFrame(columns=['brand_name', 'date', 'size', 'supplier_name',
+                                     'broker_name', 'total_available', 'products'])
+    sql = BRAND_HISTORY_SQL.format(placeholders=', '.join('?' * len(brands)))
+    return pd.read_sql_query(sql, conn, params=brands)
+
+
+def brand_datasets(history):
+    """Split the grouped history into the five /brand-analysis datasets per brand.
+
+    Returns {brand: {'daily', 'monthly', 'rate', 'sizes', 'supplier_broker'}},
+    each a DataFrame sorted by date. Every aggregate is computed once over
+    all brands; only the final split is per brand.
+    """
+    daily = (history.groupby(['brand_name', 'date'], sort=True)['total_available']
+             .sum().reset_index())
+    # Day-over-day change of the brand's total
+    daily['rate_change'] = daily.groupby('brand_name')['total_available'].diff()
+
+    by_month = history.assign(month=history['date'].str[:7]).groupby(
+        ['brand_name', 'month'], sort=True)[['total_available', 'products']].sum()
+    # Mean over product rows, as AVG(h.total_available) per month
+    monthly = (by_month['total_available'] / by_month['products']).rename(
+        'avg_available').reset_index()
+
+    sizes = (history.groupby(['brand_name', 'date', 'size'], sort=True, dropna=False)['total_available']
+             .sum().reset_index())
+
+    # Only products with both a supplier and a broker, like the inner joins it replaces
+    named = history.dropna(subset=['supplier_name', 'broker_name'])
+    supplier_broker = (named.assign(supplier_broker=named['supplier_name'] + ' / ' + named['broker_name'])
+                       .groupby(['brand_name', 'date', 'supplier_broker'], sort=True)['total_available']
+                       .sum().reset_index())
+
+    frames = {'daily': daily[['brand_name', 'date', 'total_available']],
+              'monthly': monthly,
+              'rate': daily[['brand_name', 'date', 'rate_change']],
+              'sizes': sizes,
+              'supplier_broker': supplier_broker}
+    datasets = {brand: {name: frame.iloc[:0].drop(columns='brand_name') for name, frame in frames.items()}
+                for brand in daily['brand_name'].unique()}
+    for name, frame in frames.items():
+        for brand, group in frame.groupby('brand_name', sort=False):
+            datasets[brand][name] = group.drop(columns='brand_name').reset_index(drop=True)
+    return datasets
+
+
+def load_forecasts(conn, brands):
+    """Stored brand_forecasts rows for brands, as {brand: dict}.
+
+    Empty when the database predates the forecasts migration.
+    """
+    brands = list(dict.fromkeys(brands))
+    if not brands:
+        return {}
+    placeholders = ', '.join('?' * len(brands))
+    try:
+        cursor = conn.execute(
+            f"SELECT * FROM brand_forecasts WHERE brand_name IN ({placeholders})", brands)
+    except sqlite3.OperationalError:
+        return {}
+    columns = [column[0] for column in cursor.description]
+    forecasts = {}
+    for row in cursor:
+        forecast = dict(zip(columns, row))
+        forecast['weekly'] = json.loads(forecast['weekly'])
+        forecasts[forecast['brand_name']] = forecast
+    return forecasts
+
+
+def forecast_trend(forecast, horizon_days=30):
+    """Evaluate a stored forecast from its window start to horizon_days past its end."""
+    start = pd.Timestamp(forecast['window_start'])
+    dates = pd.date_range(start, pd.Timestamp(forecast['window_end']) + pd.Timedelta(days=horizon_days))
+    days = (dates - start).days.to_numpy()
+    weekly = np.asarray(forecast['weekly'])[dates.weekday]
+    predicted = forecast['intercept'] + forecast['slope'] * days + weekly
+    return pd.DataFrame({'date': dates.strftime('%Y-%m-%d'), 'predicted': predicted})
@@ -0,0 +1,52 @@
+import re
+
+# Reads the brand_search and brand_search_trigram FTS5 tables that ingest
+# keeps current (data_management/search_index.py).
+
+WORD = re.compile(r'\w+')
+
+SEARCH_SQL = '''SELECT b.brand_name, b.supplier_names, b.broker_names
+                FROM (SELECT rowid AS id, 0 AS tier, bm25(brand_search, 10.0, 1.0, 1.0) AS score
+                      FROM brand_search WHERE brand_search MATCH :words
+                      UNION ALL
+                      SELECT rowid, 1, bm25(brand_search_trigram)
+                      FROM brand_search_trigram WHERE brand_search_trigram MATCH :trigrams
+                        AND rowid NOT IN (SELECT rowid FROM brand_search WHERE brand_search MATCH :words)) m
+                JOIN brand_search b ON b.rowid = m.id
+                ORDER BY m.tier, b.brand_name NOT LIKE :start ESCAPE '\\', m.score, b.brand_name
+                LIMIT :limit OFFSET :offset'''
+
+LIST_SQL = '''SELECT brand_name, supplier_names, broker_names FROM brand_search
+              ORDER BY rowid LIMIT :limit OFFSET :offset'''
+
+
+def word_query(words):
+    """Every word must start a word of the brand, supplier or broker name: 'blan tequ' -> '"blan"* "tequ"*'."""
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def trigram_query(words):
+    """Any three-letter run of the longer words, ranked by how many match; None if there are none."""
+    trigrams = dict.fromkeys(word[n:n + 3] for word in words for n in range(len(word) - 2))
+    return ' OR '.join(f'"{trigram}"' for trigram in trigrams) or None
+
+
+def search_brands(conn, q, page=1, page_size=20):
+    """One page of brands matching q, best first, and whether another page follows.
+
+    Word-prefix matches come first, brands whose name starts with the query
+    ahead of the rest; then brands sharing three-letter runs with it. An
+    empty query lists every brand alphabetically.
+    """
+    params = {'limit': page_size + 1, 'offset': (page - 1) * page_size}
+    words = [word.lower() for word in WORD.findall(q or '')]
+    if not words:
+        rows = conn.execute(LIST_SQL, params).fetchall()
+    else:
+        # A query with no trigrams matches nothing in the trigram table
+        params.update(words=word_query(words), trigrams=trigram_query(words) or '""',
+                      start=re.sub(r'([\\%_])', r'\\\1', q.strip()) + '%')
+        rows = conn.execute(SEARCH_SQL, params).fetchall()
+    brands = [{'brand_name': row[0], 'supplier_names': row[1], 'broker_names': row[2]}
+              for row in rows[:page_size]]
+    return brands, len(rows) > page_size
@@ -0,0 +1,252 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+def approximate_size(value):
+    """Rough in-memory footprint of the lists/dicts/scalars we cache, in bytes."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximate_size(k) + approximate_size(v)
+                    for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(approximate_size(item) for item in value)
+    return size
+
+
+class LRUStore:
+    """In-process store bounded by entry count and (optionally) approximate bytes."""
+
+    def __init__(self, max_entries=256, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return (value, expires_at) or None, marking the entry most recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key, value, expires_at):
+        size = approximate_size(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (value, expires_at, size)
+            self.nbytes += size
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes and self.nbytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def retain_prefix(self, prefix):
+        """Drop every entry whose key doesn't start with prefix."""
+        with self._lock:
+            for key in [k for k in self._entries if not k.startswith(prefix)]:
+                self._discard(key)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[2]
+
+
+class SQLiteStore:
+    """Store shared by every worker process on the host, kept in one SQLite file.
+
+    Values are JSON, zlib-compressed; the cached results are plain lists of
+    dicts, so nothing needs pickling. Bounds are enforced by evicting the
+    least recently read entries after each write.
+    """
+
+    def __init__(self, path, max_entries=256, max_bytes=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS cache_entries (
+                                key TEXT PRIMARY KEY,
+                                value BLOB NOT NULL,
+                                expires_at REAL,
+                                size INTEGER NOT NULL,
+                                last_used REAL NOT NULL)''')
+            conn.execute('''CREATE INDEX IF NOT EXISTS idx_cache_entries_last_used
+                            ON cache_entries (last_used)''')
+
+    def _conn(self):
+        # sqlite3 connections can't hop threads, so each thread of each
+        # worker gets its own; WAL lets readers carry on during a write.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def dumps(value):
+        return zlib.compress(json.dumps(value, separators=(',', ':')).encode())
+
+    @staticmethod
+    def loads(blob):
+        return json.loads(zlib.decompress(blob))
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+    @property
+    def nbytes(self):
+        return self._conn().execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+
+    def get(self, key):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute(
+                "UPDATE cache_entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return self.loads(row[0]), row[1]
+
+    def set(self, key, value, expires_at):
+        blob = self.dumps(value)
+        if self.max_bytes and len(blob) > self.max_bytes:
+            return
+        conn = self._conn()
+        with conn:
+            conn.execute('''INSERT OR REPLACE INTO cache_entries (key, value, expires_at, size, last_used)
+                            VALUES (?, ?, ?, ?, ?)''', (key, blob, expires_at, len(blob), time.time()))
+            evicted = conn.execute('''DELETE FROM cache_entries WHERE key IN (
+                                           SELECT key FROM cache_entries ORDER BY last_used DESC
+                                           LIMIT -1 OFFSET ?)''', (self.max_entries,)).rowcount
+            if self.max_bytes:
+                # Keep the most recently used entries that fit in max_bytes.
+                evicted += conn.execute('''DELETE FROM cache_entries WHERE key IN (
+                                               SELECT key FROM (
+                                                   SELECT key, SUM(size) OVER (ORDER BY last_used DESC) AS running
+                                                   FROM cache_entries)
+                                               WHERE running > ?)''', (self.max_bytes,)).rowcount
+        self.evictions += evicted
+
+    def delete(self, key):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM cache_entries")
+
+    def retain_prefix(self, prefix):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM cache_entries WHERE substr(key, 1, ?) != ?",
+                         (len(prefix), prefix))
+
+
+def make_store(backend, max_entries=256, max_bytes=None, path=None):
+    """Build the store named by Config.CACHE_BACKEND: 'memory' or 'sqlite'."""
+    if backend == 'memory':
+        return LRUStore(max_entries=max_entries, max_bytes=max_bytes)
+    if backend == 'sqlite':
+        return SQLiteStore(path, max_entries=max_entries, max_bytes=max_bytes)
+    raise ValueError(f"Unknown CACHE_BACKEND {backend!r}; expected 'memory' or 'sqlite'")
+
+
+class ResultCache:
+    """Front for a store that adds TTLs, hit/miss counters and data-version invalidation.
+
+    version_source is a callable returning the current data_version stamp. It
+    is polled at most every version_check_interval seconds; when the stamp
+    moves, every entry cached under the old one stops matching.
+    """
+
+    def __init__(self, store, ttl=None, version_source=None, version_check_interval=5.0):
+        self.store = store
+        self.ttl = ttl
+        self.version_source = version_source
+        self.version_check_interval = version_check_interval
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+        self._version_checked_at = None
+
+    def _current_version(self):
+        if self.version_source is None:
+            return None
+        now = time.monotonic()
+        if self._version_checked_at is None or now - self._version_checked_at >= self.version_check_interval:
+            version = self.version_source()
+            if self._version_checked_at is not None and version != self._version:
+                # Entries under the old stamp can never match again; free them.
+                # Only those: on a shared store other workers may already have
+                # cached results under the new one.
+                self.store.retain_prefix(f"v{version}:")
+            self._version = version
+            self._version_checked_at = now
+        return self._version
+
+    def version(self):
+        """The data_version stamp entries are currently stored under."""
+        return self._current_version()
+
+    def _key(self, key):
+        return f"v{self._current_version()}:{key}"
+
+    def get(self, key, default=None):
+        full_key = self._key(key)
+        entry = self.store.get(full_key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at is None or expires_at > time.time():
+                self.hits += 1
+                return value
+            self.store.delete(full_key)
+        self.misses += 1
+        return default
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        self.store.set(self._key(key), value, expires_at)
+
+    def clear(self):
+        self.store.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self.store),
+            'bytes': getattr(self.store, 'nbytes', None),
+            'evictions': getattr(self.store, 'evictions', None),
+            'data_version': self._version,
+        }
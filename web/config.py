@@ -1,3 +1,53 @@
+import os
+
+
 class Config:
     SECRET_KEY = 'your_secret_key'  # Change to a random secret key
     # Add more configuration options as needed
+
+    # Serve the graph pages (/data-analysis, /brand-analysis, /forecasts).
+    # Workers started with ENABLE_ANALYTICS=0 serve only the comparisons and
+    # JSON endpoints.
+    ENABLE_ANALYTICS = os.getenv('ENABLE_ANALYTICS', '1') == '1'
+
+    # Where /data-analysis reads from: 'sqlite', 'arrow' or 'duckdb'. The
+    # last two read the Parquet export written by
+    # data_management/parquet_export.py into PARQUET_DIR.
+    ANALYTICS_BACKEND = os.getenv('ANALYTICS_BACKEND', 'sqlite')
+    PARQUET_DIR = os.getenv('PARQUET_DIR', '../data_management/parquet')
+
+    # Comparison result cache. Entries are dropped when the least recently
+    # used, older than CACHE_TTL seconds, or once ingest bumps data_version
+    # (checked at most every CACHE_VERSION_CHECK_SECONDS).
+    # 'memory' keeps a private LRU per worker; 'sqlite' shares one cache file
+    # (CACHE_PATH) between every worker process on the host.
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+    CACHE_PATH = os.getenv('CACHE_PATH', 'instance/result_cache.db')
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 128))
+    CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    CACHE_TTL = int(os.getenv('CACHE_TTL', 24 * 60 * 60))
+    CACHE_VERSION_CHECK_SECONDS = float(os.getenv('CACHE_VERSION_CHECK_SECONDS', 5))
+
+    # Brands per page of the /range-comparison JSON API
+    RANGE_PAGE_SIZE = int(os.getenv('RANGE_PAGE_SIZE', 100))
+    RANGE_MAX_PAGE_SIZE = int(os.getenv('RANGE_MAX_PAGE_SIZE', 1000))
+
+    # Read connections to inventory.db. Each worker keeps up to
+    # SQLITE_POOL_SIZE open (0 disables pooling); they are query_only, use
+    # memory-mapped I/O and a page cache of SQLITE_CACHE_SIZE (negative
+    # means KiB), and keep SQLITE_CACHED_STATEMENTS prepared statements.
+    # SQLITE_WAL switches the database to WAL so ingest doesn't block reads.
+    SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', 8))
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', -64 * 1024))
+    SQLITE_CACHED_STATEMENTS = int(os.getenv('SQLITE_CACHED_STATEMENTS', 256))
+    SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', 5))
+    SQLITE_WAL = os.getenv('SQLITE_WAL', '1') == '1'
+
+    # Request, SQL and figure timings and cache counters, served in the
+    # Prometheus text format at /metrics. Statements taking at least
+    # SLOW_QUERY_MS (0 turns the log off) are appended with their query
+    # plan to SLOW_QUERY_LOG, one JSON object per line.
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 0))
+    SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', 'instance/slow_queries.log')
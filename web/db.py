@@ -0,0 +1,257 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from flask import g, has_app_context
+
+import metrics
+from config import Config
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement's time and row count to metrics.
+
+    Time spent in execute() and in fetching is added up until the rows run
+    out or the cursor is closed or dropped, so a query that is iterated
+    lazily is timed in full, not just its first step. Rows taken with
+    next(cursor) are not counted.
+    """
+
+    _sql = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        self._sql, self._parameters, self._rows, self._elapsed = sql, parameters, 0, 0.0
+        self._endpoint = metrics.current_endpoint()
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._elapsed += time.perf_counter() - start
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._elapsed += time.perf_counter() - start
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._elapsed += time.perf_counter() - start
+        self._rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._elapsed += time.perf_counter() - start
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __iter__(self):
+        # Rows are handed out from batches, so iterating isn't slowed down
+        # by a Python call per row
+        while True:
+            rows = self.fetchmany(256)
+            if not rows:
+                return
+            yield from rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # The connection may be in use elsewhere by now; record, don't explain
+        self._finish(explain=False)
+
+    def _finish(self, explain=True):
+        if self._sql is None:
+            return
+        sql, self._sql = self._sql, None
+        metrics.SQL_SECONDS.observe(self._elapsed, endpoint=self._endpoint)
+        metrics.SQL_ROWS.inc(self._rows, endpoint=self._endpoint)
+        if Config.SLOW_QUERY_MS > 0 and self._elapsed * 1000 >= Config.SLOW_QUERY_MS:
+            metrics.SLOW_QUERIES.inc(endpoint=self._endpoint)
+            log_slow_query(self.connection if explain else None, sql, self._parameters,
+                           self._elapsed, self._rows, self._endpoint)
+
+
+def log_slow_query(conn, sql, parameters, elapsed, rows, endpoint):
+    """Append a statement over SLOW_QUERY_MS, with its query plan, to SLOW_QUERY_LOG as a JSON line."""
+    plan = None
+    if conn is not None:
+        try:
+            # A plain cursor, so the EXPLAIN isn't timed and logged in turn
+            plan = [row[3] for row in sqlite3.Cursor(conn).execute('EXPLAIN QUERY PLAN ' + sql, parameters)]
+        except sqlite3.Error:
+            pass
+    entry = {'at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'endpoint': endpoint, 'ms': round(elapsed * 1000, 3),
+             'rows': rows, 'sql': ' '.join(sql.split()),
+             'parameters': parameters if isinstance(parameters, dict) else list(parameters), 'plan': plan}
+    os.makedirs(os.path.dirname(Config.SLOW_QUERY_LOG) or '.', exist_ok=True)
+    with open(Config.SLOW_QUERY_LOG, 'a') as file:
+        file.write(json.dumps(entry, default=str) + '\n')
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors are TimedCursors while METRICS_ENABLED is on."""
+
+    def cursor(self, factory=None):
+        if factory is None and Config.METRICS_ENABLED:
+            factory = TimedCursor
+        return super().cursor() if factory is None else super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        # sqlite3.Connection.execute doesn't go through cursor()
+        return self.cursor().execute(sql, parameters)
+
+
+class PooledConnection(TimedConnection):
+    """Connection whose close() hands it back to its pool instead of closing it.
+
+    Existing code keeps calling conn.close() when done; only the pool
+    really closes connections.
+    """
+
+    pool = None
+    lease = 0
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def really_close(self):
+        super().close()
+
+
+class ConnectionPool:
+    """Up to `size` idle read connections to one database file, reused across requests.
+
+    Connections are opened query_only with the mmap/cache settings from
+    Config. When every pooled connection is checked out, extra ones are
+    opened and then closed on release rather than kept.
+    """
+
+    def __init__(self, path, size=8, mmap_size=0, cache_size=-2000, cached_statements=128,
+                 busy_timeout=5.0, wal=True):
+        self.path = path
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.cached_statements = cached_statements
+        self.busy_timeout = busy_timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._out = set()
+        self._lock = threading.Lock()
+        if wal:
+            self._enable_wal()
+
+    def _enable_wal(self):
+        # journal_mode is stored in the file, so one writable connection is
+        # enough; after that ingest writes no longer block these readers.
+        try:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+            finally:
+                conn.close()
+        except sqlite3.OperationalError:
+            pass
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, factory=PooledConnection,
+                               check_same_thread=False, cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        conn.execute(f'PRAGMA cache_size = {int(self.cache_size)}')
+        conn.execute('PRAGMA query_only = ON')
+        conn.pool = self
+        return conn
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        with self._lock:
+            conn.lease += 1
+            self._out.add(conn)
+        return conn
+
+    def release(self, conn, lease=None):
+        """Return conn to the pool; with lease, only if it is still that checkout."""
+        with self._lock:
+            if conn not in self._out or (lease is not None and conn.lease != lease):
+                return  # already released, possibly re-acquired since
+            self._out.discard(conn)
+        if conn.in_transaction:
+            conn.rollback()
+        conn.set_trace_callback(None)
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.really_close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().really_close()
+            except queue.Empty:
+                return
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path):
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = ConnectionPool(path, size=Config.SQLITE_POOL_SIZE,
+                                          mmap_size=Config.SQLITE_MMAP_SIZE,
+                                          cache_size=Config.SQLITE_CACHE_SIZE,
+                                          cached_statements=Config.SQLITE_CACHED_STATEMENTS,
+                                          busy_timeout=Config.SQLITE_BUSY_TIMEOUT,
+                                          wal=Config.SQLITE_WAL)
+        return _pools[path]
+
+
+def connect(path):
+    """Check out a read connection for path; close() it to give it back.
+
+    Inside an app context the connection is also remembered, so it is
+    returned at teardown even if the caller never closes it. With
+    SQLITE_POOL_SIZE = 0 every call opens a fresh, unpooled connection.
+    """
+    if Config.SQLITE_POOL_SIZE <= 0:
+        conn = sqlite3.connect(path, factory=TimedConnection)
+        conn.row_factory = sqlite3.Row
+        return conn
+    pool = get_pool(path)
+    conn = pool.acquire()
+    if has_app_context():
+        g.setdefault('db_connections', []).append((pool, conn, conn.lease))
+    return conn
+
+
+def release_request_connections(exception=None):
+    """teardown_appcontext hook: return whatever this request checked out."""
+    for pool, conn, lease in g.pop('db_connections', []):
+        pool.release(conn, lease)
+
+
+def init_app(app):
+    app.teardown_appcontext(release_request_connections)
@@ -0,0 +1,40 @@
+import hashlib
+import os
+
+import plotly
+
+import metrics
+
+# plotly.min.js as shipped with the installed plotly, served once as a
+# static asset instead of being inlined into every figure.
+PLOTLY_JS_PATH = os.path.join(os.path.dirname(plotly.__file__), 'package_data', 'plotly.min.js')
+PLOTLY_VERSION = plotly.__version__
+
+
+def figure_json(fig):
+    """Serialize a figure to compact JSON for Plotly.newPlot."""
+    return fig.to_json()
+
+
+def cached_figures(cache, key, build):
+    """Return the serialized figures stored under key, building them on a miss.
+
+    build is only called on a miss and returns a list of figures. The cache
+    prefixes keys with the data version, so new data means new figures.
+    """
+    figures = cache.get(key)
+    if figures is None:
+        endpoint = metrics.current_endpoint()
+        with metrics.FIGURE_SECONDS.time(endpoint=endpoint, stage='build'):
+            built = build()
+        with metrics.FIGURE_SECONDS.time(endpoint=endpoint, stage='serialize'):
+            figures = [figure_json(fig) for fig in built]
+        cache.set(key, figures)
+    return figures
+
+
+def figures_etag(data_version, key):
+    """ETag for a page of figures, or None when there is no data version to go by."""
+    if data_version is None:
+        return None
+    return hashlib.sha1(f"{data_version}:{PLOTLY_VERSION}:{key}".encode()).hexdigest()
@@ -0,0 +1,174 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+# In-process metrics in the Prometheus text format, served at /metrics.
+# Every worker counts its own requests; the scraper adds them up.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic total per combination of label values."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, dict(zip(self.labels, key)), value
+
+
+class Histogram:
+    """Observations counted into cumulative buckets, with their sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            counts = self._values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def count(self, **labels):
+        counts = self._values.get(tuple(labels[name] for name in self.labels))
+        return sum(counts[:-1]) if counts else 0
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(counts)) for key, counts in self._values.items())
+        for key, counts in values:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts[:-1]):
+                cumulative += count
+                yield self.name + '_bucket', {**labels, 'le': bound if bound == '+Inf' else repr(bound)}, cumulative
+            yield self.name + '_sum', labels, counts[-1]
+            yield self.name + '_count', labels, cumulative
+
+
+REQUEST_SECONDS = Histogram('inventory_http_request_duration_seconds',
+                            'Time from the start of a request until its response was closed.',
+                            ('endpoint', 'method', 'status'))
+SQL_SECONDS = Histogram('inventory_sqlite_query_duration_seconds',
+                        'Time spent executing a statement and fetching its rows.', ('endpoint',))
+SQL_ROWS = Counter('inventory_sqlite_rows_total', 'Rows fetched from SQLite.', ('endpoint',))
+SLOW_QUERIES = Counter('inventory_sqlite_slow_queries_total',
+                       'Statements slower than SLOW_QUERY_MS.', ('endpoint',))
+FIGURE_SECONDS = Histogram('inventory_figure_build_duration_seconds',
+                           'Time spent building (pandas/plotly) and serializing figures on a cache miss.',
+                           ('endpoint', 'stage'))
+
+METRICS = [REQUEST_SECONDS, SQL_SECONDS, SQL_ROWS, SLOW_QUERIES, FIGURE_SECONDS]
+
+# name -> ResultCache, read when /metrics is scraped
+_caches = {}
+
+
+def register_cache(name, cache):
+    _caches[name] = cache
+
+
+def current_endpoint():
+    """Label for work done on behalf of the current request; 'none' outside one."""
+    if not has_request_context():
+        return 'none'
+    return request.endpoint or 'unmatched'
+
+
+def _cache_metrics():
+    stats = {name: cache.stats() for name, cache in sorted(_caches.items())}
+    for kind, key, documentation in [('counter', 'hits', 'Lookups answered from the cache.'),
+                                     ('counter', 'misses', 'Lookups that had to be computed.'),
+                                     ('counter', 'evictions', 'Entries dropped to stay within the size limits.'),
+                                     ('gauge', 'entries', 'Entries currently cached.'),
+                                     ('gauge', 'bytes', 'Approximate size of the cached entries.')]:
+        name = f'inventory_cache_{key}' + ('_total' if kind == 'counter' else '')
+        samples = [(name, {'cache': cache}, values[key]) for cache, values in stats.items()
+                   if values.get(key) is not None]
+        if samples:
+            yield name, kind, documentation, samples
+
+
+def render():
+    """Every metric in the Prometheus text exposition format."""
+    families = [(metric.name, metric.kind, metric.documentation, list(metric.samples())) for metric in METRICS]
+    families += list(_cache_metrics())
+    lines = []
+    for name, kind, documentation, samples in families:
+        lines.append(f'# HELP {name} {documentation}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(f'{sample}{_format_labels(labels)} {_format_value(value)}'
+                     for sample, labels, value in samples)
+    return '\n'.join(lines) + '\n'
+
+
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.get('request_started')
+    if started is not None:
+        labels = {'endpoint': current_endpoint(), 'method': request.method, 'status': response.status_code}
+        # Streamed responses are timed until the last chunk was sent
+        response.call_on_close(lambda: REQUEST_SECONDS.observe(time.perf_counter() - started, **labels))
+    return response
+
+
+def metrics_view():
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,100 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    __file__), '..', '..', 'data_management'))
+
+from data_management import initialize_db  # noqa: E402
+from parquet_export import sync_parquet  # noqa: E402
+from products import refresh_products  # noqa: E402
+from rollups import backfill_rollups, refresh_rollups  # noqa: E402
+from analytics_backend import ArrowBackend, DuckDBBackend, SQLiteBackend  # noqa: E402
+from app import app  # noqa: E402
+from blueprints import inventory  # noqa: E402
+
+DATES = [f"2023-0{month}-{day:02d}" for month in (1, 2) for day in (3, 17, 28)]
+SIZES = ['.75L', '750ML', '1.75L', '50ML', None]
+
+
+class BackendParityTestCase(unittest.TestCase):
+    """The Parquet backends must draw the same numbers as the SQLite rollups."""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.db_path = os.path.join(tmpdir.name, 'inventory.db')
+        # A quote in the path must not break the DuckDB views
+        self.parquet_dir = os.path.join(tmpdir.name, "it's parquet")
+        self.conn = sqlite3.connect(self.db_path)
+        self.addCleanup(self.conn.close)
+        initialize_db(self.conn)
+        self.conn.executemany("INSERT INTO suppliers (name) VALUES (?)", [(f"Supplier {n}",) for n in range(4)])
+        self.conn.executemany("INSERT INTO brokers (name) VALUES (?)", [(f"Broker {n}",) for n in range(3)])
+        # Distinct totals, so every top-N ordering is unambiguous
+        self.conn.executemany('''INSERT INTO inventory (nc_code, brand_name, total_available, size,
+                                 cases_per_pallet, supplier_id, broker_id) VALUES (?, ?, ?, ?, 60, ?, ?)''',
+                              [(f"{n:05d}", f"Brand {n % 25}", 3 * n + 1, SIZES[n % 5],
+                                n % 4 + 1 if n % 7 else None, n % 3 + 1) for n in range(40)])
+        self.conn.executemany("INSERT INTO historical_inventory VALUES (?, ?, ?, ?)",
+                              [(f"{n:05d}", date, n * (d + 1) % 23, n % 4 + 1)
+                               for n in range(40) for d, date in enumerate(DATES)])
+        refresh_products(self.conn, DATES[-1])
+        backfill_rollups(self.conn)
+        self.conn.commit()
+        sync_parquet(self.conn, self.parquet_dir)
+
+        def connect():
+            return sqlite3.connect(self.db_path)
+        self.backends = [SQLiteBackend(connect), ArrowBackend(self.parquet_dir), DuckDBBackend(self.parquet_dir)]
+
+    def assertSameFrames(self, method, sort_by=None):
+        frames = [getattr(backend, method)() for backend in self.backends]
+        if sort_by:
+            frames = [frame.sort_values(sort_by, na_position='first', ignore_index=True) for frame in frames]
+        for backend, frame in zip(self.backends[1:], frames[1:]):
+            with self.subTest(method=method, backend=backend.name):
+                pd.testing.assert_frame_equal(frame, frames[0], check_dtype=False)
+
+    def test_backends_agree(self):
+        self.assertSameFrames('daily_totals')
+        self.assertSameFrames('brand_totals')
+        self.assertSameFrames('size_counts', sort_by='bottle_size')
+        self.assertSameFrames('supplier_totals')
+        self.assertSameFrames('brand_volumes')
+
+    def test_later_exports_are_read(self):
+        before = [len(backend.daily_totals()) for backend in self.backends]
+        self.conn.executemany("INSERT INTO historical_inventory VALUES (?, '2023-03-05', 7, 1)",
+                              [(f"{n:05d}",) for n in range(40)])
+        refresh_rollups(self.conn, ['2023-03-05'])
+        self.conn.commit()
+        sync_parquet(self.conn, self.parquet_dir)
+        self.assertEqual([len(backend.daily_totals()) for backend in self.backends], [n + 1 for n in before])
+        self.assertSameFrames('daily_totals')
+
+    def test_export_moves_the_figure_etag(self):
+        config = {'ANALYTICS_BACKEND': 'arrow', 'PARQUET_DIR': self.parquet_dir}
+        with mock.patch.dict(app.config, config), mock.patch.dict(os.environ, {'DB_FILE_PATH': self.db_path}), \
+                mock.patch.object(inventory.cache, 'version_check_interval', 0):
+            inventory.cache.clear()
+            client = app.test_client()
+            etag = client.get('/data-analysis').headers['ETag']
+            # Loaded without the ingest hook, so only the export moves data_version
+            self.conn.executemany("INSERT INTO historical_inventory VALUES (?, '2023-03-05', 7, 1)",
+                                  [(f"{n:05d}",) for n in range(40)])
+            self.conn.commit()
+            sync_parquet(self.conn, self.parquet_dir)
+            changed = client.get('/data-analysis', headers={'If-None-Match': etag})
+            self.assertEqual(changed.status_code, 200)
+            self.assertNotEqual(changed.headers['ETag'], etag)
+            self.assertIn('2023-03-05', changed.get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
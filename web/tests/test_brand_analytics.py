@@ -0,0 +1,41 @@
+import unittest
+
+import pandas as pd
+
+from brand_analytics import brand_datasets
+
+
+class BrandDatasetsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        columns = ['brand_name', 'date', 'size', 'supplier_name', 'broker_name',
+                   'total_available', 'products']
+        self.history = pd.DataFrame([
+            ('Gin', '2023-01-30', '.75L', 'S1', 'B1', 10, 1),
+            ('Gin', '2023-01-30', '1.75L', 'S1', None, 6, 2),
+            ('Gin', '2023-01-31', '.75L', 'S1', 'B1', 4, 1),
+            ('Gin', '2023-02-01', '.75L', 'S1', 'B1', 7, 1),
+            ('Rum', '2023-01-30', '.75L', None, None, 3, 1),
+        ], columns=columns)
+
+    def test_datasets_per_brand(self):
+        datasets = brand_datasets(self.history)
+        self.assertEqual(set(datasets), {'Gin', 'Rum'})
+
+        gin = datasets['Gin']
+        self.assertEqual(gin['daily']['total_available'].tolist(), [16, 4, 7])
+        self.assertEqual(gin['rate']['rate_change'].tolist()[1:], [-12, 3])
+        # January: (10 + 6 + 4) over four product rows
+        self.assertEqual(gin['monthly']['avg_available'].tolist(), [5.0, 7.0])
+        self.assertEqual(len(gin['sizes']), 4)
+        self.assertEqual(gin['supplier_broker']['total_available'].tolist(), [10, 4, 7])
+
+    def test_brand_without_supplier_and_broker(self):
+        rum = brand_datasets(self.history)['Rum']
+        self.assertEqual(rum['daily']['total_available'].tolist(), [3])
+        self.assertTrue(rum['supplier_broker'].empty)
+        self.assertIn('supplier_broker', rum['supplier_broker'].columns)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    __file__), '..', '..', 'data_management'))
+
+from data_management import initialize_db  # noqa: E402
+from search_index import refresh_search_index  # noqa: E402
+from app import app  # noqa: E402
+
+BRANDS = [("Blanton's Gold Bourbon", 1, 1), ("Blanton's Single Barrel", 1, 1), ('Exotico Blanco', 2, 2),
+          ('Eagle Rare 10Y', 1, 2), ('Tito\'s Handmade', 3, None), ('Añejo Especial', 2, 2)]
+
+
+class BrandSearchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'inventory.db')
+        conn = sqlite3.connect(self.path)
+        initialize_db(conn)
+        conn.executemany("INSERT INTO suppliers (name) VALUES (?)",
+                         [('Sazerac Co.',), ('Luxco',), ('Fifth Generation',)])
+        conn.executemany("INSERT INTO brokers (name) VALUES (?)", [('Mark Fitlin',), ('Bill York',)])
+        conn.executemany('''INSERT INTO inventory (nc_code, brand_name, total_available, size,
+                            cases_per_pallet, supplier_id, broker_id) VALUES (?, ?, 1, '.75L', 60, ?, ?)''',
+                         [(f"{n:05d}",) + brand for n, brand in enumerate(BRANDS)])
+        with conn:
+            self.assertEqual(refresh_search_index(conn), len(BRANDS))
+        conn.close()
+
+    def search(self, query=''):
+        with mock.patch.dict(os.environ, {'DB_FILE_PATH': self.path}):
+            response = app.test_client().get('/brands/search' + query)
+        self.assertEqual(response.status_code, 200)
+        page = response.get_json()
+        return [brand['brand_name'] for brand in page['brands']], page['more']
+
+    def test_prefix_matches_brand_start_first(self):
+        brands = self.search('?q=blan')[0]
+        self.assertEqual(sorted(brands[:2]), ["Blanton's Gold Bourbon", "Blanton's Single Barrel"])
+        self.assertEqual(brands[2], 'Exotico Blanco')
+        # Near misses follow the exact matches
+        self.assertEqual(self.search('?q=blanton%27s+sing')[0][0], "Blanton's Single Barrel")
+        self.assertEqual(self.search('?q=anejo')[0], ['Añejo Especial'])
+
+    def test_supplier_and_broker_names_match(self):
+        self.assertEqual(sorted(self.search('?q=sazerac')[0]),
+                         ["Blanton's Gold Bourbon", "Blanton's Single Barrel", 'Eagle Rare 10Y'])
+        self.assertEqual(self.search('?q=york+exo')[0], ['Exotico Blanco'])
+
+    def test_misspelt_query_still_matches(self):
+        self.assertEqual(sorted(self.search('?q=blaton')[0][:2]), ["Blanton's Gold Bourbon", "Blanton's Single Barrel"])
+        self.assertEqual(self.search('?q=tittos')[0][:1], ["Tito's Handmade"])
+        self.assertEqual(self.search('?q=%22%2A')[0], self.search()[0])
+
+    def test_pages(self):
+        first, more = self.search('?page_size=4')
+        self.assertTrue(more)
+        second, more = self.search('?page_size=4&page=2')
+        self.assertFalse(more)
+        self.assertEqual(first + second, sorted(brand for brand, _, _ in BRANDS))
+
+    def test_brand_analysis_lists_only_selected_brands(self):
+        with mock.patch.dict(os.environ, {'DB_FILE_PATH': self.path}):
+            page = app.test_client().get('/brand-analysis').get_data(as_text=True)
+        self.assertNotIn('Eagle Rare', page)
+        self.assertIn('/brands/search', page)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from cache import LRUStore, ResultCache, SQLiteStore
+
+
+class ResultCacheTestCase(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = ResultCache(LRUStore(max_entries=2))
+        cache.set('a', [1])
+        cache.set('b', [2])
+        cache.get('a')
+        cache.set('c', [3])
+        self.assertEqual(cache.get('a'), [1])
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.store.evictions, 1)
+
+    def test_byte_bound(self):
+        store = LRUStore(max_entries=100, max_bytes=2000)
+        cache = ResultCache(store)
+        for n in range(20):
+            cache.set(n, list(range(20)))
+        self.assertLessEqual(store.nbytes, 2000)
+        self.assertLess(len(store), 20)
+
+    def test_ttl_expiry(self):
+        cache = ResultCache(LRUStore(), ttl=10)
+        with mock.patch('cache.time.time', return_value=1000.0):
+            cache.set('key', ['rows'])
+        with mock.patch('cache.time.time', return_value=1005.0):
+            self.assertEqual(cache.get('key'), ['rows'])
+        with mock.patch('cache.time.time', return_value=1011.0):
+            self.assertIsNone(cache.get('key'))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_new_data_version_invalidates(self):
+        version = [1]
+        cache = ResultCache(LRUStore(), version_source=lambda: version[0],
+                            version_check_interval=0)
+        cache.set('key', ['old'])
+        self.assertEqual(cache.get('key'), ['old'])
+        version[0] = 2
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(len(cache.store), 0)
+
+
+class SQLiteStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'cache.db')
+
+    def test_entries_are_shared_between_workers(self):
+        # Two stores on one file stand in for two gunicorn workers.
+        worker1 = ResultCache(SQLiteStore(self.path))
+        worker2 = ResultCache(SQLiteStore(self.path))
+        rows = [{'nc_code': '00009', 'percentage_change': 12.5, 'supplier_name': None}]
+        worker1.set('2023-01-01-2023-02-01-all', rows)
+        self.assertEqual(worker2.get('2023-01-01-2023-02-01-all'), rows)
+
+    def test_bounds_evict_least_recently_used(self):
+        store = SQLiteStore(self.path, max_entries=2)
+        cache = ResultCache(store)
+        cache.set('a', [1])
+        cache.set('b', [2])
+        cache.get('a')
+        cache.set('c', [3])
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), [1])
+        self.assertEqual(len(store), 2)
+
+    def test_version_change_keeps_new_entries(self):
+        version = [1]
+        store = SQLiteStore(self.path)
+        slow_worker = ResultCache(store, version_source=lambda: version[0],
+                                  version_check_interval=0)
+        slow_worker.set('key', ['old'])
+        version[0] = 2
+        fast_worker = ResultCache(SQLiteStore(self.path), version_source=lambda: version[0],
+                                  version_check_interval=0)
+        fast_worker.set('key', ['new'])
+        self.assertEqual(slow_worker.get('key'), ['new'])
+        self.assertEqual(len(store), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
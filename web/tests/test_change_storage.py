@@ -0,0 +1,171 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    __file__), '..', '..', 'data_management'))
+
+import change_storage  # noqa: E402
+from data_management import initialize_db  # noqa: E402
+from deltas import backfill_deltas  # noqa: E402
+from historical_insert import ingest_parsed_file, initialize_manifest, write_historical_rows  # noqa: E402
+from ingest_hooks import run_post_ingest  # noqa: E402
+from migrations import migrate  # noqa: E402
+from app import app  # noqa: E402
+from blueprints import inventory  # noqa: E402
+
+DATES = [f"2023-{1 + d // 28:02d}-{1 + d % 28:02d}" for d in range(50)]
+ALL_ROWS = 'SELECT nc_code, date, total_available, supplier_id FROM historical_inventory ORDER BY nc_code, date'
+
+
+def snapshot(day, products=120):
+    """One day's rows: quantities hold for a few days, some products come and go."""
+    rows = []
+    for n in range(products):
+        if n % 7 == 0 and 10 <= day < 15 or n % 11 == 0 and day >= 40:
+            continue
+        supplier_id = n % 10 + 1 if n % 13 or day < 30 else (n + 1) % 10 + 1
+        rows.append((f"{n:05d}", DATES[day], n * (day // (1 + n % 5)) % 50, supplier_id))
+    return rows
+
+
+def build_row_db(path, skip_days=()):
+    conn = sqlite3.connect(path)
+    initialize_db(conn)
+    conn.executemany("INSERT INTO suppliers (name) VALUES (?)", [(f"Supplier {n}",) for n in range(10)])
+    conn.executemany('''INSERT INTO inventory (nc_code, brand_name, total_available, size,
+                        cases_per_pallet, supplier_id, broker_id) VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                     [(f"{n:05d}", f"Brand {n % 40}", 0, '.75L', 60, n % 10 + 1, None) for n in range(130)])
+    for day in range(len(DATES)):
+        if day not in skip_days:
+            conn.executemany("INSERT INTO historical_inventory VALUES (?, ?, ?, ?)", snapshot(day))
+    migrate(conn)
+    backfill_deltas(conn)
+    conn.commit()
+    initialize_manifest(conn)
+    return conn
+
+
+class ChangeStorageTestCase(unittest.TestCase):
+    """The change layout must read back exactly what the row table holds."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.rows_path = os.path.join(self.tmpdir.name, 'rows.db')
+        self.changes_path = os.path.join(self.tmpdir.name, 'changes.db')
+        # Days 20 and 49 are loaded by the tests, day 20 out of order
+        build_row_db(self.rows_path, skip_days={20, 49}).close()
+        shutil.copy(self.rows_path, self.changes_path)
+        conn = sqlite3.connect(self.changes_path)
+        self.assertTrue(change_storage.convert_to_changes(conn))
+        conn.close()
+        inventory.cache.clear()
+
+    def connect(self, path):
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+        return conn
+
+    def web_results(self, path, call):
+        with mock.patch.dict(os.environ, {'DB_FILE_PATH': path}), app.test_request_context():
+            inventory.cache.clear()
+            return call()
+
+    def assertSameHistory(self):
+        self.assertEqual(self.connect(self.changes_path).execute(ALL_ROWS).fetchall(),
+                         self.connect(self.rows_path).execute(ALL_ROWS).fetchall())
+
+    def test_view_matches_row_table(self):
+        self.assertSameHistory()
+        conn = self.connect(self.changes_path)
+        runs = conn.execute("SELECT COUNT(*) FROM historical_inventory_runs").fetchone()[0]
+        rows = self.connect(self.rows_path).execute("SELECT COUNT(*) FROM historical_inventory").fetchone()[0]
+        self.assertLess(runs, rows / 2)
+
+    def test_comparisons_match(self):
+        for date1, date2, suppliers in [(DATES[3], DATES[4], None), (DATES[0], DATES[45], None),
+                                        (DATES[45], DATES[12], ['Supplier 3']), (DATES[13], DATES[16], ['all'])]:
+            for path in (self.rows_path, self.changes_path):
+                results = self.web_results(path, lambda: inventory.compare_inventory_data(date1, date2, suppliers))
+                if path == self.rows_path:
+                    expected = results
+                    self.assertTrue(expected)
+            self.assertEqual(results, expected)
+
+    def test_range_comparisons_match(self):
+        for start, end, suppliers, after in [(DATES[0], DATES[48], None, None),
+                                             (DATES[8], DATES[16], ['Supplier 3', 'Supplier 7'], None),
+                                             ('2023-01-05T', DATES[44], None, 'Brand 17'),
+                                             (DATES[20], DATES[20], None, None)]:
+            def brands():
+                return [(brand, data['supplier_name'], list(data['totals'].items()))
+                        for brand, data in inventory.iter_range_brands(start, end, suppliers, after)]
+            expected = self.web_results(self.rows_path, brands)
+            self.assertEqual(self.web_results(self.changes_path, brands), expected)
+            self.assertEqual(self.web_results(self.changes_path, lambda: inventory.range_dates(start, end)),
+                             self.web_results(self.rows_path, lambda: inventory.range_dates(start, end)))
+
+    def test_loads_match_row_table(self):
+        stat = os.stat(self.rows_path)
+        late = [row for row in snapshot(49) if row[0] != '00003'] + [('00125', DATES[49], 7, 2)]
+        changed = [(code, date, total + 1 if int(code) % 3 else total, supplier)
+                   for code, date, total, supplier in snapshot(30)][5:]
+        for path in (self.rows_path, self.changes_path):
+            conn = self.connect(path)
+            counts = [write_historical_rows(conn, late),
+                      write_historical_rows(conn, snapshot(20)),   # out of order
+                      write_historical_rows(conn, snapshot(30)),   # already loaded
+                      ingest_parsed_file(conn, '20230203.csv', DATES[30], changed, stat, 'x', replace=True)]
+            run_post_ingest(conn, [DATES[49], DATES[20], DATES[30]])
+            if path == self.rows_path:
+                expected = counts
+        self.assertEqual(counts, expected)
+        self.assertEqual(counts[2], 0)
+        self.assertSameHistory()
+        deltas = 'SELECT * FROM inventory_deltas ORDER BY date, nc_code'
+        self.assertEqual(self.connect(self.changes_path).execute(deltas).fetchall(),
+                         self.connect(self.rows_path).execute(deltas).fetchall())
+
+    def test_unchanged_day_writes_no_runs(self):
+        conn = self.connect(self.changes_path)
+        runs = "SELECT COUNT(*) FROM historical_inventory_runs"
+        before = conn.execute(runs).fetchone()[0]
+        write_historical_rows(conn, [(code, DATES[49], total, supplier)
+                                     for code, _, total, supplier in snapshot(48)])
+        self.assertEqual(conn.execute(runs).fetchone()[0], before)
+        self.assertEqual(conn.execute("SELECT MAX(date) FROM snapshot_days").fetchone()[0], DATES[49])
+
+    def test_deleting_a_whole_day_drops_its_date(self):
+        for path in (self.rows_path, self.changes_path):
+            conn = self.connect(path)
+            with conn:
+                conn.execute("DELETE FROM historical_inventory WHERE date = ?", (DATES[5],))
+                change_storage.apply_staged_changes(conn)
+        self.assertSameHistory()
+        self.assertEqual(self.web_results(self.changes_path, lambda: inventory.range_dates(DATES[4], DATES[6])),
+                         [DATES[4], DATES[6]])
+
+    def test_reloading_a_day_restores_its_runs(self):
+        conn = self.connect(self.changes_path)
+        runs = "SELECT * FROM historical_inventory_runs ORDER BY product_id, start_day"
+        before = conn.execute(runs).fetchall()
+        with conn:
+            conn.execute("DELETE FROM historical_inventory WHERE date = ?", (DATES[25],))
+        write_historical_rows(conn, snapshot(25))
+        self.assertEqual(conn.execute(runs).fetchall(), before)
+
+    def test_revert_restores_row_table(self):
+        conn = self.connect(self.changes_path)
+        self.assertFalse(change_storage.convert_to_changes(conn))
+        self.assertTrue(change_storage.convert_to_rows(conn))
+        self.assertFalse(change_storage.uses_change_storage(conn))
+        self.assertSameHistory()
+
+
+if __name__ == '__main__':
+    unittest.main()
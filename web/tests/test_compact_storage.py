@@ -0,0 +1,106 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    __file__), '..', '..', 'data_management'))
+
+import compact_storage  # noqa: E402
+from test_change_storage import ALL_ROWS, DATES, build_row_db  # noqa: E402
+from app import app  # noqa: E402
+from blueprints import inventory  # noqa: E402
+
+
+class CompactStorageTestCase(unittest.TestCase):
+    """The compact layout must read back exactly what the row table holds."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.rows_path = os.path.join(self.tmpdir.name, 'rows.db')
+        self.compact_path = os.path.join(self.tmpdir.name, 'compact.db')
+        build_row_db(self.rows_path).close()
+        shutil.copy(self.rows_path, self.compact_path)
+        conn = sqlite3.connect(self.compact_path)
+        self.assertTrue(compact_storage.convert_to_compact(conn))
+        conn.execute('ANALYZE')
+        conn.close()
+        inventory.cache.clear()
+
+    def connect(self, path):
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+        return conn
+
+    def web_results(self, path, call):
+        with mock.patch.dict(os.environ, {'DB_FILE_PATH': path}), app.test_request_context():
+            inventory.cache.clear()
+            return call()
+
+    def assertSameHistory(self):
+        self.assertEqual(self.connect(self.compact_path).execute(ALL_ROWS).fetchall(),
+                         self.connect(self.rows_path).execute(ALL_ROWS).fetchall())
+
+    def test_conversion_round_trips(self):
+        conn = self.connect(self.compact_path)
+        self.assertEqual(compact_storage.storage_layout(conn), 'compact')
+        self.assertSameHistory()
+        self.assertFalse(compact_storage.convert_to_compact(conn))
+        self.assertTrue(compact_storage.convert_to_rows(conn))
+        self.assertEqual(compact_storage.storage_layout(conn), 'table')
+        self.assertSameHistory()
+
+    def test_writes_through_the_view(self):
+        for path in (self.rows_path, self.compact_path):
+            conn = self.connect(path)
+            with conn:
+                # A new product and a new day
+                conn.execute("INSERT INTO historical_inventory VALUES ('00999', ?, 4, 2)", (DATES[10],))
+                conn.execute("INSERT INTO historical_inventory VALUES ('00001', '2023-03-01', 6, 2)")
+                # An existing row is kept as it was
+                conn.execute("INSERT OR IGNORE INTO historical_inventory VALUES ('00001', ?, 99, 2)", (DATES[3],))
+                conn.execute("DELETE FROM historical_inventory WHERE nc_code = '00002' AND date = ?", (DATES[4],))
+                conn.execute("DELETE FROM historical_inventory WHERE date = ?", (DATES[6],))
+            with self.assertRaises(sqlite3.IntegrityError):
+                conn.execute("INSERT INTO historical_inventory VALUES ('00001', ?, 99, 2)", (DATES[3],))
+            conn.rollback()
+        self.assertSameHistory()
+        conn = self.connect(self.compact_path)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM product_keys WHERE nc_code = '00999'").fetchone(), (1,))
+
+    def test_comparisons_match(self):
+        for date1, date2, suppliers in [(DATES[3], DATES[4], None), (DATES[0], DATES[45], None),
+                                        (DATES[45], DATES[12], ['Supplier 3'])]:
+            expected = self.web_results(self.rows_path,
+                                        lambda: inventory.compare_inventory_data(date1, date2, suppliers))
+            self.assertTrue(expected)
+            self.assertEqual(self.web_results(self.compact_path,
+                                              lambda: inventory.compare_inventory_data(date1, date2, suppliers)),
+                             expected)
+
+        def brands():
+            return [(brand, data['supplier_name'], list(data['totals'].items()))
+                    for brand, data in inventory.iter_range_brands(DATES[8], DATES[16], ['Supplier 3'])]
+        self.assertEqual(self.web_results(self.compact_path, brands), self.web_results(self.rows_path, brands))
+
+    def test_reads_use_the_compact_indexes(self):
+        conn = self.connect(self.compact_path)
+
+        def plan(sql, *params):
+            return ' / '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+
+        by_date = plan("SELECT nc_code, total_available FROM historical_inventory WHERE date = ?", DATES[5])
+        self.assertIn('USING INDEX idx_historical_compact_date', by_date)
+        by_range = plan("SELECT COUNT(*) FROM historical_inventory WHERE date BETWEEN ? AND ?", DATES[5], DATES[9])
+        self.assertIn('idx_historical_compact_date', by_range)
+        by_product = plan("SELECT date, total_available FROM historical_inventory WHERE nc_code = ?", '00005')
+        self.assertIn('USING INDEX idx_historical_compact_product', by_product)
+        self.assertNotIn('SCAN', by_date + by_range + by_product)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    __file__), '..', '..', 'data_management'))
+
+import csv_validator  # noqa: E402
+from historical_insert import preflight  # noqa: E402
+
+HEADER = ('"NC Code","Brand Name","Total Available","Size","Cases Per Pallet","Supplier",'
+          '"Supplier Allotment","Broker Name",')
+ROWS = ['="00009","Bowman Single Barrel","0",".75L","204","Sazerac Co.","204","Rick Henry",',
+        '="00026","Hirsch "The Horizon" Bourbon","176",".75L","120","Hotaling & Co.","120","Barry Sessoms",',
+        '="00031","Crème de Cassis","12","1L","60","Sazerac Co.","60","",']
+
+
+class ValidatorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.dir = tmpdir.name
+
+    def write(self, name, lines, ending='\r\n'):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w', newline='') as file:
+            file.write(ending.join(lines))
+        return path
+
+    def validate(self, lines, name='20230115.csv'):
+        return csv_validator.validate_file(self.write(name, lines))
+
+    def test_export_passes(self):
+        result = self.validate([HEADER] + ROWS)
+        self.assertTrue(result['valid'])
+        self.assertEqual((result['rows'], result['counts']), (3, {}))
+
+    def test_blank_and_empty_files(self):
+        self.assertEqual(self.validate([HEADER])['counts'], {'blank': 1})
+        self.assertEqual(self.validate([])['counts'], {'empty': 1})
+        self.assertFalse(self.validate([HEADER])['valid'])
+
+    def test_truncated_last_row(self):
+        result = self.validate([HEADER] + ROWS[:2] + [ROWS[2][:25]])
+        self.assertFalse(result['valid'])
+        self.assertEqual(result['counts'], {'truncated': 1})
+        self.assertEqual(result['problems'][0]['line'], 4)
+
+    def test_out_of_schema_rows(self):
+        bad = [ROWS[0].replace('"204","Sazerac', '"2x4","Sazerac'),
+               ROWS[1].replace('="00026"', '"00026"'),
+               ROWS[2].replace('"1L"', '" "')]
+        result = self.validate([HEADER] + bad + ROWS[:1])
+        self.assertFalse(result['valid'])
+        self.assertEqual(result['counts'], {'schema': 3})
+        self.assertEqual([p['line'] for p in result['problems']], [2, 3, 4])
+
+    def test_header_and_filename(self):
+        self.assertEqual(self.validate([HEADER.replace('Size', 'Volume')] + ROWS)['counts'], {'header': 1})
+        self.assertEqual(self.validate([HEADER] + ROWS, name='latest.csv')['counts'], {'filename': 1})
+
+    def test_duplicates_warn_with_line_numbers(self):
+        lines = [HEADER] + ROWS + [ROWS[1], ROWS[0]]
+        result = self.validate(lines)
+        self.assertTrue(result['valid'])
+        self.assertEqual(result['counts'], {'duplicate_key': 2})
+        # The fast path reports the same lines as the row-by-row walk
+        with mock.patch.object(csv_validator, 'well_formed_rows', return_value=None):
+            slow = self.validate(lines)
+        self.assertEqual(result['problems'], slow['problems'])
+        self.assertEqual(result['problems'][0],
+                         {'kind': 'duplicate_key', 'line': 5, 'detail': 'NC Code ="00026" also on line 3'})
+
+    def test_pool_matches_serial(self):
+        paths = [self.write(f'202301{day:02d}.csv', [HEADER] + ROWS[:day % 4]) for day in range(1, 9)]
+        serial = csv_validator.validate_files(paths)
+        pooled = csv_validator.validate_files(paths, workers=2)
+        strip = [{k: v for k, v in r.items() if k != 'seconds'} for r in serial]
+        self.assertEqual(strip, [{k: v for k, v in r.items() if k != 'seconds'} for r in pooled])
+        report = csv_validator.build_report(serial)
+        self.assertEqual((report['checked'], report['invalid']), (8, 2))
+
+    def test_preflight_quarantines_invalid_files(self):
+        good = self.write('20230115.csv', [HEADER] + ROWS)
+        blank = self.write('20230116.csv', [HEADER])
+        quarantine_dir = os.path.join(self.dir, 'quarantine')
+        self.assertEqual(preflight([good, blank], quarantine_dir), [good])
+        self.assertFalse(os.path.exists(blank))
+        self.assertTrue(os.path.exists(os.path.join(quarantine_dir, '20230116.csv')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    __file__), '..', '..', 'data_management'))
+
+import change_storage  # noqa: E402
+import compact_storage  # noqa: E402
+import data_management  # noqa: E402
+from stub_export_server import make_server  # noqa: E402
+
+REPORT = ('"NC Code","Brand Name","Total Available","Size","Cases Per Pallet","Supplier",'
+          '"Supplier Allotment","Broker Name",\r\n'
+          '="00009","Bowman Single Barrel","0",".75L","204","Sazerac Co.","204","Rick Henry",\r\n'
+          '="00026","Wyoming Whiskey","176",".75L","120","Edrington Americas","120","Lauren Wiseman",\r\n'
+          '="00031","Crème de Cassis","12","1L","60","Sazerac Co.","60","Rick Henry",\r\n')
+
+
+class TeeLinesTestCase(unittest.TestCase):
+
+    def test_lines_split_across_chunks(self):
+        data = REPORT.encode()
+        # One byte at a time splits every CRLF and the two-byte 'è'
+        chunks = [data[n:n + 1] for n in range(len(data))]
+        copy = io.BytesIO()
+        lines = list(data_management.tee_lines(chunks, copy))
+        self.assertEqual(''.join(lines), REPORT)
+        self.assertEqual(copy.getvalue(), data)
+        rows = list(data_management.parse_inventory_rows(lines))
+        self.assertEqual([row['nc_code'] for row in rows], ['="00009"', '="00026"', '="00031"'])
+        self.assertEqual(rows[2]['brand_name'], 'Crème de Cassis')
+        self.assertEqual(rows[1]['total_available'], 176)
+
+
+class StreamInventoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.source = os.path.join(tmpdir.name, 'source')
+        self.backups = os.path.join(tmpdir.name, 'backups')
+        os.makedirs(self.source)
+        with open(os.path.join(self.source, '20230115.csv'), 'w', newline='') as file:
+            file.write(REPORT)
+
+        self.conn = sqlite3.connect(os.path.join(tmpdir.name, 'inventory.db'))
+        self.addCleanup(self.conn.close)
+        data_management.initialize_db(self.conn)
+        self.conn.execute("INSERT INTO suppliers (name) VALUES ('Sazerac Co.')")
+        self.conn.commit()
+
+        self.server = make_server(self.source)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+
+    def test_report_is_loaded_and_backed_up(self):
+        count = data_management.stream_inventory(self.conn, self.url, self.backups, date(2023, 1, 16))
+        self.assertEqual(count, 3)
+
+        inventory = self.conn.execute('''SELECT i.nc_code, i.total_available, s.name, b.name
+                                         FROM inventory i JOIN suppliers s ON s.id = i.supplier_id
+                                         JOIN brokers b ON b.id = i.broker_id ORDER BY i.nc_code''').fetchall()
+        self.assertEqual(inventory, [('="00009"', 0, 'Sazerac Co.', 'Rick Henry'),
+                                     ('="00026"', 176, 'Edrington Americas', 'Lauren Wiseman'),
+                                     ('="00031"', 12, 'Sazerac Co.', 'Rick Henry')])
+        # The snapshot is dated with the report date, not the wall clock
+        self.assertEqual(self.conn.execute('''SELECT date, COUNT(*) FROM historical_inventory
+                                              GROUP BY date''').fetchall(), [('2023-01-16', 3)])
+
+        backup = os.path.join(self.backups, '20230116.csv')
+        with open(backup, newline='') as file:
+            self.assertEqual(file.read(), REPORT)
+        size, row_count = self.conn.execute(
+            "SELECT size, row_count FROM ingest_manifest WHERE file_name = '20230116.csv'").fetchone()
+        self.assertEqual((size, row_count), (os.path.getsize(backup), 3))
+
+    def test_rerun_updates_inventory_in_place(self):
+        data_management.stream_inventory(self.conn, self.url, self.backups, date(2023, 1, 16))
+        data_management.stream_inventory(self.conn, self.url, self.backups, date(2023, 1, 17))
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM inventory").fetchone()[0], 3)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM suppliers").fetchone()[0], 2)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM historical_inventory").fetchone()[0], 6)
+
+    def test_same_day_rerun_replaces_the_snapshot(self):
+        # The later report has a new total for one product and drops another
+        later = REPORT.replace('"Wyoming Whiskey","176"', '"Wyoming Whiskey","150"')
+        later = later[:later.index('="00031"')]
+        for convert in (None, compact_storage.convert_to_compact, change_storage.convert_to_changes):
+            with self.subTest(layout=convert and convert.__module__):
+                if convert:
+                    with self.conn:
+                        self.conn.execute("DELETE FROM historical_inventory")
+                    compact_storage.convert_to_rows(self.conn)
+                    convert(self.conn)
+                for report in (REPORT, later):
+                    data_management.update_inventory(
+                        self.conn, data_management.parse_inventory_rows(io.StringIO(report)), date(2023, 1, 16))
+                snapshot = self.conn.execute('''SELECT nc_code, total_available FROM historical_inventory
+                                                WHERE date = '2023-01-16' ORDER BY nc_code''').fetchall()
+                self.assertEqual(snapshot, [('="00009"', 0), ('="00026"', 150)])
+
+    def test_failed_download_changes_nothing(self):
+        os.remove(os.path.join(self.source, '20230115.csv'))
+        self.assertIsNone(data_management.stream_inventory(self.conn, self.url, self.backups, date(2023, 1, 16)))
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM inventory").fetchone()[0], 0)
+
+    def test_interrupted_stream_rolls_back(self):
+        def rows():
+            yield from data_management.parse_inventory_rows(io.StringIO(REPORT))
+            raise ConnectionError('connection dropped')
+
+        with self.assertRaises(ConnectionError):
+            data_management.update_inventory(self.conn, rows(), date(2023, 1, 16), batch_size=2)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM inventory").fetchone()[0], 0)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM brokers").fetchone()[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from flask import Flask
+
+import db
+
+
+class ConnectionPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'inventory.db')
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.commit()
+        conn.close()
+        self.pool = db.ConnectionPool(self.path, size=2)
+        self.addCleanup(self.pool.close)
+
+    def test_close_returns_connection_for_reuse(self):
+        conn = self.pool.acquire()
+        conn.close()
+        self.assertIs(self.pool.acquire(), conn)
+
+    def test_read_settings(self):
+        conn = self.pool.acquire()
+        self.assertEqual(conn.execute('PRAGMA query_only').fetchone()[0], 1)
+        self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        with self.assertRaises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO t VALUES (1)")
+        conn.close()
+
+    def test_overflow_connections_are_closed(self):
+        conns = [self.pool.acquire() for _ in range(3)]
+        for conn in conns:
+            conn.close()
+        self.assertEqual(self.pool._idle.qsize(), 2)
+
+    def test_stale_release_does_not_steal_a_new_checkout(self):
+        conn = self.pool.acquire()
+        lease = conn.lease
+        conn.close()
+        again = self.pool.acquire()
+        self.assertIs(again, conn)
+        self.pool.release(conn, lease)
+        self.assertIn(again, self.pool._out)
+
+    def test_teardown_returns_unclosed_connections(self):
+        app = Flask(__name__)
+        db.init_app(app)
+        with app.app_context():
+            conn = db.connect(self.path)
+            pool = db.get_pool(self.path)
+            self.assertIn(conn, pool._out)
+        self.assertNotIn(conn, pool._out)
+        pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
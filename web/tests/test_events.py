@@ -0,0 +1,130 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    __file__), '..', '..', 'data_management'))
+
+import data_management  # noqa: E402
+from data_management import initialize_db  # noqa: E402
+from events import refresh_events  # noqa: E402
+from historical_insert import write_historical_rows  # noqa: E402
+from ingest_hooks import run_post_ingest  # noqa: E402
+from app import app  # noqa: E402
+
+DATES = ['2023-03-01', '2023-03-02', '2023-03-03', '2023-03-04']
+# nc_code -> quantity on each date; None means missing from that report
+HISTORY = {'00001': [0, 5, 5, 0],       # restock, then stock-out
+           '00002': [10, 10, 40, 41],   # jump
+           '00003': [None, None, 3, 3],  # first reported with stock
+           '00004': [20, 24, 18, 0]}    # small moves, stock-out
+BRANDS = {'00001': 'Alpha', '00002': 'Beta', '00003': 'Alpha', '00004': 'Gamma'}
+
+
+def snapshot(day):
+    return [(code, DATES[day], totals[day], 1) for code, totals in HISTORY.items() if totals[day] is not None]
+
+
+class EventsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'inventory.db')
+        self.conn = sqlite3.connect(self.path)
+        self.addCleanup(self.conn.close)
+        initialize_db(self.conn)
+        self.conn.execute("INSERT INTO suppliers (name) VALUES ('S1')")
+        self.conn.executemany('''INSERT INTO inventory (nc_code, brand_name, total_available, size,
+                                 cases_per_pallet, supplier_id, broker_id) VALUES (?, ?, ?, '.75L', 60, 1, NULL)''',
+                              [(code, BRANDS[code], totals[-1]) for code, totals in HISTORY.items()])
+        self.conn.execute("INSERT INTO watchlist_brands VALUES ('bourbon', 'Alpha')")
+        self.conn.commit()
+        # Loaded out of order, the last day first
+        for days in ([3], [0, 1, 2]):
+            for day in days:
+                write_historical_rows(self.conn, snapshot(day))
+            run_post_ingest(self.conn, [DATES[day] for day in days], inventory_changed=True)
+
+    def events(self):
+        return self.conn.execute("SELECT nc_code, date, kind, prev_total, total_available FROM inventory_events "
+                                 "ORDER BY nc_code, date").fetchall()
+
+    def get(self, url):
+        with mock.patch.dict(os.environ, {'DB_FILE_PATH': self.path}):
+            response = app.test_client().get(url)
+        return response.status_code, response.get_json()
+
+    def test_transitions(self):
+        self.assertEqual(self.events(), [('00001', DATES[1], 'restock', 0, 5),
+                                         ('00001', DATES[3], 'stockout', 5, 0),
+                                         ('00002', DATES[2], 'jump', 10, 40),
+                                         ('00003', DATES[2], 'restock', None, 3),
+                                         ('00004', DATES[3], 'stockout', 18, 0)])
+
+    def test_reloading_a_day_replaces_its_events(self):
+        rows = [(code, date, 0 if code == '00002' else total, supplier)
+                for code, date, total, supplier in snapshot(2)]
+        with self.conn:
+            self.conn.execute("DELETE FROM historical_inventory WHERE date = ?", (DATES[2],))
+        write_historical_rows(self.conn, rows)
+        run_post_ingest(self.conn, [DATES[2]])
+        self.assertIn(('00002', DATES[2], 'stockout', 10, 0), self.events())
+        # Day 3 is now a restock of 00002 rather than a small move
+        self.assertIn(('00002', DATES[3], 'restock', 0, 41), self.events())
+        self.assertEqual(refresh_events(self.conn, [DATES[2]])[0], 2)
+
+    def test_watchlist_alerts(self):
+        status, alerts = self.get('/watchlist-alerts?watchlist=bourbon&since=2023-03-01')
+        self.assertEqual(status, 200)
+        self.assertEqual([(a['date'], a['nc_code'], a['kind']) for a in alerts],
+                         [(DATES[3], '00001', 'stockout'), (DATES[2], '00003', 'restock'),
+                          (DATES[1], '00001', 'restock')])
+        self.assertEqual(self.get('/watchlist-alerts')[0], 400)
+
+    def test_restocks_since(self):
+        status, rows = self.get(f'/restocks?since={DATES[1]}')
+        self.assertEqual(status, 200)
+        self.assertEqual([(r['nc_code'], r['brand_name'], r['supplier_name']) for r in rows],
+                         [('00003', 'Alpha', 'S1')])
+        rows = self.get(f'/restocks?since={DATES[0]}&kind=stockout&brand=Gamma')[1]
+        self.assertEqual([(r['nc_code'], r['date']) for r in rows], [('00004', DATES[3])])
+        self.assertEqual(self.get('/restocks?kind=sold')[0], 400)
+
+    def test_brand_availability(self):
+        status, availability = self.get('/brand-availability?brand=Alpha&brand=Gamma&brand=Unknown')
+        self.assertEqual(status, 200)
+        self.assertEqual(availability['Alpha'], {'in_stock': True, 'cases': 3, 'last_in_stock': DATES[3],
+                                                 'last_restock': DATES[2], 'last_stockout': DATES[3]})
+        self.assertEqual(availability['Gamma'], {'in_stock': False, 'cases': 0, 'last_in_stock': DATES[2],
+                                                 'last_restock': None, 'last_stockout': DATES[3]})
+        self.assertNotIn('Unknown', availability)
+
+
+
+class UnmigratedDatabaseTestCase(unittest.TestCase):
+    """The web tier may open a database before the loaders have migrated it."""
+
+    def test_endpoints_answer_503(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, 'inventory.db')
+        conn = sqlite3.connect(path)
+        with mock.patch.object(data_management, 'migrate'):
+            initialize_db(conn)
+        conn.close()
+        with mock.patch.dict(os.environ, {'DB_FILE_PATH': path}):
+            client = app.test_client()
+            for url in ('/brands/search?q=alpha', '/restocks', '/brand-availability?brand=Alpha',
+                        '/watchlist-alerts?watchlist=bourbon'):
+                with self.subTest(url=url):
+                    response = client.get(url)
+                    self.assertEqual(response.status_code, 503)
+                    self.assertIn('error', response.get_json())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    __file__), '..', '..', 'data_management'))
+
+import request_historical_inv as fetcher  # noqa: E402
+from stub_export_server import make_server  # noqa: E402
+
+
+class FetcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.source = os.path.join(tmpdir.name, 'source')
+        self.out = os.path.join(tmpdir.name, 'out')
+        os.makedirs(self.source)
+        for day in range(1, 11):
+            with open(os.path.join(self.source, f'202301{day:02d}.csv'), 'w') as file:
+                file.write(f'header\nrow for day {day}\n')
+
+        self.server = make_server(self.source)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/StoresBoards/ExportExcel'
+
+    def fetch(self, end=date(2023, 1, 10), **kwargs):
+        kwargs.setdefault('backoff', 0)
+        return fetcher.fetch_range(date(2023, 1, 1), end, self.out, url=self.url, **kwargs)
+
+    def test_fetches_every_day(self):
+        fetched, skipped, failed = self.fetch(workers=4)
+        self.assertEqual((fetched, skipped, failed), (10, 0, []))
+        for day in range(1, 11):
+            with open(os.path.join(self.out, f'202301{day:02d}.csv')) as file:
+                self.assertEqual(file.read(), f'header\nrow for day {day}\n')
+        self.assertFalse([name for name in os.listdir(self.out) if name.endswith('.tmp')])
+
+    def test_retries_transient_failures(self):
+        self.server.failure_rate = 0.5
+        fetched, skipped, failed = self.fetch(workers=3, retries=20)
+        self.assertEqual((fetched, failed), (10, []))
+
+    def test_failed_day_does_not_stop_the_range(self):
+        fetched, skipped, failed = self.fetch(end=date(2023, 1, 12), retries=1)
+        self.assertEqual(fetched, 10)
+        self.assertEqual(failed, ['20230111', '20230112'])
+        with open(os.path.join(self.out, fetcher.CHECKPOINT_FILE)) as file:
+            state = json.load(file)
+        self.assertEqual(sorted(state['failed']), ['20230111', '20230112'])
+        self.assertIn('status 404', state['failed']['20230111'])
+
+        # A day that comes good later drops out of the checkpoint
+        with open(os.path.join(self.source, '20230111.csv'), 'w') as file:
+            file.write('header\nrow for day 11\n')
+        self.assertEqual(self.fetch(end=date(2023, 1, 12), retries=1), (1, 10, ['20230112']))
+        with open(os.path.join(self.out, fetcher.CHECKPOINT_FILE)) as file:
+            self.assertEqual(list(json.load(file)['failed']), ['20230112'])
+
+    def test_rerun_skips_fetched_days(self):
+        self.fetch(end=date(2023, 1, 5))
+        served = self.server.requests_served
+        fetched, skipped, failed = self.fetch()
+        self.assertEqual((fetched, skipped, failed), (5, 5, []))
+        self.assertEqual(self.server.requests_served, served + 5)
+
+        fetched, skipped, failed = self.fetch(force=True)
+        self.assertEqual((fetched, skipped), (10, 0))
+
+    def test_deleted_backup_is_fetched_again(self):
+        self.fetch(end=date(2023, 1, 5))
+        os.remove(os.path.join(self.out, '20230103.csv'))
+        self.assertEqual(self.fetch(end=date(2023, 1, 5)), (1, 4, []))
+        self.assertTrue(os.path.exists(os.path.join(self.out, '20230103.csv')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from test_query_plans import build_fixture_db
+from app import app
+from blueprints import analytics, inventory
+
+
+class FigurePageTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.db_path = os.path.join(cls.tmpdir.name, 'inventory.db')
+        build_fixture_db(cls.db_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        self.app = app.test_client()
+        env = mock.patch.dict(os.environ, {'DB_FILE_PATH': self.db_path})
+        env.start()
+        self.addCleanup(env.stop)
+        interval = mock.patch.object(inventory.cache, 'version_check_interval', 0)
+        interval.start()
+        self.addCleanup(interval.stop)
+        inventory.cache.clear()
+
+    def bump_data_version(self):
+        conn = sqlite3.connect(self.db_path)
+        with conn:
+            conn.execute("UPDATE data_version SET version = version + 1")
+        conn.close()
+
+    def test_plotly_js_is_not_inlined(self):
+        response = self.app.get('/brand-analysis?brand[]=Brand 7')
+        page = response.get_data(as_text=True)
+        self.assertEqual(page.count('/plotly.min.js?v='), 1)
+        self.assertLess(len(page), 200 * 1024)
+        self.assertEqual(self.app.get('/plotly.min.js').status_code, 200)
+
+    def test_conditional_get(self):
+        first = self.app.get('/data-analysis')
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers['ETag']
+
+        with mock.patch.object(analytics, 'data_analysis_figures') as build:
+            again = self.app.get('/data-analysis', headers={'If-None-Match': etag})
+            self.assertEqual(again.status_code, 304)
+            cached = self.app.get('/data-analysis')
+            self.assertEqual(cached.status_code, 200)
+            build.assert_not_called()
+
+        self.bump_data_version()
+        changed = self.app.get('/data-analysis', headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import sqlite3
+import sys
+import unittest
+from unittest import mock
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    __file__), '..', '..', 'data_management'))
+
+from data_management import initialize_db  # noqa: E402
+import forecasts  # noqa: E402
+
+
+class FitTestCase(unittest.TestCase):
+
+    def test_batched_fit_matches_per_brand_least_squares(self):
+        rng = np.random.default_rng(0)
+        days = np.arange(30)
+        X = forecasts.design_matrix(days, days % 7, weekly=True)
+        totals = rng.integers(0, 100, size=(4, 30)).astype(float)
+        observed = (rng.random((4, 30)) > 0.2).astype(float)
+        coefficients = forecasts.fit_all(X, totals, observed)
+        for b in range(4):
+            mask = observed[b] == 1
+            expected = np.linalg.lstsq(X[mask], totals[b, mask], rcond=None)[0]
+            np.testing.assert_allclose(coefficients[b], expected, atol=1e-8)
+
+    def test_single_day_brand_does_not_break_the_batch(self):
+        X = forecasts.design_matrix(np.arange(10), np.arange(10) % 7, weekly=True)
+        observed = np.zeros((2, 10))
+        observed[0] = 1
+        observed[1, 9] = 1
+        totals = np.tile(np.arange(10.0), (2, 1))
+        coefficients = forecasts.fit_all(X, totals, observed)
+        self.assertAlmostEqual(coefficients[0, 1], 1.0)
+        self.assertTrue(np.isfinite(coefficients[1]).all())
+
+
+class RefreshTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        initialize_db(self.conn)
+        self.conn.executemany("INSERT INTO inventory (nc_code, brand_name, total_available) VALUES (?, ?, 0)",
+                              [('1', 'Falling'), ('2', 'Coming back')])
+        start = date(2023, 1, 1)
+        self.conn.executemany("INSERT INTO historical_inventory (nc_code, date, total_available) VALUES (?, ?, ?)",
+                              [(nc, (start + timedelta(days=d)).isoformat(), total)
+                               for d in range(60)
+                               for nc, total in [('1', 100 - d), ('2', 0 if d > 50 else 40 - d // 2)]])
+        self.conn.commit()
+
+    def test_projected_dates(self):
+        with mock.patch.object(forecasts, 'WINDOW_DAYS', 60):
+            self.assertEqual(forecasts.refresh_forecasts(self.conn), 2)
+        rows = dict((row[0], row[1:]) for row in self.conn.execute(
+            "SELECT brand_name, stockout_date, restock_date, slope FROM brand_forecasts"))
+        # 100 - d reaches 0 on day 100
+        self.assertEqual(rows['Falling'][0], (date(2023, 1, 1) + timedelta(days=100)).isoformat())
+        self.assertAlmostEqual(rows['Falling'][2], -1.0)
+        self.assertIsNone(rows['Coming back'][0])
+
+    def test_window_end_is_the_latest_snapshot(self):
+        # A brand that dropped out of the reports a month before the latest one
+        with self.conn:
+            self.conn.execute("INSERT INTO inventory (nc_code, brand_name, total_available) "
+                              "VALUES ('3', 'Gone', 0)")
+            self.conn.executemany("INSERT INTO historical_inventory (nc_code, date, total_available) "
+                                  "VALUES ('3', ?, 9)",
+                                  [((date(2023, 1, 1) + timedelta(days=d)).isoformat(),) for d in range(30)])
+        with mock.patch.object(forecasts, 'WINDOW_DAYS', 60):
+            forecasts.refresh_forecasts(self.conn)
+        windows = self.conn.execute("SELECT DISTINCT window_start, window_end FROM brand_forecasts").fetchall()
+        self.assertEqual(windows, [('2023-01-01', '2023-03-01')])
+        self.assertEqual(self.conn.execute("SELECT observations FROM brand_forecasts "
+                                           "WHERE brand_name = 'Gone'").fetchone(), (30,))
+
+    def test_empty_window(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM inventory")
+        self.assertEqual(forecasts.fit_forecasts(self.conn), [])
+        self.assertEqual(forecasts.refresh_forecasts(self.conn), 0)
+
+    def test_old_dates_do_not_refit(self):
+        with mock.patch.object(forecasts, 'WINDOW_DAYS', 30):
+            self.assertEqual(forecasts.refresh_forecasts(self.conn, ['2023-01-05']), 0)
+            self.assertEqual(forecasts.refresh_forecasts(self.conn, ['2023-03-01']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import date
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    __file__), '..', '..', 'data_management'))
+
+from data_management import initialize_db, stream_inventory  # noqa: E402
+import historical_insert  # noqa: E402
+from stub_export_server import make_server  # noqa: E402
+
+HEADER = ('"NC Code","Brand Name","Total Available","Size","Cases Per Pallet","Supplier",'
+          '"Supplier Allotment","Broker Name",')
+SUPPLIERS = ['Sazerac Co.', 'Hotaling & Co.', 'Unknown Imports']
+HISTORY = "SELECT nc_code, date, total_available, supplier_id FROM historical_inventory ORDER BY date, nc_code"
+
+
+def report(day, codes):
+    """Backup lines for day; the supplier cycles through one the database doesn't know."""
+    return [HEADER] + [f'="{code:05d}","Brand {code}","{(code * day) % 50}",".75L","60",'
+                       f'"{SUPPLIERS[code % 3]}","60","Broker",' for code in codes]
+
+
+class HistoricalInsertTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.dir = tmpdir.name
+        self.backups = os.path.join(self.dir, 'backups')
+        os.makedirs(self.backups)
+        self.write('20230115.csv', report(15, range(1, 9)))
+        # The same NC code twice: the first row wins
+        self.write('20230116.csv', report(16, [1, 2, 3, 2, 4]) + report(99, [4])[1:])
+        self.write('20230117.csv', report(17, range(3, 12)))
+
+    def write(self, name, lines):
+        with open(os.path.join(self.backups, name), 'w', newline='') as file:
+            file.write('\r\n'.join(lines))
+
+    def new_db(self, name):
+        path = os.path.join(self.dir, name)
+        conn = sqlite3.connect(path)
+        initialize_db(conn)
+        conn.executemany("INSERT INTO suppliers (name) VALUES (?)", [(name,) for name in SUPPLIERS[:2]])
+        conn.commit()
+        conn.close()
+        return path
+
+    def load(self, name, **kwargs):
+        path = self.new_db(name)
+        with contextlib.redirect_stdout(io.StringIO()):
+            historical_insert.process_csv_files(self.backups, path, validate=False, **kwargs)
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+        return conn
+
+    def test_bulk_matches_row_mode(self):
+        rows = self.load('row.db', mode='row').execute(HISTORY).fetchall()
+        self.assertEqual(len(rows), 8 + 4 + 9)
+        self.assertIn(('="00004"', '2023-01-16', 14, 2), rows)
+        self.assertEqual(self.load('bulk.db', mode='bulk').execute(HISTORY).fetchall(), rows)
+
+    def test_workers_match_serial(self):
+        for day in range(18, 24):
+            self.write(f'202301{day}.csv', report(day, range(day % 5, day)))
+        manifest = "SELECT file_name, size, mtime, content_hash, row_count FROM ingest_manifest ORDER BY file_name"
+        serial = self.load('serial.db', workers=1)
+        pooled = self.load('pooled.db', workers=2)
+        self.assertEqual(pooled.execute(HISTORY).fetchall(), serial.execute(HISTORY).fetchall())
+        self.assertEqual(pooled.execute(manifest).fetchall(), serial.execute(manifest).fetchall())
+        self.assertEqual(len(serial.execute(manifest).fetchall()), 9)
+        # Files finish out of order; what the post-ingest hook derives must not depend on it
+        for table in ('inventory_deltas', 'rollup_daily_totals'):
+            select = f"SELECT * FROM {table} ORDER BY 1, 2"
+            self.assertTrue(serial.execute(select).fetchall())
+            self.assertEqual(pooled.execute(select).fetchall(), serial.execute(select).fetchall(), table)
+
+    def test_existing_rows_are_kept(self):
+        df = pd.read_csv(os.path.join(self.backups, '20230116.csv'))
+        results = []
+        for name in ('row.db', 'bulk.db'):
+            conn = sqlite3.connect(self.new_db(name))
+            self.addCleanup(conn.close)
+            conn.execute("INSERT INTO historical_inventory VALUES ('=\"00002\"', '2023-01-16', 49, 1)")
+            conn.commit()
+            if name == 'row.db':
+                with contextlib.redirect_stdout(io.StringIO()):
+                    historical_insert.insert_historical_data(conn, df.copy(), '2023-01-16')
+            else:
+                rows = historical_insert.prepare_historical_rows(
+                    df.copy(), '2023-01-16', historical_insert.load_supplier_map(conn))
+                self.assertEqual(historical_insert.write_historical_rows(conn, rows), 3)
+            results.append(conn.execute(HISTORY).fetchall())
+        self.assertIn(('="00002"', '2023-01-16', 49, 1), results[0])
+        self.assertEqual(results[1], results[0])
+
+    def test_invalid_files_stay_put_by_default(self):
+        self.write('20230118.csv', [HEADER])
+        path = self.new_db('inventory.db')
+        with mock.patch.dict(os.environ, {'DB_FILE_PATH': path, 'BACKUP_DIR': self.backups}), \
+                mock.patch.object(sys, 'argv', ['historical_insert.py']), \
+                contextlib.redirect_stdout(io.StringIO()) as output:
+            historical_insert.main()
+        self.assertIn('Invalid backup 20230118.csv', output.getvalue())
+        self.assertEqual(sorted(os.listdir(self.backups)),
+                         ['20230115.csv', '20230116.csv', '20230117.csv', '20230118.csv'])
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'quarantine')))
+
+        quarantine_dir = os.path.join(self.dir, 'held')
+        with mock.patch.dict(os.environ, {'DB_FILE_PATH': path, 'BACKUP_DIR': self.backups}), \
+                mock.patch.object(sys, 'argv', ['historical_insert.py', '--quarantine', quarantine_dir]), \
+                contextlib.redirect_stdout(io.StringIO()):
+            historical_insert.main()
+        self.assertEqual(os.listdir(quarantine_dir), ['20230118.csv'])
+
+    def parsed_files(self, path, **kwargs):
+        """Names of the backups a bulk load of path reads."""
+        with mock.patch.object(historical_insert, 'parse_backup_file',
+                               wraps=historical_insert.parse_backup_file) as parse:
+            with contextlib.redirect_stdout(io.StringIO()):
+                historical_insert.process_csv_files(self.backups, path, validate=False, **kwargs)
+        return sorted(os.path.basename(call.args[0]) for call in parse.call_args_list)
+
+    def test_unchanged_files_are_skipped(self):
+        path = self.new_db('inventory.db')
+        self.assertEqual(self.parsed_files(path), ['20230115.csv', '20230116.csv', '20230117.csv'])
+        self.assertEqual(self.parsed_files(path), [])
+        self.assertEqual(self.parsed_files(path, full_rescan=True),
+                         ['20230115.csv', '20230116.csv', '20230117.csv'])
+
+    def test_changed_files_are_reloaded(self):
+        path = self.new_db('inventory.db')
+        self.parsed_files(path)
+        self.write('20230117.csv', report(18, range(3, 6)))
+        self.assertEqual(self.parsed_files(path), ['20230117.csv'])
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.execute("SELECT nc_code, total_available FROM historical_inventory "
+                                      "WHERE date = '2023-01-17' ORDER BY nc_code").fetchall(),
+                         [('="00003"', 4), ('="00004"', 22), ('="00005"', 40)])
+
+        # Touched but not modified: hashed once, then skipped on size and mtime
+        stat = os.stat(os.path.join(self.backups, '20230115.csv'))
+        os.utime(os.path.join(self.backups, '20230115.csv'), (stat.st_atime, stat.st_mtime + 60))
+        self.assertEqual(self.parsed_files(path), ['20230115.csv'])
+        self.assertEqual(self.parsed_files(path), [])
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM historical_inventory").fetchone()[0], 8 + 4 + 3)
+
+    def test_full_rescan_replaces_changed_days(self):
+        path = self.new_db('inventory.db')
+        self.parsed_files(path)
+        # Same size and mtime, so only --full notices the new totals
+        backup = os.path.join(self.backups, '20230117.csv')
+        stat = os.stat(backup)
+        with open(backup) as file:
+            lines = file.read().split('\n')
+        self.write('20230117.csv', [line.replace('"Brand 3","1"', '"Brand 3","9"') for line in lines])
+        os.utime(backup, (stat.st_atime, stat.st_mtime))
+        self.assertEqual(os.path.getsize(backup), stat.st_size)
+        self.assertEqual(self.parsed_files(path), [])
+        self.parsed_files(path, full_rescan=True)
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.execute("SELECT nc_code, total_available FROM historical_inventory "
+                                      "WHERE date = '2023-01-17' ORDER BY nc_code LIMIT 2").fetchall(),
+                         [('="00003"', 9), ('="00004"', 18)])
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM historical_inventory").fetchone()[0], 8 + 4 + 9)
+
+    def test_streamed_backups_are_skipped(self):
+        path = self.new_db('inventory.db')
+        server = make_server(self.backups)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+        # The stub serves the newest backup, 20230117.csv, as the day's report
+        self.assertEqual(stream_inventory(conn, f'http://127.0.0.1:{server.server_address[1]}/',
+                                          self.backups, date(2023, 1, 18)), 9)
+        self.assertEqual(self.parsed_files(path), ['20230115.csv', '20230116.csv', '20230117.csv'])
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM historical_inventory "
+                                      "WHERE date = '2023-01-18'").fetchone()[0], 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
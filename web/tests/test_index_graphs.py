@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    __file__), '..', '..', 'data_management'))
+
+from data_management import initialize_db  # noqa: E402
+import gen_index_graphs  # noqa: E402
+from ingest_hooks import bump_data_version  # noqa: E402
+from products import refresh_products  # noqa: E402
+from rollups import backfill_rollups  # noqa: E402
+
+DATES = [f"2023-11-{day:02d}" for day in range(1, 21)]
+
+
+def build_db(path):
+    conn = sqlite3.connect(path)
+    initialize_db(conn)
+    conn.execute("INSERT INTO suppliers (name) VALUES ('Supplier 0')")
+    conn.executemany('''INSERT INTO inventory (nc_code, brand_name, total_available, size,
+                        cases_per_pallet, supplier_id, broker_id) VALUES (?, ?, ?, ?, ?, 1, NULL)''',
+                     [(f"{n:05d}", f"Brand {n:02d}", n, '50ML' if n % 2 else '1.75L', 2) for n in range(60)])
+    # Brand 59 has the most cases, Brand 00 the fewest
+    conn.executemany("INSERT INTO historical_inventory VALUES (?, ?, ?, 1)",
+                     [(f"{n:05d}", date, n + day % 3) for n in range(60) for day, date in enumerate(DATES)])
+    refresh_products(conn, DATES[-1])
+    backfill_rollups(conn)
+    conn.commit()
+    return conn
+
+
+class IndexGraphsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.graph_dir = os.path.join(self.tmpdir.name, 'graphs')
+        self.conn = build_db(os.path.join(self.tmpdir.name, 'inventory.db'))
+        self.addCleanup(self.conn.close)
+
+    def build(self, **kwargs):
+        return gen_index_graphs.build_graphs(self.conn, self.graph_dir, window_days=7, **kwargs)
+
+    def test_brands_ranked_once_with_volumes(self):
+        specs = gen_index_graphs.figure_specs(self.conn, DATES[-1], window_days=7)
+        top8 = [label for label, _, _ in specs['brand_top8']['series']]
+        ranks_9_to_18 = [label for label, _, _ in specs['brand_top9t18']['series']]
+        self.assertEqual(top8, [f"Brand {n}" for n in range(59, 51, -1)])
+        self.assertEqual(ranks_9_to_18, [f"Brand {n}" for n in range(51, 41, -1)])
+        self.assertEqual(len(specs['brand_top50']['series']), 50)
+        label, dates, totals = specs['brand_top8']['series'][0]
+        # Brand 59 is 50ML: 50 mL * (59 + day % 3) cases * 2 per pallet
+        self.assertEqual(dates, DATES)
+        self.assertEqual(totals[:3], [5900, 6000, 6100])
+        self.assertEqual(specs['inv_over_time']['series'][0][2][0], sum(range(60)))
+
+    def test_unchanged_figures_are_skipped(self):
+        drawn, skipped, _ = self.build()
+        self.assertEqual(len(drawn), 4)
+        self.assertEqual(skipped, [])
+        self.assertTrue(all(os.path.exists(os.path.join(self.graph_dir, name)) for name in drawn))
+
+        statements = []
+        self.conn.set_trace_callback(statements.append)
+        self.assertEqual(self.build()[:2], ([], drawn))
+        self.assertFalse([s for s in statements if 'JOIN inventory' in s or 'rollup' in s])
+        self.conn.set_trace_callback(None)
+
+        # A load that only moved a brand ranked 9-18 redraws just its figures
+        with self.conn:
+            self.conn.execute("UPDATE historical_inventory SET total_available = 99 "
+                              "WHERE nc_code = '00045' AND date = ?", (DATES[0],))
+        bump_data_version(self.conn)
+        drawn, skipped, _ = self.build()
+        self.assertEqual([name[9:] for name in drawn],
+                         ['brand_top50_inv_over_time.png', 'brand_top9t18_inv_over_time.png'])
+        self.assertEqual(len(skipped), 2)
+
+    def test_old_builds_are_removed(self):
+        os.makedirs(self.graph_dir)
+        for date in ('20231101', '20231102', '20231103'):
+            for name in ('inv_over_time', 'brand_top8_inv_over_time'):
+                open(os.path.join(self.graph_dir, f'{date}_{name}.png'), 'w').close()
+        open(os.path.join(self.graph_dir, 'logo.png'), 'w').close()
+
+        _, _, removed = self.build(keep=2)
+        self.assertEqual(removed, ['20231101_brand_top8_inv_over_time.png', '20231101_inv_over_time.png',
+                                   '20231102_brand_top8_inv_over_time.png', '20231102_inv_over_time.png'])
+        remaining = sorted(os.listdir(self.graph_dir))
+        self.assertIn('logo.png', remaining)
+        self.assertIn('20231103_inv_over_time.png', remaining)
+        self.assertIn('20231120_inv_over_time.png', remaining)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from test_query_plans import build_fixture_db
+import metrics
+from app import app
+from blueprints import inventory
+from config import Config
+
+
+def sample(text, name, **labels):
+    """Value of one sample line in a /metrics page, 0 when absent."""
+    wanted = name + metrics._format_labels(labels)
+    for line in text.splitlines():
+        if line.startswith(wanted + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0
+
+
+class HistogramTestCase(unittest.TestCase):
+
+    def test_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('test_seconds', 'Test.', ('endpoint',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, endpoint='x')
+        lines = [f'{name}{metrics._format_labels(labels)} {value}' for name, labels, value in histogram.samples()]
+        self.assertEqual(lines, ['test_seconds_bucket{endpoint="x",le="0.1"} 2',
+                                 'test_seconds_bucket{endpoint="x",le="1.0"} 3',
+                                 'test_seconds_bucket{endpoint="x",le="+Inf"} 4',
+                                 'test_seconds_sum{endpoint="x"} 3.65',
+                                 'test_seconds_count{endpoint="x"} 4'])
+        self.assertEqual(metrics._format_labels({'q': 'a"b\\'}), '{q="a\\"b\\\\"}')
+
+
+class MetricsEndpointTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.db_path = os.path.join(cls.tmpdir.name, 'inventory.db')
+        build_fixture_db(cls.db_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        self.app = app.test_client()
+        env = mock.patch.dict(os.environ, {'DB_FILE_PATH': self.db_path})
+        env.start()
+        self.addCleanup(env.stop)
+        inventory.cache.clear()
+
+    def get(self, url):
+        response = self.app.get(url)
+        response.get_data()
+        # Servers close the response once sent; that is when it is timed
+        response.close()
+        return response
+
+    def scrape(self):
+        response = self.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.mimetype.startswith('text/plain'))
+        return response.get_data(as_text=True)
+
+    def test_requests_and_statements_are_timed(self):
+        endpoint = 'inventory_bp.range_comparison'
+        before = self.scrape()
+        self.assertEqual(self.get('/range-comparison?start=2023-01-02&end=2023-01-09').status_code, 200)
+        after = self.scrape()
+        request_labels = {'endpoint': endpoint, 'method': 'GET', 'status': '200'}
+        self.assertEqual(sample(after, 'inventory_http_request_duration_seconds_count', **request_labels)
+                         - sample(before, 'inventory_http_request_duration_seconds_count', **request_labels), 1)
+        self.assertGreater(sample(after, 'inventory_sqlite_query_duration_seconds_count', endpoint=endpoint),
+                           sample(before, 'inventory_sqlite_query_duration_seconds_count', endpoint=endpoint))
+
+        before = self.scrape()
+        self.get('/available-dates')
+        after = self.scrape()
+        self.assertEqual(sample(after, 'inventory_sqlite_rows_total', endpoint='inventory_bp.available_dates')
+                         - sample(before, 'inventory_sqlite_rows_total', endpoint='inventory_bp.available_dates'), 60)
+
+    def test_cache_counters(self):
+        before = self.scrape()
+        for _ in range(2):
+            inventory.compare_inventory_data('2023-01-02', '2023-01-03')
+        after = self.scrape()
+        for name, delta in [('inventory_cache_hits_total', 1), ('inventory_cache_misses_total', 1)]:
+            self.assertEqual(sample(after, name, cache='results') - sample(before, name, cache='results'), delta)
+        self.assertEqual(sample(after, 'inventory_cache_entries', cache='results'), 1)
+        self.assertGreater(sample(after, 'inventory_cache_bytes', cache='results'), 0)
+
+    def test_figure_builds_are_timed(self):
+        stages = ('build', 'serialize')
+        before = [metrics.FIGURE_SECONDS.count(endpoint='analytics_bp.data_analysis', stage=stage) for stage in stages]
+        self.get('/data-analysis')
+        self.get('/data-analysis')
+        after = [metrics.FIGURE_SECONDS.count(endpoint='analytics_bp.data_analysis', stage=stage) for stage in stages]
+        # The second request is served from the cache
+        self.assertEqual([a - b for a, b in zip(after, before)], [1, 1])
+
+    def test_slow_query_log(self):
+        log_path = os.path.join(self.tmpdir.name, 'logs', 'slow.log')
+        with mock.patch.object(Config, 'SLOW_QUERY_MS', 1e-6), mock.patch.object(Config, 'SLOW_QUERY_LOG', log_path):
+            self.get('/available-dates')
+        with open(log_path) as file:
+            entries = [json.loads(line) for line in file]
+        dates = [entry for entry in entries if 'DISTINCT date' in entry['sql']]
+        self.assertEqual(len(dates), 1)
+        self.assertEqual(dates[0]['endpoint'], 'inventory_bp.available_dates')
+        self.assertEqual(dates[0]['rows'], 60)
+        self.assertTrue(any('idx_historical_inventory_date' in step for step in dates[0]['plan']))
+
+        # Off by default
+        self.get('/available-dates')
+        with open(log_path) as file:
+            self.assertEqual(len(file.readlines()), len(entries))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    __file__), '..', '..', 'data_management'))
+
+import data_management  # noqa: E402
+from data_management import initialize_db  # noqa: E402
+import migrations  # noqa: E402
+
+
+class MigrateTestCase(unittest.TestCase):
+
+    def test_failed_backfill_rolls_back(self):
+        conn = sqlite3.connect(':memory:')
+        self.addCleanup(conn.close)
+        initialize_db(conn)
+        version = migrations.schema_version(conn)
+
+        def failing(conn):
+            conn.execute("CREATE TABLE half_done (id INTEGER)")
+            raise ValueError('attempt to get argmax of an empty sequence')
+
+        with mock.patch.object(migrations, 'MIGRATIONS', migrations.MIGRATIONS + [(version + 1, failing)]):
+            with self.assertRaises(ValueError):
+                migrations.migrate(conn)
+        self.assertFalse(conn.in_transaction)
+        self.assertEqual(migrations.schema_version(conn), version)
+        self.assertIsNone(conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'half_done'").fetchone())
+
+
+    def test_v4_fills_every_rollup(self):
+        conn = sqlite3.connect(':memory:')
+        self.addCleanup(conn.close)
+        with mock.patch.object(data_management, 'migrate'):
+            initialize_db(conn)
+        conn.execute("INSERT INTO suppliers (name) VALUES ('S1')")
+        conn.executemany('''INSERT INTO inventory (nc_code, brand_name, total_available, size, supplier_id)
+                            VALUES (?, ?, ?, ?, 1)''',
+                         [('="00001"', 'Alpha', 4, '.75L'), ('="00002"', 'Alpha', 2, '1.75L'),
+                          ('="00003"', 'Beta', 5, '50ML'), ('="00004"', 'Gamma', 1, None)])
+        conn.execute("INSERT INTO historical_inventory VALUES ('=\"00001\"', '2023-01-02', 4, 1)")
+        conn.commit()
+        rollups = ["SELECT * FROM rollup_brand_totals ORDER BY brand_name",
+                   "SELECT * FROM rollup_supplier_totals",
+                   "SELECT * FROM rollup_size_counts ORDER BY size",
+                   "SELECT * FROM rollup_daily_totals"]
+
+        # A database that stopped at v4, as it would have before v6 existed
+        with mock.patch.object(migrations, 'MIGRATIONS', migrations.MIGRATIONS[:4]):
+            migrations.migrate(conn)
+        self.assertEqual(conn.execute(rollups[0]).fetchall(),
+                         [('Alpha', 6, 4 * 750 + 2 * 1750), ('Beta', 5, 250), ('Gamma', 1, 0)])
+        at_v4 = [conn.execute(sql).fetchall() for sql in rollups]
+        self.assertTrue(all(at_v4))
+
+        migrations.migrate(conn)
+        self.assertEqual([conn.execute(sql).fetchall() for sql in rollups], at_v4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    __file__), '..', '..', 'data_management'))
+
+from data_management import initialize_db  # noqa: E402
+from products import canonical_nc_code, refresh_products  # noqa: E402
+
+
+class CanonicalCodeTestCase(unittest.TestCase):
+
+    def test_codes(self):
+        self.assertEqual(canonical_nc_code('="00009"'), '00009')
+        self.assertEqual(canonical_nc_code(' ="12345" '), '12345')
+        self.assertEqual(canonical_nc_code('00009'), '00009')
+        self.assertIsNone(canonical_nc_code(None))
+
+
+class ProductsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.conn = sqlite3.connect(os.path.join(tmpdir.name, 'inventory.db'))
+        self.addCleanup(self.conn.close)
+        initialize_db(self.conn)
+        self.conn.executemany("INSERT INTO suppliers (name) VALUES (?)", [('S1',), ('S2',)])
+        self.report([('="00009"', 'Bowman', '.75L', 1), ('="00026"', 'Wyoming', '750ML', 1),
+                     ('="00031"', 'Cassis', '1.00L', 2)])
+
+    def report(self, rows):
+        with self.conn:
+            self.conn.executemany('''INSERT INTO inventory (nc_code, brand_name, total_available, size,
+                                     cases_per_pallet, supplier_id, broker_id) VALUES (?, ?, 5, ?, 60, ?, NULL)
+                                     ON CONFLICT (nc_code) DO UPDATE SET
+                                         brand_name = excluded.brand_name, supplier_id = excluded.supplier_id''',
+                                  rows)
+
+    def refresh(self, as_of):
+        with self.conn:
+            return refresh_products(self.conn, as_of)
+
+    def test_sizes_and_codes_parsed_once(self):
+        self.assertEqual(self.refresh('2023-01-01'), 3)
+        self.assertEqual(self.conn.execute("SELECT nc_code, source_code, size_ml FROM products ORDER BY nc_code")
+                         .fetchall(),
+                         [('00009', '="00009"', 750), ('00026', '="00026"', 750), ('00031', '="00031"', 1000)])
+
+    def test_attribute_changes_are_kept(self):
+        self.refresh('2023-01-01')
+        self.report([('="00009"', 'Bowman', '.75L', 2)])
+        self.assertEqual(self.refresh('2023-01-05'), 1)
+        self.assertEqual(self.refresh('2023-01-06'), 0)
+        # Reloading a date replaces that date's row instead of adding one
+        self.report([('="00009"', 'Bowman 10Y', '.75L', 2)])
+        self.assertEqual(self.refresh('2023-01-05'), 1)
+
+        history = self.conn.execute('''SELECT valid_from, valid_to, brand_name, supplier_id FROM product_history
+                                       WHERE nc_code = '00009' ORDER BY valid_from''').fetchall()
+        self.assertEqual(history, [('2023-01-01', '2023-01-05', 'Bowman', 1),
+                                   ('2023-01-05', None, 'Bowman 10Y', 2)])
+        self.assertEqual(self.conn.execute("SELECT supplier_id FROM products WHERE nc_code = '00009'").fetchone(),
+                         (2,))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    __file__), '..', '..', 'data_management'))
+
+from data_management import initialize_db  # noqa: E402
+from deltas import backfill_deltas  # noqa: E402
+import gen_index_graphs  # noqa: E402
+from app import app  # noqa: E402
+from blueprints import analytics, inventory  # noqa: E402
+
+TABLE_ALIAS = re.compile(r'(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|JOIN\b|GROUP\b|ORDER\b|LEFT\b|INNER\b)(\w+))?',
+                         re.IGNORECASE)
+
+
+def build_fixture_db(path, products=300, days=60):
+    conn = sqlite3.connect(path)
+    initialize_db(conn)
+    conn.executemany("INSERT INTO suppliers (name) VALUES (?)",
+                     [(f"Supplier {n}",) for n in range(10)])
+    conn.executemany("INSERT INTO brokers (name) VALUES (?)",
+                     [(f"Broker {n}",) for n in range(5)])
+    conn.executemany('''INSERT INTO inventory (nc_code, brand_name, total_available, size,
+                        cases_per_pallet, supplier_id, broker_id) VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                     [(f"{n:05d}", f"Brand {n % 120}", n % 50, '.75L', 60, n % 10 + 1, n % 5 + 1)
+                      for n in range(products)])
+    conn.executemany('''INSERT INTO historical_inventory (nc_code, date, total_available, supplier_id)
+                        VALUES (?, ?, ?, ?)''',
+                     [(f"{n:05d}", f"2023-{1 + d // 28:02d}-{1 + d % 28:02d}", (n * d) % 97, n % 10 + 1)
+                      for n in range(products) for d in range(days)])
+    backfill_deltas(conn)
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+
+
+def full_scans(conn, sql):
+    """Return the tables a statement reads end to end.
+
+    Walking the primary key's automatic index counts as a table scan too;
+    only scans ordered by one of our own idx_* indexes are allowed.
+    """
+    aliases = {}
+    for table, alias in TABLE_ALIAS.findall(sql):
+        aliases[alias or table] = table
+        aliases[table] = table
+    scanned = set()
+    for row in conn.execute('EXPLAIN QUERY PLAN ' + sql):
+        match = re.match(r'SCAN (\w+)(?! USING (?:COVERING )?INDEX idx_)', row[3])
+        if match:
+            scanned.add(aliases.get(match.group(1), match.group(1)))
+    return scanned
+
+
+class QueryPlanTestCase(unittest.TestCase):
+    """Fail if a date-first or brand-filtered read stops using an index."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.db_path = os.path.join(cls.tmpdir.name, 'inventory.db')
+        build_fixture_db(cls.db_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        self.statements = []
+        inventory.cache.clear()
+
+        env = mock.patch.dict(os.environ, {'DB_FILE_PATH': self.db_path})
+        env.start()
+        self.addCleanup(env.stop)
+
+        original = inventory.get_db_connection
+
+        def traced_connection():
+            conn = original()
+            conn.set_trace_callback(self.statements.append)
+            return conn
+
+        for module in (inventory, analytics):
+            patcher = mock.patch.object(
+                module, 'get_db_connection', traced_connection)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def assertIndexedReads(self):
+        selects = [s for s in self.statements
+                   if s.lstrip().upper().startswith(('SELECT', 'WITH'))]
+        self.assertTrue(selects, "no SELECT statements were captured")
+        conn = sqlite3.connect(self.db_path)
+        try:
+            for sql in selects:
+                scanned = full_scans(conn, sql)
+                self.assertNotIn('historical_inventory', scanned, sql)
+                if 'brand_name =' in sql or 'supplier_id =' in sql:
+                    self.assertNotIn('inventory', scanned, sql)
+        finally:
+            conn.close()
+
+    def test_direct_comparison(self):
+        self.app.post('/', data={'comparisonType': 'direct',
+                      'date1': '2023-01-02', 'date2': '2023-02-03'})
+        self.assertIndexedReads()
+
+    def test_direct_comparison_by_supplier(self):
+        self.app.post('/', data={'comparisonType': 'direct', 'date1': '2023-01-02',
+                      'date2': '2023-02-03', 'supplier[]': ['Supplier 3']})
+        self.assertIndexedReads()
+
+    def test_direct_comparison_consecutive_days(self):
+        self.app.post('/', data={'comparisonType': 'direct',
+                      'date1': '2023-01-02', 'date2': '2023-01-03'})
+        self.assertTrue(any('inventory_deltas' in s for s in self.statements))
+        self.assertIndexedReads()
+
+    def test_deltas_match_self_join(self):
+        with app.test_request_context():
+            from_deltas = inventory.compare_inventory_data('2023-01-02', '2023-01-03')
+            inventory.cache.clear()
+            with mock.patch.object(inventory, 'previous_snapshot_date', return_value=None):
+                from_join = inventory.compare_inventory_data('2023-01-02', '2023-01-03')
+            inventory.cache.clear()
+            page = inventory.compare_inventory_data('2023-01-02', '2023-01-03', limit=5, offset=3)
+        self.assertTrue(from_deltas)
+        self.assertEqual(from_deltas, from_join)
+        self.assertEqual(page, from_join[3:8])
+
+    def test_range_comparison(self):
+        self.app.post('/', data={'comparisonType': 'range',
+                      'date1': '2023-01-02', 'date2': '2023-01-09'})
+        self.assertIndexedReads()
+
+    def test_range_comparison_pages(self):
+        pages, after = [], None
+        while True:
+            url = '/range-comparison?start=2023-01-02&end=2023-01-09&page_size=7'
+            response = self.app.get(url + (f'&after={after}' if after else ''))
+            self.assertEqual(response.status_code, 200)
+            page = response.get_json()
+            pages.extend(page['brands'])
+            after = page['next_cursor']
+            if after is None:
+                break
+        self.assertIndexedReads()
+
+        expected = list(inventory.iter_range_brands('2023-01-02', '2023-01-09'))
+        self.assertEqual(len(expected), 120)
+        self.assertEqual([(b['brand_name'], b['supplier_name'], b['totals']) for b in pages],
+                         [(brand, data['supplier_name'], data['totals']) for brand, data in expected])
+        self.assertEqual(page['dates'], [f'2023-01-{d:02d}' for d in range(2, 10)])
+
+    def test_available_dates(self):
+        response = self.app.get('/available-dates')
+        self.assertEqual(response.status_code, 200)
+        self.assertIndexedReads()
+
+    def test_brand_analysis(self):
+        response = self.app.post(
+            '/brand-analysis', data={'brand[]': ['Brand 7']})
+        self.assertEqual(response.status_code, 200)
+        self.assertIndexedReads()
+
+    def test_brand_analysis_multiple_brands(self):
+        response = self.app.post(
+            '/brand-analysis', data={'brand[]': ['Brand 7', 'Brand 8']})
+        self.assertEqual(response.status_code, 200)
+        page = response.get_data(as_text=True)
+        self.assertIn('Inventory Over Time for Brand 7', page)
+        self.assertIn('Inventory Over Time for Brand 8', page)
+        history_reads = [s for s in self.statements if 'historical_inventory' in s]
+        self.assertEqual(len(history_reads), 1)
+        self.assertIndexedReads()
+
+    def test_inventory_graph(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.set_trace_callback(self.statements.append)
+        gen_index_graphs.generate_inventory_graph(conn, self.tmpdir.name)
+        conn.close()
+        self.assertIndexedReads()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    __file__), '..', '..', 'data_management'))
+
+from data_management import initialize_db  # noqa: E402
+from ingest_hooks import run_post_ingest  # noqa: E402
+from sizes import size_to_ml  # noqa: E402
+from analytics_backend import SQLiteBackend  # noqa: E402
+
+
+class SizeParserTestCase(unittest.TestCase):
+
+    def test_sizes(self):
+        self.assertEqual(size_to_ml('.75L'), 750)
+        self.assertEqual(size_to_ml('1.75L'), 1750)
+        self.assertEqual(size_to_ml('1.125L'), 1125)
+        self.assertEqual(size_to_ml('50ML'), 50)
+        self.assertEqual(size_to_ml('750ml'), 750)
+        self.assertIsNone(size_to_ml('8pk'))
+        self.assertIsNone(size_to_ml(None))
+
+
+class RollupTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        db_path = os.path.join(tmpdir.name, 'inventory.db')
+        self.conn = sqlite3.connect(db_path)
+        self.addCleanup(self.conn.close)
+        initialize_db(self.conn)
+        self.conn.executemany("INSERT INTO suppliers (name) VALUES (?)", [('S1',), ('S2',)])
+        self.conn.executemany('''INSERT INTO inventory (nc_code, brand_name, total_available, size,
+                                 cases_per_pallet, supplier_id, broker_id) VALUES (?, ?, ?, ?, 60, ?, NULL)''',
+                              [('1', 'Gin', 10, '.75L', 1), ('2', 'Gin', 2, '1.75L', 2),
+                               ('3', 'Rum', 5, '50ML', 2), ('4', 'Rum', 1, 'odd', None)])
+        self.load('2023-01-01', [('1', 10), ('2', 4)])
+        self.load('2023-01-02', [('1', 7), ('3', 5)])
+        run_post_ingest(self.conn, ['2023-01-01', '2023-01-02'], inventory_changed=True)
+        self.backend = SQLiteBackend(lambda: sqlite3.connect(db_path))
+
+    def load(self, date, rows):
+        with self.conn:
+            self.conn.executemany('''INSERT INTO historical_inventory (nc_code, date, total_available, supplier_id)
+                                     VALUES (?, ?, ?, 1)''', [(nc, date, total) for nc, total in rows])
+
+    def test_dashboard_reads_rollups(self):
+        daily = self.backend.daily_totals()
+        self.assertEqual(daily.values.tolist(), [['2023-01-01', 14], ['2023-01-02', 12]])
+        self.assertEqual(self.backend.brand_totals().values.tolist(), [['Gin', 12], ['Rum', 6]])
+        self.assertEqual(self.backend.supplier_totals().values.tolist(), [['S1', 10], ['S2', 7]])
+        self.assertEqual(self.backend.brand_volumes().values.tolist(),
+                         [['Gin', 10 * 750 + 2 * 1750], ['Rum', 250]])
+        self.assertEqual(sorted(self.backend.size_counts().values.tolist()),
+                         [['.75L', 1], ['1.75L', 1], ['50ML', 1], ['odd', 1]])
+
+    def test_ingest_refreshes_touched_dates_only(self):
+        self.conn.execute("UPDATE rollup_daily_totals SET total_available = -1 WHERE date = '2023-01-01'")
+        self.conn.execute("DELETE FROM historical_inventory WHERE date = '2023-01-02'")
+        self.load('2023-01-02', [('1', 1)])
+        self.load('2023-01-03', [('1', 2)])
+        run_post_ingest(self.conn, ['2023-01-02', '2023-01-03'])
+        self.assertEqual(self.backend.daily_totals().values.tolist(),
+                         [['2023-01-01', -1], ['2023-01-02', 1], ['2023-01-03', 2]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+import unittest
+
+WEB_DIR = os.path.join(os.path.dirname(__file__), '..')
+HEAVY = ('pandas', 'numpy', 'plotly.express', 'pyarrow', 'duckdb', 'sklearn')
+
+
+def run(code, **env):
+    return subprocess.run([sys.executable, '-c', code], cwd=WEB_DIR, check=True,
+                          capture_output=True, text=True,
+                          env={**os.environ, **env}).stdout.split()
+
+
+class StartupTestCase(unittest.TestCase):
+    """Importing the app must not drag in the analytics stack."""
+
+    def test_no_heavy_imports_at_startup(self):
+        loaded = run(f"import sys, app; print(*[m for m in {HEAVY!r} if m in sys.modules])")
+        self.assertEqual(loaded, [])
+
+    def test_loader_settings_are_not_read(self):
+        # Loader modules call load_dotenv() on import, which would pick up data_management/.env
+        loaded = run("import sys, app; print(*[m for m in ('dotenv', 'change_storage', 'migrations') "
+                     "if m in sys.modules])")
+        self.assertEqual(loaded, [])
+
+    def test_analytics_can_be_left_out(self):
+        codes = run("import app; c = app.app.test_client(); "
+                    "print(c.get('/data-analysis').status_code, c.get('/forecasts').status_code)",
+                    ENABLE_ANALYTICS='0')
+        self.assertEqual(codes, ['404', '404'])
+
+
+if __name__ == '__main__':
+    unittest.main()